@@ -183,6 +183,8 @@ void activateTemporaryLedPattern(LedPatternId pattern, unsigned long durationMs)
 void triggerStateChangeBlink();
 RadiatorMode detectCurrentMode();
 const char* modeToCommand(RadiatorMode mode);
+void checkEtat(const String &correlationId = String());
+void publishState(const String &correlationId, bool acknowledge);
 void registerAppliedMode(RadiatorMode mode);
 void ensureStartupModeApplied();
 void configurePilotPinsHighImpedance();
@@ -541,14 +543,21 @@ void callback(char* topic, byte* payload, unsigned int length) {
   const String from = doc["FROM"];
   const String to = doc["TO"];
   const String command = doc["COMMAND"];
+  // Identifiant de corrélation renvoyé tel quel pour le suivi côté Django
+  const String correlationId = doc["CID"] | "";
   
   if(from=="Django" && to==mqttClientId){
-      if (command == "CLIGNOTER") clignoter(2000, 500);
+      bool modeCommand = true;
+      if (command == "CLIGNOTER") { clignoter(2000, 500); modeCommand = false; }
       else if (command == "COMFORT") modeComfort();
       else if (command == "ECO") modeEco();
       else if (command == "OFF") modeOff();
       else if (command == "HORSGEL") modeHorsGel();
-      else if (command == "STATE") checkEtat();
+      else if (command == "STATE") { checkEtat(correlationId); modeCommand = false; }
+      else modeCommand = false;
+
+      // Acquittement applicatif : Django arrête de renvoyer la commande
+      if (modeCommand) publishState(correlationId, true);
   }
   // else {
   //   Serial.println("Ne nous concerne pas");
@@ -584,7 +593,8 @@ bool attemptMqttReconnect(bool forceAttempt) {
   }
 
   if (client.connect(mqttClientId)) {
-    client.subscribe(mqtt_topic);
+    // QoS 1 : le broker redélivre les commandes non reçues
+    client.subscribe(mqtt_topic, 1);
     return true;
   }
 
@@ -939,7 +949,11 @@ void modeOff(){
   applyRadiatorMode(MODE_OFF);
 }
 
-void checkEtat(){
+void checkEtat(const String &correlationId){
+  publishState(correlationId, false);
+}
+
+void publishState(const String &correlationId, bool acknowledge){
   RadiatorMode mode = detectCurrentMode();
   const char* command = modeToCommand(mode);
   appliedMode = mode;
@@ -948,6 +962,12 @@ void checkEtat(){
   message["FROM"] = mqttClientId;
   message["TO"] = "Django";
   message["COMMAND"] = command;
+  if (correlationId.length() > 0) {
+    message["CID"] = correlationId;
+  }
+  if (acknowledge) {
+    message["TYPE"] = "ACK";
+  }
 
   String jsonStr;
   serializeJson(message, jsonStr);
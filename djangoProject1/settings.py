@@ -58,6 +58,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'radiateur.middleware.LoginRequiredMiddleware',
+    'radiateur.middleware.SessionRefreshMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -147,12 +148,22 @@ LOGIN_EXEMPT_URLS = (
     "/logout/",
     "/admin/*",
     "/service-worker.js",
+    "/metrics",
 )
 
+# Sessions are kept in a signed cookie so the dashboard polls never write to
+# SQLite; DJANGO_SESSION_ENGINE selects another backend (e.g. "db").
+SESSION_ENGINE = os.getenv("DJANGO_SESSION_ENGINE", "signed_cookies")
+if "." not in SESSION_ENGINE:
+    SESSION_ENGINE = f"django.contrib.sessions.backends.{SESSION_ENGINE}"
+
 # Keep authenticated sessions active for a long period so users
 # do not need to sign in repeatedly.
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 30  # 30 days
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_SAVE_EVERY_REQUEST = False
+# The expiry of an active session is pushed back (one session write) when it
+# was last extended more than this many seconds ago.
+SESSION_REFRESH_INTERVAL = int(os.getenv("SESSION_REFRESH_INTERVAL", str(60 * 60 * 24)))
 
 
 # Application specific settings
@@ -167,11 +178,55 @@ MQTT_DEVICES = [
 ]
 MQTT_BROKER_START_COMMAND = os.getenv("MQTT_BROKER_START_COMMAND")
 MQTT_BROKER_START_TIMEOUT = float(os.getenv("MQTT_BROKER_START_TIMEOUT", "10"))
+# Commands published while the broker is unreachable are kept (bounded) and
+# sent after reconnection unless they are older than the TTL (seconds).
+MQTT_OFFLINE_QUEUE_SIZE = int(os.getenv("MQTT_OFFLINE_QUEUE_SIZE", "500"))
+MQTT_OFFLINE_QUEUE_TTL = float(os.getenv("MQTT_OFFLINE_QUEUE_TTL", "60"))
+# Outgoing rate limits (messages per second and burst), for the broker as a
+# whole and for each radiator; 0 disables a limit.  The global burst is at
+# least 3: two tokens are kept for manual commands.
+MQTT_PUBLISH_RATE = float(os.getenv("MQTT_PUBLISH_RATE", "20"))
+MQTT_PUBLISH_BURST = float(os.getenv("MQTT_PUBLISH_BURST", "10"))
+MQTT_DEVICE_PUBLISH_RATE = float(os.getenv("MQTT_DEVICE_PUBLISH_RATE", "2"))
+MQTT_DEVICE_PUBLISH_BURST = float(os.getenv("MQTT_DEVICE_PUBLISH_BURST", "3"))
+
+# "background" connects to MQTT without blocking the worker boot, "sync" keeps
+# the blocking initialization and "off" disables the MQTT runtime entirely.
+RADIATEUR_RUNTIME_MODE = os.getenv("RADIATEUR_RUNTIME_MODE", "background").lower()
+# Maximum time (seconds) AppConfig.ready may take before a slow start is logged
+RADIATEUR_STARTUP_BUDGET = float(os.getenv("RADIATEUR_STARTUP_BUDGET", "0.2"))
+# Base interval (seconds) between two background STATE requests to a radiator;
+# stretched when nothing changes, shortened while radiators are being driven.
+RADIATEUR_POLL_INTERVAL = float(os.getenv("RADIATEUR_POLL_INTERVAL", "30"))
+# Window (seconds) during which successive manual changes of a radiator are
+# merged into a single command carrying the last requested mode (0 disables).
+RADIATEUR_COMMAND_COALESCE_WINDOW = float(os.getenv("RADIATEUR_COMMAND_COALESCE_WINDOW", "0.6"))
+# Longest time (seconds, at most 20) /retourner_etat/?wait= holds a request
+# while the state it already has does not change, and how many requests per
+# process may be held at once; each one occupies a worker thread.
+RADIATEUR_STATE_LONG_POLL_TIMEOUT = float(os.getenv("RADIATEUR_STATE_LONG_POLL_TIMEOUT", "10"))
+RADIATEUR_STATE_LONG_POLL_SLOTS = int(os.getenv("RADIATEUR_STATE_LONG_POLL_SLOTS", "4"))
 
 LOG_DIRECTORY = Path(os.getenv("LOG_DIRECTORY") or (BASE_DIR / "logs"))
 LOG_DIRECTORY.mkdir(parents=True, exist_ok=True)
+# Runtime data kept across restarts (state snapshot...)
+RADIATEUR_DATA_DIRECTORY = Path(os.getenv("RADIATEUR_DATA_DIRECTORY") or (BASE_DIR / "var"))
+# Mode history tables live in the main SQLite database unless overridden;
+# raw transitions older than the retention (days) are replaced by rollups.
+RADIATEUR_HISTORY_DATABASE = Path(
+    os.getenv("RADIATEUR_HISTORY_DATABASE") or DATABASES["default"]["NAME"]
+)
+RADIATEUR_HISTORY_RETENTION_DAYS = float(os.getenv("RADIATEUR_HISTORY_RETENTION_DAYS", "90"))
+# Nominal power (watts) of a radiator, used for the energy estimate
+RADIATEUR_NOMINAL_POWER_W = float(os.getenv("RADIATEUR_NOMINAL_POWER_W", "1000"))
 APP_LOG_FILE = os.getenv("APP_LOG_FILE", "app.log")
 MQTT_LOG_FILE = os.getenv("MQTT_LOG_FILE", "mqtt.log")
+
+# Bearer token allowing Prometheus to scrape /metrics without a session
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Number of spans kept in memory for the /traces/ viewer
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "2000"))
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
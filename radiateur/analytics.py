@@ -0,0 +1,243 @@
+"""Time-in-mode, energy estimate and planning compliance of the radiators.
+
+Mode histories are step functions: the computations below work on the
+transition arrays with NumPy (cumulative durations evaluated at the bucket
+edges with ``searchsorted``) instead of walking every interval in Python.
+Completed periods come from the daily rollups of :mod:`history`; only the
+hours not rolled up yet are computed from raw transitions.  Results for the
+rolled-up part are cached until the next hourly rollup.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from threading import Lock
+from typing import Dict, List, Sequence, Tuple
+
+from django.conf import settings
+
+from .config import TIMEZONE
+from .history import HistoryStore
+from .planning import Timeline, get_planning
+from .services import load_disabled_states
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency handled at runtime
+    np = None
+
+MODES = ("COMFORT", "ECO", "HORSGEL", "OFF")
+# Share of the nominal power drawn on average in each mode (rough estimate).
+MODE_DUTY = {"COMFORT": 0.6, "ECO": 0.4, "HORSGEL": 0.1, "OFF": 0.0}
+BUCKETS = ("day", "week")
+CACHE_SIZE = 256
+
+_OTHER = len(MODES)
+_cache: "OrderedDict[Tuple, object]" = OrderedDict()
+_cache_lock = Lock()
+
+
+def available() -> bool:
+    return np is not None
+
+
+def bucket_edges(start: float, end: float, bucket: str) -> List[float]:
+    """Return local midnights (``day``) or Monday midnights (``week``) around the range."""
+
+    if bucket not in BUCKETS:
+        raise ValueError(bucket)
+    first = datetime.fromtimestamp(start, TIMEZONE).date()
+    if bucket == "week":
+        first -= timedelta(days=first.weekday())
+    last = datetime.fromtimestamp(end, TIMEZONE).date()
+    edges = list(_edges(first, last, 7 if bucket == "week" else 1))
+    if edges[-1] < end:
+        edges.append(_midnight(edges[-1] + 86400 * (7 if bucket == "week" else 1) + 7200))
+    return edges
+
+
+def _midnight(timestamp: float) -> float:
+    day = datetime.fromtimestamp(timestamp, TIMEZONE).date()
+    return TIMEZONE.localize(datetime(day.year, day.month, day.day)).timestamp()
+
+
+@lru_cache(maxsize=64)
+def _edges(first: date, last: date, step_days: int) -> Tuple[float, ...]:
+    edges: List[float] = []
+    day = first
+    while day <= last:
+        edges.append(TIMEZONE.localize(datetime(day.year, day.month, day.day)).timestamp())
+        day += timedelta(days=step_days)
+    return tuple(edges)
+
+
+def _codes(modes: Sequence[str]):
+    lookup = {mode: index for index, mode in enumerate(MODES)}
+    return np.fromiter((lookup.get(mode, _OTHER) for mode in modes), dtype=np.int64, count=len(modes))
+
+
+def step_durations(times, codes, edges, n_codes: int):
+    """Seconds spent in each code between consecutive ``edges``.
+
+    ``times``/``codes`` describe a step function (sorted change times and the
+    value taken from then on); time before the first change is not counted.
+    Returns a ``(len(edges) - 1, n_codes)`` array.
+    """
+
+    times = np.asarray(times, dtype=float)
+    edges = np.asarray(edges, dtype=float)
+    if not len(times):
+        return np.zeros((len(edges) - 1, n_codes))
+
+    onehot = np.zeros((len(times), n_codes))
+    onehot[np.arange(len(times)), codes] = 1.0
+    lengths = np.diff(times, append=max(times[-1], edges[-1]))
+    # cumulative[k] = time per code spent before the k-th change
+    cumulative = np.vstack([np.zeros(n_codes), np.cumsum(onehot * lengths[:, None], axis=0)])[:-1]
+
+    segment = np.searchsorted(times, edges, side="right") - 1
+    inside = segment >= 0
+    segment = np.clip(segment, 0, None)
+    at_edge = cumulative[segment] + onehot[segment] * (edges - times[segment])[:, None]
+    at_edge[~inside] = 0.0
+    return np.diff(at_edge, axis=0)
+
+
+def planned_steps(start: float, end: float, timeline: Timeline | None = None):
+    """Compiled planning as a step function over ``[start, end]``.
+
+    Without ``timeline`` (disabled radiators) the expected mode stays ECO.
+    """
+
+    eco = MODES.index("ECO")
+    times: List[float] = [start - 86400 * 8]
+    if timeline is None or not timeline.transitions:
+        return np.asarray(times), np.asarray([eco], dtype=np.int64)
+
+    lookup = {mode: index for index, mode in enumerate(MODES)}
+    codes: List[int] = [lookup[timeline.transitions[-1][1]]]
+    monday = datetime.fromtimestamp(start, TIMEZONE).date()
+    monday -= timedelta(days=monday.weekday() + 7)
+    while True:
+        reference = datetime(monday.year, monday.month, monday.day)
+        if TIMEZONE.localize(reference).timestamp() >= end:
+            break
+        for minute, mode in timeline.transitions:
+            times.append(TIMEZONE.localize(reference + timedelta(minutes=minute)).timestamp())
+            codes.append(lookup[mode])
+        monday += timedelta(days=7)
+
+    times_array = np.asarray(times, dtype=float)
+    order = np.argsort(times_array, kind="stable")
+    return times_array[order], np.asarray(codes, dtype=np.int64)[order]
+
+
+def compliance(transitions: List[Dict[str, object]], edges: Sequence[float], planned):
+    """Share of the observed time where the actual mode matched ``planned``."""
+
+    if not transitions:
+        return [None] * (len(edges) - 1)
+
+    actual_times = np.array([item["ts"] for item in transitions], dtype=float)
+    actual_codes = _codes([item["mode"] for item in transitions])
+    planned_times, planned_codes = planned
+
+    points = np.union1d(actual_times, planned_times)
+    points = points[points >= actual_times[0]]
+    actual = actual_codes[np.searchsorted(actual_times, points, side="right") - 1]
+    planned = planned_codes[np.searchsorted(planned_times, points, side="right") - 1]
+    agree = step_durations(points, (actual == planned).astype(np.int64), edges, 2)
+
+    observed = agree.sum(axis=1)
+    ratio = np.divide(agree[:, 1], observed, out=np.zeros_like(observed), where=observed > 0)
+    return [value if total else None for value, total in zip(np.round(ratio, 4).tolist(), observed.tolist())]
+
+
+def _rolled_up_durations(store: HistoryStore, edges: Sequence[float], until: float) -> Dict[str, object]:
+    """Per-device ``(buckets, modes)`` seconds from the daily rollups, cached."""
+
+    key = (str(store.path), tuple(edges), until)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]  # type: ignore[return-value]
+
+    rows = store.rollup_rows("day", edges[0], min(until, edges[-1]))
+    result: Dict[str, object] = {}
+    if rows:
+        devices, starts, modes, seconds = zip(*rows)
+        names, device_index = np.unique(np.array(devices), return_inverse=True)
+        bucket_index = np.searchsorted(np.asarray(edges), np.asarray(starts), side="right") - 1
+        totals = np.zeros((len(names), len(edges) - 1, len(MODES) + 1))
+        np.add.at(totals, (device_index, bucket_index, _codes(modes)), np.asarray(seconds))
+        result = {str(name): totals[index] for index, name in enumerate(names)}
+
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def summarize(
+    store: HistoryStore,
+    devices: Sequence[str],
+    start: float,
+    end: float,
+    bucket: str = "day",
+) -> Dict[str, object]:
+    """Return time in mode, estimated kWh and compliance per radiator and bucket."""
+
+    edges = bucket_edges(start, end, bucket)
+    until = store.rollup_until() or edges[0]
+    rolled = _rolled_up_durations(store, edges, until)
+    disabled = load_disabled_states()
+    power_kw = settings.RADIATEUR_NOMINAL_POWER_W / 1000
+    duty = np.array([MODE_DUTY[mode] for mode in MODES])
+    edges_array = np.asarray(edges)
+    # Raw transitions, hence compliance, only exist within the retention.
+    raw_start = max(edges[0], end - store.raw_retention)
+    planning = get_planning()
+    planned: Dict[object, object] = {}
+    # The last bucket usually extends into the future.
+    observed_edges = np.minimum(edges_array, end)
+    tail_edges = np.clip(edges_array, until, min(end, edges[-1]))
+
+    summary: Dict[str, object] = {}
+    for device in devices:
+        durations = rolled.get(device)
+        if durations is None:
+            durations = np.zeros((len(edges) - 1, len(MODES) + 1))
+        transitions = store.transitions(device, raw_start, edges[-1])
+        if transitions and until < edges[-1]:
+            # Hours not rolled up yet: integrate the raw transitions.
+            times = np.array([item["ts"] for item in transitions], dtype=float)
+            first = max(0, int(np.searchsorted(times, until, side="right")) - 1)
+            times = times[first:]
+            times[0] = max(times[0], until)
+            codes = _codes([item["mode"] for item in transitions[first:]])
+            durations = durations + step_durations(times, codes, tail_edges, len(MODES) + 1)
+
+        # Radiators sharing a planning share its step function.
+        timeline = None if disabled.get(device) else planning.timeline_for(device)
+        key = timeline.transitions if timeline is not None else None
+        expected = planned.get(key)
+        if expected is None:
+            expected = planned[key] = planned_steps(raw_start, edges[-1], timeline)
+
+        hours = np.round(durations[:, : len(MODES)] / 3600, 3)
+        kwh = np.round(hours @ duty * power_kw, 3)
+        summary[device] = {
+            "hours": dict(zip(MODES, hours.T.tolist())),
+            "kwh": kwh.tolist(),
+            "compliance": compliance(transitions, observed_edges, expected),
+        }
+
+    return {"bucket": bucket, "starts": edges[:-1], "devices": summary}
+
+
+def clear_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
@@ -1,4 +1,9 @@
+import os
+import sys
+import time
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class RadiateurConfig(AppConfig):
@@ -7,5 +12,21 @@ class RadiateurConfig(AppConfig):
 
     def ready(self):  # pragma: no cover - executed at runtime
         from . import runtime
+        from .metrics import REGISTRY
+        from .services import enregistrer_log
+
+        if not runtime.should_start_runtime(sys.argv, os.environ):
+            return
+
+        started = time.perf_counter()
+        runtime.start()
+        elapsed = time.perf_counter() - started
 
-        runtime.initialize()
+        REGISTRY.gauge(
+            "radiateur_startup_seconds",
+            "Temps passé dans AppConfig.ready au démarrage du processus.",
+        ).set(elapsed)
+        if elapsed > settings.RADIATEUR_STARTUP_BUDGET:
+            enregistrer_log(
+                f"Démarrage lent: {elapsed:.3f} s (budget {settings.RADIATEUR_STARTUP_BUDGET:.3f} s)"
+            )
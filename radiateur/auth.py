@@ -1,8 +1,9 @@
 """Authentication views for the radiateur application."""
 
-from django.conf import settings
 from django.contrib.auth.views import LoginView
 
+from .middleware import refresh_session
+
 
 class PersistentLoginView(LoginView):
     """Login view keeping the session active for an extended period."""
@@ -13,6 +14,6 @@ class PersistentLoginView(LoginView):
         response = super().form_valid(form)
         # Refresh the session expiry so authenticated users can stay logged in
         # as long as they use the interface regularly.
-        self.request.session.set_expiry(settings.SESSION_COOKIE_AGE)
+        refresh_session(self.request.session)
         return response
 
@@ -0,0 +1,88 @@
+"""Injectable wall clock for the planning scheduler, boosts and logs.
+
+Code that follows the calendar reads the time through :data:`CLOCK` instead
+of ``time.time()``/``datetime.now()``.  It delegates to the system clock by
+default; :func:`use_clock` swaps in a :class:`SimulatedClock` whose
+``sleep`` advances time instantly, which lets a week of planning run in a
+few seconds.  Network timeouts (MQTT replies, retransmissions) keep using
+the real clock.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator
+
+from .config import TIMEZONE
+
+
+class SystemClock:
+    """The real clock."""
+
+    def time(self) -> float:
+        return time.time()
+
+    def now(self) -> datetime:
+        """Return the current time as an aware datetime in the application timezone."""
+
+        return datetime.fromtimestamp(self.time(), TIMEZONE)
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        """Wait for ``event`` at most ``timeout`` seconds; return whether it is set."""
+
+        return event.wait(timeout)
+
+
+class SimulatedClock(SystemClock):
+    """Manually driven clock; sleeping advances it without blocking."""
+
+    def __init__(self, start: float) -> None:
+        self._now = start
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        with self._lock:
+            return self._now
+
+    def advance(self, seconds: float) -> None:
+        with self._lock:
+            self._now += max(0.0, seconds)
+
+    def sleep(self, seconds: float) -> None:
+        self.advance(seconds)
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        if not event.is_set():
+            self.advance(timeout)
+        return event.is_set()
+
+
+class _ClockProxy:
+    """Stable handle delegating to the clock currently in use."""
+
+    def __init__(self) -> None:
+        self.source: SystemClock = SystemClock()
+
+    def __getattr__(self, name: str):
+        return getattr(self.source, name)
+
+
+CLOCK = _ClockProxy()
+
+
+@contextmanager
+def use_clock(clock: SystemClock) -> Iterator[SystemClock]:
+    """Temporarily make ``clock`` the application clock."""
+
+    previous = CLOCK.source
+    CLOCK.source = clock
+    try:
+        yield clock
+    finally:
+        CLOCK.source = previous
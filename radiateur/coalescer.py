@@ -0,0 +1,173 @@
+"""Per-radiator coalescing of manual mode changes.
+
+Tapping through the modes on the dashboard used to publish one command per
+click, each one switching the relay of the ESP8266.  Manual changes now open
+a short window per radiator (``RADIATEUR_COMMAND_COALESCE_WINDOW``) on a
+:class:`~radiateur.timers.TimerWheel`; only the last mode requested during
+the window is published, with the command id of that last request.  Nothing
+is sent when the radiator already is (or is about to be) in that mode.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+
+from . import tracing
+from .configstore import ConfigSnapshot, get_config
+from .delivery import TRACKER
+from .metrics import REGISTRY
+from .services import (
+    enregistrer_log,
+    envoyer_changement_etat_mqtt,
+    envoyer_modes_mqtt,
+    get_liste_etat,
+    radiateurs_disponibles,
+)
+from .timers import TimerWheel
+
+_COALESCED = REGISTRY.counter(
+    "radiateur_commands_coalesced_total",
+    "Changements de mode manuels remplacés par un changement plus récent avant l'envoi.",
+)
+_NOOP = REGISTRY.counter(
+    "radiateur_commands_noop_total",
+    "Changements de mode manuels non envoyés car le radiateur est déjà dans ce mode.",
+)
+
+
+class CommandCoalescer:
+    """Merge the manual commands sent to a radiator within ``window`` seconds."""
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self._lock = threading.Lock()
+        # radiator -> (mode, command id) waiting for the end of its window
+        self._pending: Dict[str, Tuple[str, str]] = {}
+        self._client = None
+        self._wheel = TimerWheel(self._expire)
+
+    def submit(
+        self,
+        mode: str,
+        mqtt_client,
+        liste_radiateur: Iterable[str] | None = None,
+        config: ConfigSnapshot | None = None,
+    ) -> Tuple[Dict[str, str], str]:
+        """Request ``mode`` for the radiators; return the intended modes and the command id.
+
+        The intended modes honour the disabled configuration like
+        :func:`~radiateur.services.envoyer_changement_etat_mqtt`.
+        """
+
+        config = config or get_config()
+        if liste_radiateur is None:
+            liste_radiateur = radiateurs_disponibles(config.radiators)
+        command_id = tracing.current_trace_id() or tracing.new_correlation_id()
+        applied = {appareil: config.target_mode(appareil, mode) for appareil in liste_radiateur}
+        if self.window <= 0:
+            for appareil, target in applied.items():
+                self._send(mqtt_client, appareil, target, command_id)
+            return applied, command_id
+
+        superseded = []
+        with self._lock:
+            self._client = mqtt_client
+            for appareil, target in applied.items():
+                previous = self._pending.get(appareil)
+                self._pending[appareil] = (target, command_id)
+                if previous is None:
+                    self._wheel.schedule(appareil, self._wheel.clock() + self.window)
+                else:
+                    superseded.append(previous[1])
+                    _COALESCED.inc()
+        for previous_id in superseded:
+            # Let the UI polling the replaced command see it as finished.
+            TRACKER.track(previous_id, {})
+        self._wheel.start()
+        return applied, command_id
+
+    def deferred(self, command_id: str) -> Dict[str, str]:
+        """Return the modes of ``command_id`` still waiting for their window."""
+
+        with self._lock:
+            return {
+                appareil: mode for appareil, (mode, cid) in self._pending.items() if cid == command_id
+            }
+
+    def discard(self, appareils: Iterable[str]) -> None:
+        """Drop the commands waiting for ``appareils`` (a newer command replaces them)."""
+
+        with self._lock:
+            dropped = [self._pending.pop(appareil, None) for appareil in appareils]
+        for entry in dropped:
+            if entry is not None:
+                _COALESCED.inc()
+                TRACKER.track(entry[1], {})
+
+    def send_now(self, modes: Dict[str, str], mqtt_client, command_id: str) -> Dict[str, str]:
+        """Send ``modes`` (disabled overrides applied) at once as one grouped command.
+
+        Waiting commands for the same radiators are dropped.  Return the
+        outcome per radiator: ``sent`` or ``unchanged`` (already in that mode).
+        """
+
+        self.discard(modes)
+        results: Dict[str, str] = {}
+        a_envoyer: Dict[str, str] = {}
+        for appareil, mode in modes.items():
+            if _mode_courant(appareil) == mode:
+                _NOOP.inc()
+                TRACKER.settle(command_id, appareil, mode)
+                results[appareil] = "unchanged"
+            else:
+                a_envoyer[appareil] = mode
+                results[appareil] = "sent"
+        if a_envoyer:
+            envoyer_modes_mqtt(a_envoyer, mqtt_client, command_id)
+        return results
+
+    def flush(self) -> None:
+        """Send every waiting command now."""
+
+        self._wheel.advance(self._wheel.clock() + self.window)
+
+    def _expire(self, appareil: str, payload: object) -> None:
+        with self._lock:
+            entry = self._pending.pop(appareil, None)
+            mqtt_client = self._client
+        if entry is not None and mqtt_client is not None:
+            self._send(mqtt_client, appareil, *entry)
+
+    def _send(self, mqtt_client, appareil: str, mode: str, command_id: str) -> None:
+        if _mode_courant(appareil) == mode:
+            _NOOP.inc()
+            TRACKER.settle(command_id, appareil, mode)
+            enregistrer_log(f"Commande ignorée: {appareil} déjà en mode {mode}")
+            return
+        envoyer_changement_etat_mqtt(mode, mqtt_client, [appareil], command_id=command_id)
+
+
+def _mode_courant(appareil: str) -> Optional[str]:
+    """Mode the radiator is in, or is about to be in once its ACK arrives."""
+
+    return TRACKER.pending_modes().get(appareil) or get_liste_etat().get(appareil)
+
+
+COALESCER = CommandCoalescer(getattr(settings, "RADIATEUR_COMMAND_COALESCE_WINDOW", 0.6))
+
+
+def command_status(command_id: str) -> Optional[Dict[str, object]]:
+    """Delivery status of ``command_id``, including the radiators still in their window."""
+
+    status = TRACKER.status(command_id)
+    deferred = COALESCER.deferred(command_id)
+    if not deferred:
+        return status
+    if status is None:
+        status = {"command_id": command_id, "acknowledged": {}, "pending": {}, "failed": []}
+    status["pending"].update(deferred)
+    status["complete"] = False
+    return status
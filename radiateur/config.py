@@ -21,6 +21,12 @@ class MQTTSettings:
     log_file: Path
     start_command: Optional[Tuple[str, ...]]
     start_timeout: float
+    offline_queue_size: int
+    offline_queue_ttl: float
+    publish_rate: float
+    publish_burst: float
+    device_publish_rate: float
+    device_publish_burst: float
 
 
 def _resolve_log_path(filename: str) -> Path:
@@ -36,6 +42,7 @@ def _resolve_log_path(filename: str) -> Path:
 TIMEZONE = pytz.timezone(settings.APP_TIMEZONE)
 APP_LOG_FILE = _resolve_log_path(settings.APP_LOG_FILE)
 MQTT_LOG_FILE = _resolve_log_path(settings.MQTT_LOG_FILE)
+DATA_DIRECTORY = Path(settings.RADIATEUR_DATA_DIRECTORY)
 
 def _parse_start_command(value: Optional[str]) -> Optional[Tuple[str, ...]]:
     """Parse the configured start command into a tuple of arguments."""
@@ -56,4 +63,10 @@ MQTT_SETTINGS = MQTTSettings(
     log_file=MQTT_LOG_FILE,
     start_command=_parse_start_command(settings.MQTT_BROKER_START_COMMAND),
     start_timeout=settings.MQTT_BROKER_START_TIMEOUT,
+    offline_queue_size=settings.MQTT_OFFLINE_QUEUE_SIZE,
+    offline_queue_ttl=settings.MQTT_OFFLINE_QUEUE_TTL,
+    publish_rate=settings.MQTT_PUBLISH_RATE,
+    publish_burst=settings.MQTT_PUBLISH_BURST,
+    device_publish_rate=settings.MQTT_DEVICE_PUBLISH_RATE,
+    device_publish_burst=settings.MQTT_DEVICE_PUBLISH_BURST,
 )
@@ -0,0 +1,194 @@
+"""Versioned, immutable snapshot of the on-disk configuration.
+
+The radiator list (settings and ``devices.json``), the disabled flags
+(``options.json``) and the default schedule (``data.json``) used to be read
+from disk several times per request.  :func:`get_config` now returns a
+:class:`ConfigSnapshot` built once and shared by every thread.  Writers go
+through this module (or call :func:`refresh`), which rebuilds the snapshot
+and swaps it in a single assignment; edits made outside the process are
+noticed by a ``stat`` of the files at most once per :data:`CHECK_INTERVAL`.
+Every rebuild increments ``version``.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from .config import MQTT_SETTINGS
+from .models import DEVICES_FILE_PATH, RadiatorDevice, load_devices
+
+OPTIONS_FILE_PATH = Path(__file__).resolve().parent / "templates" / "options.json"
+PLANNING_FILE_PATH = Path(__file__).resolve().parent / "templates" / "data.json"
+
+WEEKDAYS = (
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+)
+
+CHECK_INTERVAL = 1.0
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Configuration at one point in time; never mutated once published."""
+
+    version: int
+    radiators: Tuple[str, ...]
+    devices: Tuple[RadiatorDevice, ...]
+    disabled: Mapping[str, bool]
+    schedule: Mapping[str, Tuple[Mapping[str, str], ...]]
+    stamp: Tuple[Optional[int], ...] = ()
+
+    def is_disabled(self, radiator: str) -> bool:
+        return self.disabled.get(radiator, False)
+
+    def target_mode(self, radiator: str, mode: str) -> str:
+        """Mode actually sent to ``radiator``: ECO when it is disabled."""
+
+        return "ECO" if self.disabled.get(radiator) else mode
+
+    def disabled_map(self) -> Dict[str, bool]:
+        return dict(self.disabled)
+
+    def schedule_dict(self) -> Dict[str, List[Dict[str, str]]]:
+        """Return a mutable copy of the schedule."""
+
+        return {day: [dict(entry) for entry in entries] for day, entries in self.schedule.items()}
+
+
+def sanitize_schedule(payload: object) -> Dict[str, List[Dict[str, str]]]:
+    """Return a predictable structure from the raw JSON payload."""
+
+    schedule: Dict[str, List[Dict[str, str]]] = {day: [] for day in WEEKDAYS}
+    if not isinstance(payload, dict):
+        return schedule
+
+    for day, entries in payload.items():
+        if day not in schedule or not isinstance(entries, list):
+            continue
+
+        sanitized_entries: List[Dict[str, str]] = []
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            start = entry.get("start")
+            end = entry.get("end")
+            if isinstance(start, str) and isinstance(end, str):
+                sanitized_entries.append({"start": start, "end": end})
+
+        schedule[day] = sanitized_entries
+
+    return schedule
+
+
+def _read_json(path: Path) -> object:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def file_version(path: Path) -> Optional[int]:
+    """Return the modification stamp of ``path`` (``None`` when missing), for cache keys."""
+
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _stamp() -> Tuple[Optional[int], ...]:
+    return tuple(file_version(path) for path in (DEVICES_FILE_PATH, OPTIONS_FILE_PATH, PLANNING_FILE_PATH))
+
+
+def _build(version: int) -> ConfigSnapshot:
+    stamp = _stamp()
+    devices = tuple(load_devices())
+    radiators = [name.strip() for name in MQTT_SETTINGS.devices if name.strip()]
+    seen = set(radiators)
+    for device in devices:
+        if device.name and device.name not in seen:
+            radiators.append(device.name)
+            seen.add(device.name)
+
+    disabled = {radiator: False for radiator in radiators}
+    raw = _read_json(OPTIONS_FILE_PATH)
+    if isinstance(raw, dict):
+        for radiator, value in raw.items():
+            if radiator in disabled:
+                disabled[radiator] = bool(value)
+
+    schedule = sanitize_schedule(_read_json(PLANNING_FILE_PATH) or {})
+    return ConfigSnapshot(
+        version=version,
+        radiators=tuple(radiators),
+        devices=devices,
+        disabled=MappingProxyType(disabled),
+        schedule=MappingProxyType({
+            day: tuple(MappingProxyType(entry) for entry in entries) for day, entries in schedule.items()
+        }),
+        stamp=stamp,
+    )
+
+
+_current: Optional[ConfigSnapshot] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_config() -> ConfigSnapshot:
+    """Return the current snapshot (no file read unless the files changed)."""
+
+    global _current, _checked_at
+    current = _current
+    now = time.monotonic()
+    if current is not None and now - _checked_at < CHECK_INTERVAL:
+        return current
+    with _lock:
+        if _current is None or _current.stamp != _stamp():
+            _current = _build(_current.version + 1 if _current is not None else 1)
+        _checked_at = now
+        return _current
+
+
+def refresh() -> ConfigSnapshot:
+    """Rebuild the snapshot now; called after every write to a configuration file."""
+
+    global _current, _checked_at
+    with _lock:
+        _current = _build(_current.version + 1 if _current is not None else 1)
+        _checked_at = time.monotonic()
+        return _current
+
+
+def _write_json(path: Path, data: object) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(data, ensure_ascii=False, indent=4), encoding="utf-8")
+    temporary.replace(path)
+
+
+def save_disabled(states: Mapping[str, bool]) -> ConfigSnapshot:
+    """Persist the disabled flags of the known radiators and publish the new snapshot."""
+
+    known = get_config().radiators
+    _write_json(OPTIONS_FILE_PATH, {radiator: bool(states.get(radiator, False)) for radiator in known})
+    return refresh()
+
+
+def save_schedule(schedule: Mapping[str, object]) -> ConfigSnapshot:
+    """Persist the default weekly schedule and publish the new snapshot."""
+
+    _write_json(PLANNING_FILE_PATH, schedule)
+    return refresh()
@@ -0,0 +1,238 @@
+"""Tracking of in-flight commands until every radiator acknowledges them.
+
+Each command published by :func:`services.envoyer_changement_etat_mqtt`
+carries a command id (the ``CID`` also used for tracing).  Radiators answer
+with ``"TYPE": "ACK"`` and the same id once the mode is applied.  Devices that
+stay silent past their deadline (the radiator RTO, see :mod:`rtt`) are
+retransmitted individually, with the deadline doubling on each attempt,
+until ``max_attempts`` is reached.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Condition
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .metrics import REGISTRY
+from .rtt import RTT
+
+ACK_TIMEOUT = 2.0
+MAX_ATTEMPTS = 3
+COMPLETED_HISTORY = 200
+
+_ACKS = REGISTRY.counter(
+    "radiateur_command_acks_total",
+    "Acquittements de commandes reçus des radiateurs.",
+    ("device",),
+)
+_RETRANSMITS = REGISTRY.counter(
+    "radiateur_command_retransmits_total",
+    "Commandes renvoyées à un radiateur faute d'acquittement.",
+    ("device",),
+)
+_FAILURES = REGISTRY.counter(
+    "radiateur_command_failures_total",
+    "Commandes jamais acquittées après toutes les tentatives.",
+    ("device",),
+)
+_IN_FLIGHT = REGISTRY.gauge(
+    "radiateur_commands_in_flight",
+    "Couples commande/radiateur en attente d'acquittement.",
+)
+
+
+@dataclass
+class PendingDelivery:
+    """Delivery state of one command for one radiator."""
+
+    mode: str
+    sent_at: float
+    deadline: float
+    attempts: int = 1
+
+
+@dataclass
+class CommandStatus:
+    """Delivery state of one command across its target radiators."""
+
+    command_id: str
+    created_at: float
+    pending: Dict[str, PendingDelivery] = field(default_factory=dict)
+    acknowledged: Dict[str, str] = field(default_factory=dict)
+    failed: List[str] = field(default_factory=list)
+
+    @property
+    def complete(self) -> bool:
+        return not self.pending
+
+    def to_json(self) -> Dict[str, object]:
+        return {
+            "command_id": self.command_id,
+            "complete": self.complete,
+            "acknowledged": dict(self.acknowledged),
+            "pending": {device: item.mode for device, item in self.pending.items()},
+            "failed": list(self.failed),
+        }
+
+
+class DeliveryTracker:
+    """Thread-safe registry of commands awaiting acknowledgements."""
+
+    def __init__(
+        self,
+        ack_timeout: float = ACK_TIMEOUT,
+        max_attempts: int = MAX_ATTEMPTS,
+        timeout_for: Callable[[str], float] | None = None,
+        observe_rtt: Callable[[str, float], None] | None = None,
+    ) -> None:
+        self.ack_timeout = ack_timeout
+        self.max_attempts = max_attempts
+        self._timeout_for = timeout_for or (lambda device: self.ack_timeout)
+        self._observe_rtt = observe_rtt
+        self._commands: "OrderedDict[str, CommandStatus]" = OrderedDict()
+        self._condition = Condition()
+
+    def _update_gauge(self) -> None:
+        _IN_FLIGHT.set(sum(len(command.pending) for command in self._commands.values()))
+
+    def _trim(self) -> None:
+        completed = [cid for cid, command in self._commands.items() if command.complete]
+        for cid in completed[: max(0, len(completed) - COMPLETED_HISTORY)]:
+            del self._commands[cid]
+
+    def track(self, command_id: str, targets: Dict[str, str], now: float | None = None) -> None:
+        """Register ``targets`` (device -> mode) as awaiting ``command_id`` ACKs."""
+
+        now = time.monotonic() if now is None else now
+        with self._condition:
+            command = self._commands.setdefault(
+                command_id, CommandStatus(command_id=command_id, created_at=time.time())
+            )
+            for device, mode in targets.items():
+                # A newer command supersedes older pending ones for the device.
+                for other in self._commands.values():
+                    if other is not command:
+                        other.pending.pop(device, None)
+                command.pending[device] = PendingDelivery(
+                    mode=mode, sent_at=now, deadline=now + self._timeout_for(device)
+                )
+            self._trim()
+            self._update_gauge()
+            self._condition.notify_all()
+
+    def acknowledge(self, command_id: str, device: str, state: str) -> Optional[float]:
+        """Mark ``device`` as done; return the round-trip time when it was pending."""
+
+        with self._condition:
+            command = self._commands.get(command_id)
+            if command is None:
+                return None
+            pending = command.pending.pop(device, None)
+            if pending is None:
+                return None
+            command.acknowledged[device] = state
+            _ACKS.inc(device=device)
+            self._update_gauge()
+            self._condition.notify_all()
+        rtt = time.monotonic() - pending.sent_at
+        # Karn: the RTT of a retransmitted command is ambiguous.
+        if pending.attempts == 1 and self._observe_rtt is not None:
+            self._observe_rtt(device, rtt)
+        return rtt
+
+    def settle(self, command_id: str, device: str, state: str) -> None:
+        """Record ``device`` as already in ``state`` for ``command_id`` (nothing sent)."""
+
+        with self._condition:
+            command = self._commands.setdefault(
+                command_id, CommandStatus(command_id=command_id, created_at=time.time())
+            )
+            command.pending.pop(device, None)
+            command.acknowledged[device] = state
+            self._trim()
+            self._update_gauge()
+            self._condition.notify_all()
+
+    def confirm_state(self, device: str, state: str) -> List[str]:
+        """Treat a plain state report matching a pending mode as an ACK."""
+
+        confirmed: List[str] = []
+        with self._condition:
+            for command in self._commands.values():
+                pending = command.pending.get(device)
+                if pending is not None and pending.mode == state:
+                    del command.pending[device]
+                    command.acknowledged[device] = state
+                    confirmed.append(command.command_id)
+            if confirmed:
+                self._update_gauge()
+                self._condition.notify_all()
+        return confirmed
+
+    def pending_modes(self) -> Dict[str, str]:
+        """Return the mode each radiator still has to acknowledge."""
+
+        with self._condition:
+            return {
+                device: item.mode
+                for command in self._commands.values()
+                for device, item in command.pending.items()
+            }
+
+    def status(self, command_id: str) -> Optional[Dict[str, object]]:
+        with self._condition:
+            command = self._commands.get(command_id)
+            return command.to_json() if command is not None else None
+
+    def collect_due(
+        self, now: float | None = None
+    ) -> Tuple[List[Tuple[str, str, str]], List[Tuple[str, str]]]:
+        """Return ``(retransmit, failed)`` entries whose deadline has passed.
+
+        ``retransmit`` holds ``(command_id, device, mode)`` triples to send
+        again, ``failed`` the ``(command_id, device)`` pairs given up on.
+        """
+
+        now = time.monotonic() if now is None else now
+        retransmit: List[Tuple[str, str, str]] = []
+        failed: List[Tuple[str, str]] = []
+        with self._condition:
+            for command in self._commands.values():
+                for device, item in list(command.pending.items()):
+                    if item.deadline > now:
+                        continue
+                    if item.attempts >= self.max_attempts:
+                        del command.pending[device]
+                        command.failed.append(device)
+                        failed.append((command.command_id, device))
+                        _FAILURES.inc(device=device)
+                        continue
+                    item.attempts += 1
+                    item.deadline = now + self._timeout_for(device) * (2 ** (item.attempts - 1))
+                    retransmit.append((command.command_id, device, item.mode))
+                    _RETRANSMITS.inc(device=device)
+            if failed:
+                self._update_gauge()
+                self._condition.notify_all()
+        return retransmit, failed
+
+    def wait_for_deadline(self, max_wait: float = 1.0) -> None:
+        """Sleep until the earliest pending deadline (or a change)."""
+
+        with self._condition:
+            deadlines = [
+                item.deadline
+                for command in self._commands.values()
+                for item in command.pending.values()
+            ]
+            timeout = max_wait
+            if deadlines:
+                timeout = max(0.0, min(max_wait, min(deadlines) - time.monotonic()))
+            if timeout > 0:
+                self._condition.wait(timeout)
+
+
+TRACKER = DeliveryTracker(timeout_for=RTT.rto, observe_rtt=RTT.observe)
@@ -0,0 +1,274 @@
+"""Append-only binary journal of commands and radiator replies.
+
+Each event is a fixed 16-byte little-endian record::
+
+    float64 timestamp | uint16 device id | uint8 event | uint8 mode | uint32 CID
+
+Device names are mapped to ids in a small JSON sidecar shared by every
+server process (ids are only assigned under its lock, after reloading it),
+modes and event types to the codes below, and the 8-hex-digit correlation id is stored as
+an integer.  Records go through a buffered writer flushed every second; the
+reader maps the file and decodes it in place (a NumPy structured view when
+available, ``struct.iter_unpack`` over the mapping otherwise), so scanning
+does not depend on parsing text logs.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .locking import locked, replace_text
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency handled at runtime
+    np = None
+
+RECORD = struct.Struct("<dHBBI")
+MAGIC = b"RADJ\x01".ljust(RECORD.size, b"\x00")
+JOURNAL_FILE = "events.bin"
+DEVICES_FILE = "events.devices.json"
+LOCK_FILE = "events.lock"
+FLUSH_INTERVAL = 1.0
+BUFFER_SIZE = 64 * 1024
+
+COMMAND = 1
+RETRANSMIT = 2
+ACK = 3
+REPORT = 4
+STATE_QUERY = 5
+TIMEOUT = 6
+EVENT_NAMES = {
+    COMMAND: "command",
+    RETRANSMIT: "retransmit",
+    ACK: "ack",
+    REPORT: "report",
+    STATE_QUERY: "state_query",
+    TIMEOUT: "timeout",
+}
+EVENT_CODES = {name: code for code, name in EVENT_NAMES.items()}
+
+MODES = ("", "COMFORT", "ECO", "HORSGEL", "OFF", "ERROR", "STATE", "DEFAULT")
+MODE_CODES = {mode: code for code, mode in enumerate(MODES)}
+UNKNOWN_MODE = 255
+
+if np is not None:
+    RECORD_DTYPE = np.dtype(
+        [("ts", "<f8"), ("device", "<u2"), ("event", "u1"), ("mode", "u1"), ("cid", "<u4")]
+    )
+
+
+def encode_cid(correlation_id: Optional[str]) -> int:
+    try:
+        return int(correlation_id or "0", 16) & 0xFFFFFFFF
+    except ValueError:
+        return 0
+
+
+class EventJournal:
+    """Buffered writer and mapped reader of the binary journal."""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / JOURNAL_FILE
+        self.devices_path = self.directory / DEVICES_FILE
+        self.lock_path = self.directory / LOCK_FILE
+        self._lock = threading.Lock()
+        self._devices: List[str] = []
+        self._device_ids: Dict[str, int] = {}
+        self._refresh_devices()
+
+        # The other workers may open the journal at the same time.
+        with locked(self.lock_path):
+            new = not self.path.exists() or self.path.stat().st_size == 0
+            self._file = open(self.path, "ab", buffering=BUFFER_SIZE)
+            if new:
+                self._file.write(MAGIC)
+                self._file.flush()
+            else:
+                # Drop a record torn by a crash so the file stays aligned.
+                size = self.path.stat().st_size
+                if size % RECORD.size:
+                    self._file.truncate(size - size % RECORD.size)
+        self._dirty = False
+        self._stop = threading.Event()
+        threading.Thread(target=self._flush_loop, name="radiateur-events", daemon=True).start()
+
+    def _load_devices(self) -> List[str]:
+        try:
+            devices = json.loads(self.devices_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return []
+        return [str(name) for name in devices] if isinstance(devices, list) else []
+
+    def _refresh_devices(self) -> None:
+        """Pick up the devices the other processes added to the sidecar."""
+
+        devices = self._load_devices()
+        if len(devices) > len(self._devices):
+            self._devices = devices
+            self._device_ids = {name: index for index, name in enumerate(devices)}
+
+    def _device_id(self, device: str) -> int:
+        device_id = self._device_ids.get(device)
+        if device_id is None:
+            # The sidecar only grows, and only under the lock: every process
+            # sees the same id for a given device.
+            with locked(self.lock_path):
+                self._refresh_devices()
+                device_id = self._device_ids.get(device)
+                if device_id is None:
+                    device_id = self._device_ids[device] = len(self._devices)
+                    self._devices.append(device)
+                    replace_text(self.devices_path, json.dumps(self._devices, ensure_ascii=False))
+        return device_id
+
+    def append(
+        self,
+        event: int,
+        device: str,
+        mode: Optional[str] = None,
+        correlation_id: Optional[str] = None,
+        timestamp: Optional[float] = None,
+    ) -> None:
+        with self._lock:
+            record = RECORD.pack(
+                time.time() if timestamp is None else timestamp,
+                self._device_id(device),
+                event,
+                MODE_CODES.get(mode or "", UNKNOWN_MODE),
+                encode_cid(correlation_id),
+            )
+            self._file.write(record)
+            self._dirty = True
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._dirty:
+                self._file.flush()
+                self._dirty = False
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(FLUSH_INTERVAL):
+            self.flush()
+
+    def close(self) -> None:
+        self._stop.set()
+        self.flush()
+        with self._lock:
+            self._file.close()
+
+    # -- reading ----------------------------------------------------------
+
+    def _map(self) -> Optional[Tuple[mmap.mmap, int]]:
+        with open(self.path, "rb") as handle:
+            size = os.fstat(handle.fileno()).st_size
+            count = size // RECORD.size - 1
+            if count <= 0:
+                return None
+            return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ), count
+
+    def records(self):
+        """Return every record as a NumPy structured array (zero-copy view)."""
+
+        if np is None:
+            raise RuntimeError("NumPy n'est pas installé")
+        mapped = self._map()
+        if mapped is None:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        buffer, count = mapped
+        return np.frombuffer(buffer, dtype=RECORD_DTYPE, count=count, offset=RECORD.size)
+
+    def _iter_records(self) -> Iterator[Tuple[float, int, int, int, int]]:
+        mapped = self._map()
+        if mapped is None:
+            return
+        buffer, count = mapped
+        with buffer, memoryview(buffer) as view:
+            yield from RECORD.iter_unpack(view[RECORD.size : RECORD.size * (count + 1)])
+
+    def query(
+        self,
+        device: Optional[str] = None,
+        event: Optional[int] = None,
+        correlation_id: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        limit: int = 500,
+    ) -> List[Dict[str, object]]:
+        """Return the most recent matching events, newest first."""
+
+        with self._lock:
+            self._refresh_devices()
+            devices = self._devices
+        device_id = devices.index(device) if device in devices else None
+        if device is not None and device_id is None:
+            return []
+        cid = encode_cid(correlation_id) if correlation_id else None
+
+        if np is not None:
+            records = self.records()
+            mask = np.ones(len(records), dtype=bool)
+            if device_id is not None:
+                mask &= records["device"] == device_id
+            if event is not None:
+                mask &= records["event"] == event
+            if cid is not None:
+                mask &= records["cid"] == cid
+            if start is not None:
+                mask &= records["ts"] >= start
+            if end is not None:
+                mask &= records["ts"] <= end
+            selected = records[np.flatnonzero(mask)[-limit:][::-1]].tolist()
+        else:
+            selected = [
+                record
+                for record in self._iter_records()
+                if (device_id is None or record[1] == device_id)
+                and (event is None or record[2] == event)
+                and (cid is None or record[4] == cid)
+                and (start is None or record[0] >= start)
+                and (end is None or record[0] <= end)
+            ][-limit:][::-1]
+
+        return [
+            {
+                "ts": ts,
+                "device": devices[device_index] if device_index < len(devices) else None,
+                "event": EVENT_NAMES.get(event_code, str(event_code)),
+                "mode": MODES[mode] if mode < len(MODES) else None,
+                "cid": f"{cid_value:08x}" if cid_value else None,
+            }
+            for ts, device_index, event_code, mode, cid_value in selected
+        ]
+
+
+_journal: Optional[EventJournal] = None
+
+
+def open_journal(directory: Path) -> EventJournal:
+    """Open the shared journal (called once by the runtime)."""
+
+    global _journal
+    if _journal is None:
+        _journal = EventJournal(directory)
+    return _journal
+
+
+def get_journal() -> Optional[EventJournal]:
+    return _journal
+
+
+def record(event: int, device: str, mode: Optional[str] = None, correlation_id: Optional[str] = None) -> None:
+    """Append an event when the journal is open (no-op otherwise, e.g. in tests)."""
+
+    if _journal is not None:
+        _journal.append(event, device, mode, correlation_id)
@@ -0,0 +1,128 @@
+"""In-memory radiators answering the application's MQTT payloads.
+
+:class:`RadiatorFleet` has no network access: the planning fast-forward
+harness (:mod:`radiateur.simulation`) drives it directly and the standalone
+MQTT simulator (``simulator/fake_radiators.py``) wraps it.  The module only
+uses the standard library so the simulator can import it without Django.
+"""
+
+from __future__ import annotations
+
+import ast
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+def parse_payload(payload: str) -> Optional[Dict[str, object]]:
+    """Attempt to convert the textual payload to a dictionary."""
+
+    try:
+        parsed = ast.literal_eval(payload)
+    except (ValueError, SyntaxError):
+        return None
+
+    if not isinstance(parsed, dict):
+        return None
+    return parsed
+
+
+class RadiatorFleet:
+    """In-memory radiators answering commands, without any network access.
+
+    Every mode change is recorded in :attr:`changes` as ``(timestamp,
+    radiator, previous, new)``; commands that do not change the mode are
+    counted in :attr:`redundant_commands`.
+    """
+
+    def __init__(
+        self,
+        devices: Iterable[str],
+        initial_state: str = "DEFAULT",
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.initial_state = initial_state
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._states: Dict[str, str] = {name: initial_state for name in devices}
+        self.changes: List[Tuple[float, str, str, str]] = []
+        self.redundant_commands: List[Tuple[float, str, str]] = []
+
+    def states(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._states)
+
+    def handle(self, payload: str) -> List[Dict[str, object]]:
+        """Process one message and return the replies to publish."""
+
+        parsed = parse_payload(payload)
+        if not parsed:
+            return []
+
+        command = str(parsed.get("COMMAND", "")).strip()
+        if not command:
+            return []
+
+        targets = self.resolve_targets(parsed.get("TO"))
+        sender = parsed.get("FROM")
+        correlation_id = parsed.get("CID")
+        if command.upper() == "STATE":
+            return [self.state_message(target, sender, correlation_id) for target in targets]
+
+        replies = []
+        for target in targets:
+            self.apply(target, command)
+            replies.append(self.state_message(target, sender, correlation_id, acknowledge=True))
+        return replies
+
+    def resolve_targets(self, raw_target) -> List[str]:
+        """Determine which radiators are addressed by a message."""
+
+        if isinstance(raw_target, str):
+            target = raw_target.strip()
+            with self._lock:
+                if target in {"ALL", "*"}:
+                    return list(self._states.keys())
+                if target in self._states:
+                    return [target]
+        return []
+
+    def apply(self, target: str, new_state: str) -> str:
+        """Update a radiator state and return the previous one."""
+
+        with self._lock:
+            previous = self._states.get(target, self.initial_state)
+            self._states[target] = new_state
+            if previous == new_state:
+                self.redundant_commands.append((self.clock(), target, new_state))
+            else:
+                self.changes.append((self.clock(), target, previous, new_state))
+        return previous
+
+    def state_message(
+        self,
+        target: str,
+        sender: object,
+        correlation_id: object = None,
+        acknowledge: bool = False,
+    ) -> Dict[str, object]:
+        """Build the message reporting the current state of a radiator.
+
+        The correlation id (``CID``) of the request is echoed so Django can
+        match the reply with the trace of the originating command.  Replies to
+        mode commands are flagged ``"TYPE": "ACK"``.
+        """
+
+        with self._lock:
+            state = self._states.get(target, self.initial_state)
+
+        message: Dict[str, object] = {
+            "FROM": target,
+            "TO": sender if isinstance(sender, str) and sender else "Django",
+            "COMMAND": state,
+        }
+        if isinstance(correlation_id, str) and correlation_id:
+            message["CID"] = correlation_id
+        if acknowledge:
+            message["TYPE"] = "ACK"
+        return message
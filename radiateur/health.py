@@ -0,0 +1,191 @@
+"""Per-radiator health tracking with a circuit breaker.
+
+A radiator that keeps missing state queries or command acknowledgements has
+its circuit opened: broadcasts and state queries skip it instead of paying
+the full retry cost on every call.  Once the cool-down has elapsed a single
+low-rate STATE probe is sent (half-open); any message from the radiator
+closes the circuit again, while a missed probe re-opens it with a longer
+cool-down.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .clock import CLOCK
+from .metrics import REGISTRY
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+FAILURE_THRESHOLD = 3
+OPEN_COOLDOWN = 60.0
+MAX_OPEN_COOLDOWN = 3600.0
+PROBE_TIMEOUT = 10.0
+
+_CIRCUIT_STATE = REGISTRY.gauge(
+    "radiateur_device_circuit_state",
+    "État du disjoncteur par radiateur (0 fermé, 1 semi-ouvert, 2 ouvert).",
+    ("device",),
+)
+_GAUGE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+@dataclass
+class DeviceHealth:
+    """Liveness information collected for one radiator."""
+
+    state: str = CLOSED
+    last_seen: Optional[float] = None
+    consecutive_failures: int = 0
+    opened_at: Optional[float] = None
+    cooldown: float = OPEN_COOLDOWN
+    probe_sent_at: Optional[float] = None
+
+    def to_json(self) -> Dict[str, object]:
+        return {
+            "state": self.state,
+            "last_seen": self.last_seen,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class HealthMonitor:
+    """Thread-safe circuit breaker registry indexed by radiator name."""
+
+    def __init__(
+        self,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        cooldown: float = OPEN_COOLDOWN,
+        max_cooldown: float = MAX_OPEN_COOLDOWN,
+        probe_timeout: float = PROBE_TIMEOUT,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_timeout = probe_timeout
+        self._devices: Dict[str, DeviceHealth] = {}
+        self._lock = Lock()
+        self._listeners: List[Callable[[], None]] = []
+        # Circuit changes not yet reported to the listeners (outside the lock).
+        self._changes = 0
+
+    def register_listener(self, callback: Callable[[], None]) -> None:
+        """Be notified whenever a circuit changes state."""
+
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def _get(self, device: str) -> DeviceHealth:
+        health = self._devices.get(device)
+        if health is None:
+            health = self._devices[device] = DeviceHealth(cooldown=self.cooldown)
+        return health
+
+    def _set_state(self, device: str, health: DeviceHealth, state: str) -> None:
+        changed = health.state != state
+        health.state = state
+        _CIRCUIT_STATE.set(_GAUGE_VALUES[state], device=device)
+        if changed:
+            self._changes += 1
+
+    def _notify(self) -> None:
+        with self._lock:
+            changes, self._changes = self._changes, 0
+        if changes:
+            for listener in self._listeners:
+                listener()
+
+    def _open(self, device: str, health: DeviceHealth, now: float) -> None:
+        if health.state == HALF_OPEN:
+            health.cooldown = min(self.max_cooldown, health.cooldown * 2)
+        health.opened_at = now
+        health.probe_sent_at = None
+        self._set_state(device, health, OPEN)
+
+    def record_success(self, device: str, at: float | None = None) -> bool:
+        """Register a message from ``device``; return True when it revived."""
+
+        with self._lock:
+            health = self._get(device)
+            health.last_seen = at if at is not None else CLOCK.time()
+            health.consecutive_failures = 0
+            revived = health.state != CLOSED
+            if revived:
+                health.cooldown = self.cooldown
+                health.opened_at = None
+                health.probe_sent_at = None
+                self._set_state(device, health, CLOSED)
+        self._notify()
+        return revived
+
+    def record_failure(self, device: str, now: float | None = None) -> bool:
+        """Register a missed reply; return True when the circuit just opened."""
+
+        now = CLOCK.time() if now is None else now
+        with self._lock:
+            health = self._get(device)
+            health.consecutive_failures += 1
+            if health.state == CLOSED and health.consecutive_failures < self.failure_threshold:
+                return False
+            if health.state == OPEN:
+                return False
+            self._open(device, health, now)
+        self._notify()
+        return True
+
+    def is_available(self, device: str) -> bool:
+        with self._lock:
+            health = self._devices.get(device)
+            return health is None or health.state == CLOSED
+
+    def filter_available(self, devices: Iterable[str]) -> List[str]:
+        """Keep the radiators whose circuit is closed."""
+
+        with self._lock:
+            return [
+                device
+                for device in devices
+                if device not in self._devices or self._devices[device].state == CLOSED
+            ]
+
+    def devices_to_probe(self, now: float | None = None) -> List[str]:
+        """Return open radiators due for a probe and mark them half-open.
+
+        Half-open radiators whose probe went unanswered are re-opened.
+        """
+
+        now = CLOCK.time() if now is None else now
+        due: List[str] = []
+        with self._lock:
+            for device, health in self._devices.items():
+                if health.state == HALF_OPEN and health.probe_sent_at is not None:
+                    if now - health.probe_sent_at >= self.probe_timeout:
+                        self._open(device, health, now)
+                    continue
+                if health.state == OPEN and health.opened_at is not None:
+                    if now - health.opened_at >= health.cooldown:
+                        health.probe_sent_at = now
+                        self._set_state(device, health, HALF_OPEN)
+                        due.append(device)
+        self._notify()
+        return due
+
+    def forget(self, device: str) -> None:
+        with self._lock:
+            if self._devices.pop(device, None) is not None:
+                _CIRCUIT_STATE.remove(device=device)
+
+    def snapshot(self, devices: Iterable[str] | None = None) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            names = list(devices) if devices is not None else list(self._devices)
+            return {
+                device: (self._devices.get(device) or DeviceHealth()).to_json()
+                for device in names
+            }
+
+
+HEALTH = HealthMonitor()
@@ -0,0 +1,377 @@
+"""Mode history of the radiators stored in SQLite.
+
+Confirmed state transitions (STATE replies, command ACKs, timeouts) are
+queued by the state listener and written in batches by a single writer
+thread, in WAL mode so the dashboard reads never wait for it.  With several
+server processes, the replies they all receive are recorded by the one
+holding the writer lock only.  Completed
+hours are rolled up into per-mode durations (hourly and daily) so long
+ranges are answered from a few rows; raw transitions and hourly rollups are
+pruned after their retention period.
+"""
+
+from __future__ import annotations
+
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .config import TIMEZONE
+from .locking import ProcessLock
+from .metrics import REGISTRY
+
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0
+MAINTENANCE_INTERVAL = 3600.0
+HOUR = 3600.0
+WRITER_LOCK_SUFFIX = "-writer.lock"
+
+# Replies reach every server process subscribed to the topic: only the
+# process holding the writer lock records them.  Timeouts are only seen by
+# the process that sent the command, which records its own.
+SHARED_SOURCES = frozenset({"report", "ack"})
+
+_WRITTEN = REGISTRY.counter(
+    "radiateur_history_transitions_written_total",
+    "Transitions de mode enregistrées dans l'historique.",
+)
+_BACKLOG = REGISTRY.gauge(
+    "radiateur_history_queue_size",
+    "Transitions en attente d'écriture dans l'historique.",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS radiateur_history (
+    device TEXT NOT NULL,
+    ts REAL NOT NULL,
+    mode TEXT NOT NULL,
+    previous TEXT,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS radiateur_history_device_ts ON radiateur_history (device, ts);
+CREATE TABLE IF NOT EXISTS radiateur_history_rollup (
+    device TEXT NOT NULL,
+    period TEXT NOT NULL,
+    start REAL NOT NULL,
+    mode TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    transitions INTEGER NOT NULL,
+    PRIMARY KEY (device, period, start, mode)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS radiateur_history_meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+PERIODS = ("hour", "day")
+
+
+def _day_start(timestamp: float) -> float:
+    local = datetime.fromtimestamp(timestamp, TIMEZONE)
+    return TIMEZONE.localize(datetime(local.year, local.month, local.day)).timestamp()
+
+
+class HistoryStore:
+    """Batched SQLite writer plus indexed history queries."""
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        raw_retention_days: float = 90,
+        hourly_retention_days: float = 400,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = Path(path)
+        self.clock = clock
+        self.raw_retention = raw_retention_days * 86400
+        self.hourly_retention = hourly_retention_days * 86400
+        self._queue: "queue.Queue[Tuple[str, float, str, Optional[str], str]]" = queue.Queue()
+        self._local = threading.local()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._flushed = threading.Condition()
+        self._pending = 0
+        self._writer = ProcessLock(self.path.with_name(self.path.name + WRITER_LOCK_SUFFIX))
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    # -- writing -----------------------------------------------------------
+
+    def record(
+        self, device: str, mode: str, previous: Optional[str], source: str, at: float
+    ) -> None:
+        """State listener: queue the update when the mode actually changed.
+
+        A worker that is not the writer ignores the shared replies; it takes
+        over the recording once the writer process exits.
+        """
+
+        if mode == previous:
+            return
+        if source in SHARED_SOURCES and not self._writer.acquire():
+            return
+        with self._flushed:
+            self._pending += 1
+        self._queue.put((device, at, mode, previous, source))
+        _BACKLOG.set(self._queue.qsize())
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="radiateur-history", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued transition is written (tests, shutdown)."""
+
+        with self._flushed:
+            return self._flushed.wait_for(lambda: self._pending == 0, timeout)
+
+    def _run(self) -> None:
+        connection = self._connect()
+        next_maintenance = time.monotonic()
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch:
+                with connection:
+                    connection.executemany(
+                        "INSERT INTO radiateur_history (device, ts, mode, previous, source)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        batch,
+                    )
+                _WRITTEN.inc(len(batch))
+                _BACKLOG.set(self._queue.qsize())
+                with self._flushed:
+                    self._pending -= len(batch)
+                    self._flushed.notify_all()
+            if time.monotonic() >= next_maintenance:
+                try:
+                    self.maintain(connection)
+                except sqlite3.Error:  # pragma: no cover - retried next hour
+                    pass
+                next_maintenance = time.monotonic() + MAINTENANCE_INTERVAL
+        connection.close()
+        self._writer.release()
+
+    def _next_batch(self) -> List[Tuple[str, float, str, Optional[str], str]]:
+        try:
+            batch = [self._queue.get(timeout=FLUSH_INTERVAL)]
+        except queue.Empty:
+            return []
+        while len(batch) < BATCH_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    # -- rollups and retention --------------------------------------------
+
+    def maintain(self, connection: sqlite3.Connection | None = None, now: float | None = None) -> None:
+        """Roll up the completed hours then apply the retention policies."""
+
+        connection = connection or self._reader()
+        now = self.clock() if now is None else now
+        self._rollup(connection, now - now % HOUR)
+        with connection:
+            cutoff = now - self.raw_retention
+            # Keep the last transition before the cutoff: it gives the mode
+            # in force at the beginning of the retained range.
+            connection.execute(
+                "DELETE FROM radiateur_history WHERE ts < ? AND rowid NOT IN ("
+                " SELECT (SELECT rowid FROM radiateur_history AS last"
+                "  WHERE last.device = devices.device AND last.ts < ?"
+                "  ORDER BY last.ts DESC LIMIT 1)"
+                " FROM (SELECT DISTINCT device FROM radiateur_history) AS devices)",
+                (cutoff, cutoff),
+            )
+            connection.execute(
+                "DELETE FROM radiateur_history_rollup WHERE period = 'hour' AND start < ?",
+                (now - self.hourly_retention,),
+            )
+
+    def _rollup(self, connection: sqlite3.Connection, until: float) -> None:
+        # The rollups are added to the existing rows: the read of the
+        # watermark and the writes share one write transaction so that two
+        # maintenance runs (writer thread, another worker) never roll up the
+        # same hours twice.
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            self._rollup_locked(connection, until)
+
+    def _rollup_locked(self, connection: sqlite3.Connection, until: float) -> None:
+        row = connection.execute(
+            "SELECT value FROM radiateur_history_meta WHERE key = 'rollup_until'"
+        ).fetchone()
+        if row is not None:
+            since = row[0]
+        else:
+            first = connection.execute("SELECT min(ts) FROM radiateur_history").fetchone()[0]
+            if first is None:
+                return
+            since = first - first % HOUR
+        if until <= since:
+            return
+
+        devices = [
+            device for (device,) in connection.execute("SELECT DISTINCT device FROM radiateur_history")
+        ]
+        hourly: Dict[Tuple[str, float, str], List[float]] = {}
+        for device in devices:
+            for hour, mode, seconds, transitions in self._split_hours(connection, device, since, until):
+                totals = hourly.setdefault((device, hour, mode), [0.0, 0])
+                totals[0] += seconds
+                totals[1] += transitions
+
+        daily: Dict[Tuple[str, float, str], List[float]] = {}
+        for (device, hour, mode), (seconds, transitions) in hourly.items():
+            totals = daily.setdefault((device, _day_start(hour), mode), [0.0, 0])
+            totals[0] += seconds
+            totals[1] += transitions
+
+        upsert = (
+            "INSERT INTO radiateur_history_rollup (device, period, start, mode, seconds, transitions)"
+            " VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (device, period, start, mode) DO UPDATE SET"
+            " seconds = seconds + excluded.seconds, transitions = transitions + excluded.transitions"
+        )
+        for period, rows in (("hour", hourly), ("day", daily)):
+            connection.executemany(
+                upsert,
+                [
+                    (device, period, start, mode, seconds, int(transitions))
+                    for (device, start, mode), (seconds, transitions) in rows.items()
+                ],
+            )
+        connection.execute(
+            "INSERT OR REPLACE INTO radiateur_history_meta (key, value) VALUES ('rollup_until', ?)",
+            (until,),
+        )
+
+    @staticmethod
+    def _split_hours(connection: sqlite3.Connection, device: str, since: float, until: float):
+        """Yield ``(hour, mode, seconds, transitions)`` for ``[since, until)``."""
+
+        before = connection.execute(
+            "SELECT mode FROM radiateur_history WHERE device = ? AND ts < ? ORDER BY ts DESC LIMIT 1",
+            (device, since),
+        ).fetchone()
+        mode = before[0] if before else None
+        cursor = since
+        rows = connection.execute(
+            "SELECT ts, mode FROM radiateur_history WHERE device = ? AND ts >= ? AND ts < ? ORDER BY ts",
+            (device, since, until),
+        ).fetchall()
+        for ts, next_mode in rows + [(until, None)]:
+            while cursor < ts:
+                hour = cursor - cursor % HOUR
+                end = min(ts, hour + HOUR)
+                if mode is not None:
+                    yield hour, mode, end - cursor, 0
+                cursor = end
+            if next_mode is not None:
+                yield ts - ts % HOUR, next_mode, 0.0, 1
+                mode = next_mode
+
+    # -- queries -----------------------------------------------------------
+
+    def transitions(self, device: str, start: float, end: float) -> List[Dict[str, object]]:
+        """Return the transitions of ``device`` in ``[start, end)``.
+
+        The first item is the mode in force at ``start`` when known.
+        """
+
+        connection = self._reader()
+        before = connection.execute(
+            "SELECT ts, mode, source FROM radiateur_history WHERE device = ? AND ts < ?"
+            " ORDER BY ts DESC LIMIT 1",
+            (device, start),
+        ).fetchone()
+        rows = connection.execute(
+            "SELECT ts, mode, source FROM radiateur_history WHERE device = ? AND ts >= ? AND ts < ?"
+            " ORDER BY ts",
+            (device, start, end),
+        ).fetchall()
+        if before is not None:
+            rows.insert(0, before)
+        return [{"ts": ts, "mode": mode, "source": source} for ts, mode, source in rows]
+
+    def rollup_until(self) -> Optional[float]:
+        """Return the end of the last rolled-up hour, if any."""
+
+        row = self._reader().execute(
+            "SELECT value FROM radiateur_history_meta WHERE key = 'rollup_until'"
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def rollup_rows(
+        self, period: str, start: float, end: float
+    ) -> List[Tuple[str, float, str, float]]:
+        """Return ``(device, start, mode, seconds)`` rollups of every radiator."""
+
+        if period not in PERIODS:
+            raise ValueError(period)
+        return self._reader().execute(
+            "SELECT device, start, mode, seconds FROM radiateur_history_rollup"
+            " WHERE period = ? AND start >= ? AND start < ?",
+            (period, start, end),
+        ).fetchall()
+
+    def rollups(self, device: str, period: str, start: float, end: float) -> List[Dict[str, object]]:
+        """Return the ``hour``/``day`` per-mode durations of ``device``."""
+
+        if period not in PERIODS:
+            raise ValueError(period)
+        rows = self._reader().execute(
+            "SELECT start, mode, seconds, transitions FROM radiateur_history_rollup"
+            " WHERE device = ? AND period = ? AND start >= ? AND start < ? ORDER BY start, mode",
+            (device, period, start, end),
+        ).fetchall()
+        return [
+            {"start": begin, "mode": mode, "seconds": seconds, "transitions": transitions}
+            for begin, mode, seconds, transitions in rows
+        ]
+
+
+_store: Optional[HistoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> HistoryStore:
+    """Return the shared store, created on first use."""
+
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore(
+                settings.RADIATEUR_HISTORY_DATABASE,
+                raw_retention_days=settings.RADIATEUR_HISTORY_RETENTION_DAYS,
+            )
+        return _store
+
+
+def default_range(days: int = 7) -> Tuple[float, float]:
+    end = datetime.now(TIMEZONE)
+    return (end - timedelta(days=days)).timestamp(), end.timestamp()
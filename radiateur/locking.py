@@ -0,0 +1,89 @@
+"""Advisory file locks shared by the server processes.
+
+Gunicorn runs several workers, each with its own runtime, and they share
+the files of the data directory.  :func:`locked` serializes a short critical
+section (read, modify, replace a file) across processes; :class:`ProcessLock`
+elects the single process owning a resource until it releases it or exits
+(the kernel then frees the lock).  Both rely on ``fcntl.flock``: locks taken
+through distinct open files conflict even inside one process, so they also
+exclude the other threads.  Without ``fcntl`` (Windows) the locks are no-ops
+and a single server process is assumed.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows, single process assumed
+    fcntl = None  # type: ignore[assignment]
+
+
+@contextmanager
+def locked(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on ``path`` (created when missing) for the block."""
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        # Closing the file releases the lock.
+        yield
+
+
+def replace_text(path: Path, text: str) -> None:
+    """Atomically replace ``path`` through a temporary file unique to the caller."""
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as handle:
+            handle.write(text)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+class ProcessLock:
+    """Ownership of ``path`` kept by one process until :meth:`release` or exit."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._handle: Optional[IO[bytes]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def owned(self) -> bool:
+        return self._handle is not None
+
+    def acquire(self) -> bool:
+        """Try to become the owner without waiting; return whether this process is."""
+
+        with self._lock:
+            if self._handle is not None:
+                return True
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            handle = open(self.path, "ab")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    handle.close()
+                    return False
+            self._handle = handle
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
@@ -0,0 +1,375 @@
+"""Read access to ``app.log`` and ``mqtt.log`` without loading them in memory.
+
+Plain segments are memory-mapped and described by a sparse index mapping a
+timestamp to a byte offset every :data:`INDEX_STRIDE` bytes; a time-range
+query bisects the index and scans only the matching region.  The index is
+extended incrementally as the file grows and rebuilt when it is rotated.
+
+Rotated segments follow the logrotate naming (``app.log.1``,
+``app.log.2.gz``...).  Compressed ones cannot be mapped: their first and
+last timestamps are cached so that they are only decompressed (as a stream)
+when a query overlaps them.
+"""
+
+from __future__ import annotations
+
+import bisect
+import gzip
+import mmap
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .config import APP_LOG_FILE, MQTT_LOG_FILE, TIMEZONE
+
+INDEX_STRIDE = 64 * 1024
+MAX_LINES = 1000
+
+LOG_FILES = {"app": APP_LOG_FILE, "mqtt": MQTT_LOG_FILE}
+
+# "[2024-01-31 12:00:00] ..." (app.log) or "2024-01-31 12:00:00 : ..." (mqtt.log)
+_TIMESTAMP = re.compile(rb"^\[?(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})")
+_ROTATED = re.compile(r"\.(\d+)(\.gz)?$")
+
+
+def parse_timestamp(line: bytes) -> Optional[float]:
+    match = _TIMESTAMP.match(line)
+    if match is None:
+        return None
+    try:
+        parsed = datetime.strptime(match.group(1).decode("ascii"), "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+    return TIMEZONE.localize(parsed).timestamp()
+
+
+@dataclass
+class LogLine:
+    timestamp: Optional[float]
+    text: str
+    offset: int
+    end: int = 0
+
+    def to_json(self) -> Dict[str, object]:
+        return {"ts": self.timestamp, "line": self.text, "offset": self.offset}
+
+
+def _decode(raw: bytes) -> str:
+    return raw.rstrip(b"\r\n").decode("utf-8", errors="replace")
+
+
+def _first_timestamp(mapped: mmap.mmap, position: int, limit: int, lines: int = 50):
+    """Return ``(timestamp, offset)`` of the first dated line after ``position``."""
+
+    for _ in range(lines):
+        if position >= limit:
+            return None
+        end = mapped.find(b"\n", position, limit)
+        end = limit if end == -1 else end
+        timestamp = parse_timestamp(mapped[position : min(end, position + 32)])
+        if timestamp is not None:
+            return timestamp, position
+        position = end + 1
+    return None
+
+
+def _last_timestamp(mapped: mmap.mmap, limit: int, lines: int = 50) -> Optional[float]:
+    """Return the timestamp of the last dated line before ``limit``."""
+
+    end = limit - 1
+    for _ in range(lines):
+        if end <= 0:
+            return None
+        start = mapped.rfind(b"\n", 0, end) + 1
+        timestamp = parse_timestamp(mapped[start : min(end, start + 32)])
+        if timestamp is not None:
+            return timestamp
+        end = start - 1
+    return None
+
+
+@dataclass
+class _SegmentIndex:
+    """Sparse ``timestamp -> offset`` index of one plain segment."""
+
+    identity: Tuple[int, int]
+    size: int = 0
+    timestamps: List[float] = field(default_factory=list)
+    offsets: List[int] = field(default_factory=list)
+    last_timestamp: Optional[float] = None
+
+
+class LogSegment:
+    """One file of a log, plain (mapped) or gzip-compressed (streamed)."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.compressed = path.suffix == ".gz"
+        self._index: Optional[_SegmentIndex] = None
+        self._bounds: Optional[Tuple[Tuple[int, int, int], Optional[float], Optional[float]]] = None
+        self._lock = Lock()
+
+    def _identity(self, stat: os.stat_result) -> Tuple[int, int]:
+        return stat.st_dev, stat.st_ino
+
+    # -- plain segments --------------------------------------------------
+
+    def _mapped(self) -> Optional[mmap.mmap]:
+        try:
+            with open(self.path, "rb") as handle:
+                if os.fstat(handle.fileno()).st_size == 0:
+                    return None
+                return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+    def index(self) -> _SegmentIndex:
+        """Return the sparse index, extended to the current end of file."""
+
+        stat = self.path.stat()
+        with self._lock:
+            index = self._index
+            if index is None or index.identity != self._identity(stat) or stat.st_size < index.size:
+                index = self._index = _SegmentIndex(identity=self._identity(stat))
+            if stat.st_size > index.size:
+                self._extend(index)
+            return index
+
+    def _extend(self, index: _SegmentIndex) -> None:
+        mapped = self._mapped()
+        if mapped is None:
+            return
+        with mapped:
+            # Only complete lines are indexed; a partial last line waits.
+            complete = mapped.rfind(b"\n") + 1
+            if complete <= index.size:
+                return
+            position = index.offsets[-1] + INDEX_STRIDE if index.offsets else 0
+            while position < complete:
+                if position:
+                    # Realign on the first line starting at or after ``position``.
+                    position = mapped.find(b"\n", position - 1) + 1
+                found = _first_timestamp(mapped, position, complete)
+                if found is None:
+                    break
+                timestamp, offset = found
+                index.timestamps.append(timestamp)
+                index.offsets.append(offset)
+                position = offset + INDEX_STRIDE
+            last = _last_timestamp(mapped, complete)
+            if last is not None:
+                index.last_timestamp = last
+            index.size = complete
+
+    def _iter_plain(self, offset: int = 0) -> Iterator[LogLine]:
+        mapped = self._mapped()
+        if mapped is None:
+            return
+        with mapped:
+            position = offset
+            timestamp = None
+            size = len(mapped)
+            while position < size:
+                end = mapped.find(b"\n", position)
+                if end == -1:
+                    break
+                raw = mapped[position:end]
+                timestamp = parse_timestamp(raw[:32]) or timestamp
+                yield LogLine(timestamp, _decode(raw), position, end + 1)
+                position = end + 1
+
+    # -- compressed segments ---------------------------------------------
+
+    def _iter_compressed(self) -> Iterator[LogLine]:
+        timestamp = None
+        offset = 0
+        try:
+            with gzip.open(self.path, "rb") as handle:
+                for raw in handle:
+                    timestamp = parse_timestamp(raw[:32]) or timestamp
+                    yield LogLine(timestamp, _decode(raw), offset, offset + len(raw))
+                    offset += len(raw)
+        except (OSError, EOFError):
+            return
+
+    def bounds(self) -> Tuple[Optional[float], Optional[float]]:
+        """Return the first and last timestamps of the segment."""
+
+        if not self.compressed:
+            index = self.index()
+            return (index.timestamps[0] if index.timestamps else None), index.last_timestamp
+
+        stat = self.path.stat()
+        key = (stat.st_ino, stat.st_size, int(stat.st_mtime))
+        with self._lock:
+            if self._bounds is not None and self._bounds[0] == key:
+                return self._bounds[1], self._bounds[2]
+        first = last = None
+        for line in self._iter_compressed():
+            if line.timestamp is not None:
+                first = line.timestamp if first is None else first
+                last = line.timestamp
+        with self._lock:
+            self._bounds = (key, first, last)
+        return first, last
+
+    # -- queries ----------------------------------------------------------
+
+    def lines_from(self, start: Optional[float] = None) -> Iterator[LogLine]:
+        """Iterate the lines, beginning close to ``start`` when given."""
+
+        if self.compressed:
+            yield from self._iter_compressed()
+            return
+        offset = 0
+        if start is not None:
+            index = self.index()
+            position = bisect.bisect_left(index.timestamps, start) - 1
+            offset = index.offsets[position] if position >= 0 else 0
+        yield from self._iter_plain(offset)
+
+    def tail(self, count: int) -> List[LogLine]:
+        if self.compressed:
+            lines: List[LogLine] = []
+            for line in self._iter_compressed():
+                lines.append(line)
+                if len(lines) > count:
+                    del lines[0]
+            return lines
+
+        mapped = self._mapped()
+        if mapped is None:
+            return []
+        with mapped:
+            end = len(mapped)
+            if mapped[end - 1 : end] == b"\n":
+                end -= 1
+            found: List[Tuple[int, bytes]] = []
+            while end > 0 and len(found) < count:
+                start = mapped.rfind(b"\n", 0, end) + 1
+                found.append((start, mapped[start:end]))
+                end = start - 1
+        found.reverse()
+        return [
+            LogLine(parse_timestamp(raw[:32]), _decode(raw), start, start + len(raw) + 1)
+            for start, raw in found
+        ]
+
+
+class LogFile:
+    """A log and its rotated segments, oldest first."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._segments: Dict[Path, LogSegment] = {}
+        self._lock = Lock()
+
+    def segments(self) -> List[LogSegment]:
+        rotated: List[Tuple[int, Path]] = []
+        if self.path.parent.exists():
+            for candidate in self.path.parent.glob(self.path.name + ".*"):
+                match = _ROTATED.search(candidate.name[len(self.path.name) :])
+                if match is not None:
+                    rotated.append((int(match.group(1)), candidate))
+        paths = [path for _number, path in sorted(rotated, reverse=True)]
+        if self.path.exists():
+            paths.append(self.path)
+
+        with self._lock:
+            segments = []
+            for path in paths:
+                segment = self._segments.get(path)
+                if segment is None:
+                    segment = self._segments[path] = LogSegment(path)
+                segments.append(segment)
+            for stale in set(self._segments) - set(paths):
+                del self._segments[stale]
+        return segments
+
+    def search(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        contains: Optional[str] = None,
+        limit: int = MAX_LINES,
+    ) -> List[LogLine]:
+        """Return at most ``limit`` lines in ``[start, end]`` containing ``contains``."""
+
+        results: List[LogLine] = []
+        for segment in self.segments():
+            first, last = segment.bounds()
+            if start is not None and last is not None and last < start:
+                continue
+            if end is not None and first is not None and first > end:
+                break
+            for line in segment.lines_from(start):
+                if line.timestamp is not None:
+                    if start is not None and line.timestamp < start:
+                        continue
+                    if end is not None and line.timestamp > end:
+                        return results
+                if contains and contains not in line.text:
+                    continue
+                results.append(line)
+                if len(results) >= limit:
+                    return results
+        return results
+
+    def tail(self, count: int = 100, contains: Optional[str] = None) -> List[LogLine]:
+        """Return the last ``count`` (matching) lines, across rotations if needed."""
+
+        collected: List[LogLine] = []
+        for segment in reversed(self.segments()):
+            wanted = count - len(collected)
+            # Filtered tails may need more lines than requested.
+            batch = segment.tail(wanted if not contains else max(wanted * 20, 1000))
+            if contains:
+                batch = [line for line in batch if contains in line.text]
+            collected = batch[-wanted:] + collected
+            if len(collected) >= count or segment.compressed:
+                break
+        return collected[-count:]
+
+    def follow(self, offset: Optional[int], contains: Optional[str] = None) -> Tuple[List[LogLine], int]:
+        """Return the lines appended since ``offset`` and the new offset.
+
+        A negative or stale offset (file rotated or truncated) restarts from
+        the end of the current file.
+        """
+
+        try:
+            size = self.path.stat().st_size
+        except OSError:
+            return [], 0
+        if offset is None or offset < 0 or offset > size:
+            return [], size
+
+        lines: List[LogLine] = []
+        new_offset = offset
+        for line in LogSegment(self.path)._iter_plain(offset):
+            new_offset = line.end
+            if contains and contains not in line.text:
+                continue
+            lines.append(line)
+            if len(lines) >= MAX_LINES:
+                break
+        return lines, new_offset
+
+
+_logs: Dict[str, LogFile] = {}
+
+
+def get_log(name: str) -> Optional[LogFile]:
+    """Return the shared :class:`LogFile` for ``app`` or ``mqtt``."""
+
+    path = LOG_FILES.get(name)
+    if path is None:
+        return None
+    log = _logs.get(name)
+    if log is None:
+        log = _logs[name] = LogFile(path)
+    return log
@@ -0,0 +1,56 @@
+"""Run a simulated week of planning transitions in a few seconds."""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from radiateur.config import TIMEZONE
+from radiateur.simulation import simulate_planning
+
+
+class Command(BaseCommand):
+    help = "Rejoue le planning sur une horloge simulée et signale les transitions manquées ou en double."
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--start",
+            help="Date de début AAAA-MM-JJ (lundi prochain par défaut)",
+        )
+        parser.add_argument("--days", type=float, default=7, help="Nombre de jours simulés")
+        parser.add_argument("--devices", nargs="*", help="Radiateurs simulés (tous par défaut)")
+        parser.add_argument("--json", action="store_true", help="Afficher le rapport complet en JSON")
+
+    def handle(self, *args, **options) -> None:
+        if options["start"]:
+            try:
+                day = datetime.strptime(options["start"], "%Y-%m-%d").date()
+            except ValueError as exc:
+                raise CommandError("Date de début invalide (AAAA-MM-JJ).") from exc
+        else:
+            today = datetime.now(TIMEZONE).date()
+            day = today + timedelta(days=7 - today.weekday())
+        start = TIMEZONE.localize(datetime(day.year, day.month, day.day))
+
+        report = simulate_planning(start, options["days"], options["devices"])
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+        else:
+            self.stdout.write(
+                f"{report['start']} -> {report['end']} : {report['devices']} radiateur(s), "
+                f"{report['timelines']} planning(s) distinct(s)\n"
+                f"Transitions attendues : {report['expected']}, appliquées : {report['applied']} "
+                f"({report['commands']} commande(s))\n"
+                f"Manquées : {len(report['missed'])}, inattendues : {len(report['unexpected'])}, "
+                f"en double : {len(report['duplicated'])}, retard max : {report['max_delay_seconds']:.1f} s\n"
+                f"Réveils du planificateur : {report['wakeups']}, CPU : {report['cpu_seconds']} s, "
+                f"durée : {report['wall_seconds']} s"
+            )
+            for kind in ("missed", "unexpected", "duplicated"):
+                for item in report[kind]:
+                    self.stdout.write(f"  [{kind}] {item['at']} {item['device']} -> {item['mode']}")
+
+        if report["missed"] or report["unexpected"] or report["duplicated"]:
+            raise CommandError("Le planning simulé ne correspond pas aux transitions attendues.")
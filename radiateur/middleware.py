@@ -2,45 +2,89 @@
 
 from __future__ import annotations
 
-from fnmatch import fnmatch
+import re
+import time
+from fnmatch import translate
+from typing import Callable, Iterable
 
 from django.conf import settings
 from django.contrib.auth.views import redirect_to_login
 from django.http import HttpRequest, HttpResponse
 
 
-class LoginRequiredMiddleware:
-    """Redirect anonymous users to the login page for protected URLs."""
+def compile_exemptions(patterns: Iterable[str], prefixes: Iterable[str] = ()) -> Callable[[str], bool]:
+    """Return a predicate matching ``patterns`` (shell-style) or ``prefixes``.
 
-    def __init__(self, get_response):
-        self.get_response = get_response
-        exempt = getattr(settings, "LOGIN_EXEMPT_URLS", ())
-        self.exempt_patterns: tuple[str, ...] = tuple(exempt)
+    Everything is compiled into a single regular expression once, instead of
+    running :func:`fnmatch.fnmatch` over each pattern for every request.
+    """
 
-    def _is_exempt(self, path: str) -> bool:
-        if not path:
-            return False
+    alternatives = [re.escape(prefix) for prefix in prefixes if prefix]
+    alternatives += [translate(pattern) for pattern in patterns]
+    if not alternatives:
+        return lambda path: False
+    match = re.compile("|".join(f"(?:{alternative})" for alternative in alternatives)).match
+    return lambda path: bool(path) and match(path) is not None
 
-        static_url = getattr(settings, "STATIC_URL", None) or ""
-        if static_url and path.startswith(static_url):
-            return True
 
-        media_url = getattr(settings, "MEDIA_URL", None) or ""
-        if media_url and path.startswith(media_url):
-            return True
+def exempt_matcher() -> Callable[[str], bool]:
+    """Predicate for the URLs reachable without signing in (static, media, LOGIN_EXEMPT_URLS)."""
 
-        for pattern in self.exempt_patterns:
-            if fnmatch(path, pattern):
-                return True
+    return compile_exemptions(
+        getattr(settings, "LOGIN_EXEMPT_URLS", ()),
+        (getattr(settings, "STATIC_URL", None) or "", getattr(settings, "MEDIA_URL", None) or ""),
+    )
 
-        return False
 
-    def __call__(self, request: HttpRequest) -> HttpResponse:
-        if request.user.is_authenticated:
-            return self.get_response(request)
+class LoginRequiredMiddleware:
+    """Redirect anonymous users to the login page for protected URLs.
+
+    Exempt paths are checked first so static files, the service worker and
+    the other public URLs never load the session or the user.
+    """
 
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._is_exempt = exempt_matcher()
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
         path = request.path_info
-        if self._is_exempt(path):
+        if self._is_exempt(path) or request.user.is_authenticated:
             return self.get_response(request)
 
         return redirect_to_login(path)
+
+
+SESSION_REFRESHED_KEY = "_radiateur_refreshed_at"
+
+
+def refresh_session(session) -> None:
+    """Give ``session`` a full ``SESSION_COOKIE_AGE`` again and remember when."""
+
+    session[SESSION_REFRESHED_KEY] = int(time.time())
+    session.set_expiry(settings.SESSION_COOKIE_AGE)
+
+
+class SessionRefreshMiddleware:
+    """Extend the expiry of active sessions lazily.
+
+    Saving the session on every request (``SESSION_SAVE_EVERY_REQUEST``)
+    rewrote it for each dashboard poll.  The expiry is now pushed back only
+    when it was last extended more than ``SESSION_REFRESH_INTERVAL`` seconds
+    ago, so an active user still never has to sign in again.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.interval = getattr(settings, "SESSION_REFRESH_INTERVAL", 60 * 60 * 24)
+        self._is_exempt = exempt_matcher()
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if self._is_exempt(request.path_info):
+            return self.get_response(request)
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            refreshed_at = request.session.get(SESSION_REFRESHED_KEY, 0)
+            if time.time() - refreshed_at >= self.interval:
+                refresh_session(request.session)
+        return self.get_response(request)
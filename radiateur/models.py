@@ -103,6 +103,10 @@ def save_devices(devices: Iterable[RadiatorDevice]) -> None:
         json.dumps(serialized, ensure_ascii=False, indent=4), encoding="utf-8"
     )
 
+    from .configstore import refresh
+
+    refresh()
+
 
 def get_device(name: str) -> RadiatorDevice | None:
     """Return the stored device matching ``name`` if available."""
@@ -1,42 +1,415 @@
-"""Wrapper around ``paho.mqtt.client`` used by the application."""
+"""Wrapper around ``paho.mqtt.client`` used by the application.
+
+Outgoing messages go through a priority queue (manual commands, then
+planning transitions, then STATE polls) paced by token buckets: one for the
+broker and one per radiator, so a house-wide transition plus a poll round
+cannot overflow the ESP8266 receive buffers.  A few global tokens are kept
+for manual commands, which therefore stay immediate while background
+traffic is throttled.
+"""
 
 from __future__ import annotations
 
+import threading
+import time
+from collections import deque
 from datetime import datetime
 from threading import Lock
-from typing import List, Tuple
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
 
 import paho.mqtt.client as mqtt
 
+from . import tracing
 from .config import TIMEZONE
+from .metrics import REGISTRY
+
+_PUBLISHED = REGISTRY.counter(
+    "radiateur_mqtt_messages_published_total",
+    "Messages MQTT publiés par l'application.",
+    ("topic",),
+)
+_RECEIVED = REGISTRY.counter(
+    "radiateur_mqtt_messages_received_total",
+    "Messages MQTT reçus sur les topics souscrits.",
+    ("topic",),
+)
+_BUFFERED = REGISTRY.gauge(
+    "radiateur_mqtt_received_buffer_size",
+    "Nombre de messages conservés dans le tampon de réception.",
+)
+_CONNECTED = REGISTRY.gauge(
+    "radiateur_mqtt_connected",
+    "1 lorsque le client MQTT est connecté, 0 sinon.",
+)
+_DISCONNECTS = REGISTRY.counter(
+    "radiateur_mqtt_disconnects_total",
+    "Pertes de connexion avec le broker MQTT.",
+)
+_QUEUED = REGISTRY.gauge(
+    "radiateur_mqtt_offline_queue_size",
+    "Messages en attente de reconnexion au broker.",
+)
+_DROPPED = REGISTRY.counter(
+    "radiateur_mqtt_offline_dropped_total",
+    "Messages abandonnés depuis la file hors ligne.",
+    ("reason",),
+)
+_OUTBOUND = REGISTRY.gauge(
+    "radiateur_mqtt_outbound_queue_size",
+    "Messages en attente d'envoi (limitation de débit), par priorité.",
+    ("priority",),
+)
+_OUTBOUND_WAIT = REGISTRY.histogram(
+    "radiateur_mqtt_outbound_wait_seconds",
+    "Attente d'un message dans la file d'envoi avant publication.",
+    ("priority",),
+)
+
+MESSAGE_BUFFER_SIZE = 1000
+OFFLINE_QUEUE_SIZE = 500
+OFFLINE_QUEUE_TTL = 60.0
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 30
+
+PRIORITY_MANUAL = 0
+PRIORITY_SCHEDULE = 1
+PRIORITY_POLL = 2
+PRIORITY_NAMES = ("manual", "schedule", "poll")
+
+PUBLISH_RATE = 20.0
+PUBLISH_BURST = 10.0
+DEVICE_PUBLISH_RATE = 2.0
+DEVICE_PUBLISH_BURST = 3.0
+# Global tokens only manual commands may use.
+MANUAL_RESERVE = 2.0
+# Messages published per pass of the sender, and queued messages examined
+# per priority when looking for one whose radiator is not throttled.
+BATCH_SIZE = 32
+SCAN_DEPTH = 64
+
+
+class TokenBucket:
+    """``rate`` tokens per second, at most ``burst``; a rate of 0 never limits."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = now
+
+    def available(self, now: float) -> float:
+        if self.rate <= 0:
+            return float("inf")
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def take(self) -> None:
+        if self.rate > 0:
+            self.tokens -= 1
+
+    def delay(self, now: float, needed: float = 1.0) -> float:
+        """Seconds until ``needed`` tokens are available."""
+
+        return max(0.0, (needed - self.available(now)) / self.rate) if self.rate > 0 else 0.0
+
+
+# (enqueued at, topic, message, qos, device)
+_Outgoing = Tuple[float, str, str, int, Optional[str]]
 
 
 class MQTTClient:
-    """Minimal MQTT client tailored for the project needs."""
+    """Minimal MQTT client tailored for the project needs.
+
+    The connection is established asynchronously and re-established by the
+    paho network loop whenever the broker goes away.  Subscriptions are
+    replayed on every (re)connection and messages published while offline
+    are kept in a bounded queue until they expire.
+    """
 
-    def __init__(self, broker_address: str, broker_port: int = 1883, log_path=None) -> None:
+    def __init__(
+        self,
+        broker_address: str,
+        broker_port: int = 1883,
+        log_path=None,
+        *,
+        queue_size: int = OFFLINE_QUEUE_SIZE,
+        queue_ttl: float = OFFLINE_QUEUE_TTL,
+        publish_rate: float = PUBLISH_RATE,
+        publish_burst: float = PUBLISH_BURST,
+        device_rate: float = DEVICE_PUBLISH_RATE,
+        device_burst: float = DEVICE_PUBLISH_BURST,
+    ) -> None:
         self.client = mqtt.Client()
-        self.client.connect(broker_address, broker_port)
-        self.message_recu: List[Tuple[float, str]] = []
+        self.message_recu: Deque[Tuple[float, str]] = deque(maxlen=MESSAGE_BUFFER_SIZE)
         self._log_path = log_path
         self._lock = Lock()
+        self._listeners: List[Callable[[float, str], None]] = []
 
-    def publish(self, message: str, topic: str) -> None:
-        self.client.publish(topic, message)
+        self._topics: Set[str] = set()
+        self._connected = False
+        self._connected_since: float | None = None
+        self._last_disconnect: float | None = None
+        self._disconnects = 0
+        self._queue_ttl = queue_ttl
+        # (expires at, topic, message, qos, priority, device)
+        self._offline_queue: Deque[Tuple[float, str, str, int, int, Optional[str]]] = deque(maxlen=queue_size)
 
-    def subscribe(self, topic: str) -> None:
+        now = time.monotonic()
+        # Background messages need the reserve plus one token: a smaller
+        # burst would keep them queued forever.
+        self._bucket = TokenBucket(publish_rate, max(publish_burst, 1.0 + MANUAL_RESERVE), now)
+        self._device_rate = device_rate
+        self._device_burst = device_burst
+        self._device_buckets: Dict[str, TokenBucket] = {}
+        self._outbound: List[Deque[_Outgoing]] = [deque() for _ in PRIORITY_NAMES]
+        self._outbound_ready = threading.Condition(self._lock)
+        self._send_lock = Lock()
+        self._sender: threading.Thread | None = None
+        # Set by publish so the sender re-examines the queues before sleeping.
+        self._submitted = False
+
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
         self.client.on_message = self.on_message
-        self.client.subscribe(topic)
+        self.client.reconnect_delay_set(RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY)
+        self.client.connect_async(broker_address, broker_port)
         self.client.loop_start()
 
+    def add_listener(self, callback: Callable[[float, str], None]) -> None:
+        """Call ``callback(timestamp, payload)`` for every received message."""
+
+        self._listeners.append(callback)
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def health(self) -> Dict[str, object]:
+        """Return a JSON-serializable summary of the connection state."""
+
+        with self._lock:
+            queued = len(self._offline_queue)
+            outbound = {name: len(queue) for name, queue in zip(PRIORITY_NAMES, self._outbound)}
+        return {
+            "connected": self._connected,
+            "connected_since": self._connected_since,
+            "last_disconnect": self._last_disconnect,
+            "disconnects": self._disconnects,
+            "queued_messages": queued,
+            "outbound_messages": outbound,
+            "subscriptions": sorted(self._topics),
+        }
+
+    def publish(
+        self,
+        message: str,
+        topic: str,
+        qos: int = 0,
+        *,
+        priority: int = PRIORITY_MANUAL,
+        device: str | None = None,
+    ) -> None:
+        """Queue ``message`` for sending; ``device`` is the radiator it targets.
+
+        The message is sent right away from the calling thread when the rate
+        limits allow it, otherwise by the sender thread as soon as they do.
+        """
+
+        if not self._connected:
+            self._enqueue(topic, message, qos, priority, device)
+            return
+        with tracing.child_span("mqtt.publish", topic=topic, qos=qos, priority=PRIORITY_NAMES[priority]):
+            with self._lock:
+                self._outbound[priority].append((time.monotonic(), topic, message, qos, device))
+                _OUTBOUND.set(len(self._outbound[priority]), priority=PRIORITY_NAMES[priority])
+                self._submitted = True
+                self._outbound_ready.notify()
+            if self._send_lock.acquire(blocking=False):
+                try:
+                    self._drain()
+                finally:
+                    self._send_lock.release()
+        self._ensure_sender()
+
+    def _device_bucket(self, device: str, now: float) -> TokenBucket:
+        bucket = self._device_buckets.get(device)
+        if bucket is None:
+            bucket = self._device_buckets[device] = TokenBucket(self._device_rate, self._device_burst, now)
+        return bucket
+
+    def _take_ready(self, now: float) -> Tuple[List[Tuple[int, _Outgoing]], float]:
+        """Pop the messages the buckets allow, by priority; return them and the next delay.
+
+        Called with ``self._lock`` held.  Within a priority, messages for a
+        throttled radiator are skipped so they do not hold back the others.
+        """
+
+        batch: List[Tuple[int, _Outgoing]] = []
+        wait = float("inf")
+        for priority, queue in enumerate(self._outbound):
+            needed = 1.0 if priority == PRIORITY_MANUAL else 1.0 + MANUAL_RESERVE
+            index = 0
+            while index < min(len(queue), SCAN_DEPTH) and len(batch) < BATCH_SIZE:
+                global_wait = self._bucket.delay(now, needed)
+                if global_wait > 0:
+                    wait = min(wait, global_wait)
+                    break
+                device = queue[index][4]
+                bucket = self._device_bucket(device, now) if device is not None else None
+                device_wait = bucket.delay(now) if bucket is not None else 0.0
+                if device_wait > 0:
+                    wait = min(wait, device_wait)
+                    index += 1
+                    continue
+                self._bucket.take()
+                if bucket is not None:
+                    bucket.take()
+                batch.append((priority, queue[index]))
+                del queue[index]
+            _OUTBOUND.set(len(queue), priority=PRIORITY_NAMES[priority])
+        if any(self._outbound) and wait == float("inf"):
+            # Batch full or scan depth reached: come back at once.
+            wait = 0.0
+        return batch, wait
+
+    def _drain(self) -> float:
+        """Publish everything currently allowed; return the delay before the next message.
+
+        Called with ``self._send_lock`` held, so messages leave in queue order.
+        """
+
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                if not self._connected:
+                    stranded = [
+                        (priority, item) for priority, queue in enumerate(self._outbound) for item in queue
+                    ]
+                    for queue in self._outbound:
+                        queue.clear()
+                    batch, wait = [], float("inf")
+                else:
+                    stranded = []
+                    batch, wait = self._take_ready(now)
+            for priority, (_enqueued, topic, message, qos, device) in stranded:
+                self._enqueue(topic, message, qos, priority, device)
+            for priority, (enqueued, topic, message, qos, device) in batch:
+                _OUTBOUND_WAIT.observe(now - enqueued, priority=PRIORITY_NAMES[priority])
+                info = self.client.publish(topic, message, qos=qos)
+                if info.rc == mqtt.MQTT_ERR_NO_CONN and qos == 0:
+                    # paho keeps QoS 1/2 messages and resends them itself
+                    # after reconnecting; only QoS 0 ones are lost.
+                    self._enqueue(topic, message, qos, priority, device)
+                else:
+                    _PUBLISHED.inc(topic=topic)
+            if not batch or wait > 0:
+                return wait
+
+    def _ensure_sender(self) -> None:
+        if self._sender is not None:
+            return
+        with self._lock:
+            if self._sender is not None:
+                return
+            self._sender = threading.Thread(target=self._run_sender, name="radiateur-mqtt-sender", daemon=True)
+        self._sender.start()
+
+    def _run_sender(self) -> None:
+        wait = float("inf")
+        while True:
+            with self._lock:
+                if not self._submitted and not any(self._outbound):
+                    self._outbound_ready.wait()
+                elif not self._submitted and wait > 0:
+                    self._outbound_ready.wait(min(wait, 1.0))
+                self._submitted = False
+            with self._send_lock:
+                wait = self._drain()
+
+    def _enqueue(
+        self, topic: str, message: str, qos: int, priority: int = PRIORITY_MANUAL, device: str | None = None
+    ) -> None:
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            if len(self._offline_queue) == self._offline_queue.maxlen:
+                _DROPPED.inc(reason="overflow")
+            self._offline_queue.append(
+                (time.monotonic() + self._queue_ttl, topic, message, qos, priority, device)
+            )
+            _QUEUED.set(len(self._offline_queue))
+
+    def _purge_expired(self, now: float) -> None:
+        while self._offline_queue and self._offline_queue[0][0] <= now:
+            self._offline_queue.popleft()
+            _DROPPED.inc(reason="expired")
+
+    def _flush_offline_queue(self) -> None:
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            pending = list(self._offline_queue)
+            self._offline_queue.clear()
+            _QUEUED.set(0)
+
+        if not pending:
+            return
+        # Replayed through the paced queue, by priority then age.
+        now = time.monotonic()
+        with self._lock:
+            for _expires_at, topic, message, qos, priority, device in pending:
+                self._outbound[priority].append((now, topic, message, qos, device))
+        with self._send_lock:
+            self._drain()
+        self._ensure_sender()
+        self._write_log(f"{len(pending)} message(s) envoyé(s) après reconnexion")
+
+    def subscribe(self, topic: str) -> None:
+        self._topics.add(topic)
+        if self._connected:
+            self.client.subscribe(topic, qos=1)
+
+    def on_connect(self, client, userdata, flags, rc) -> None:  # type: ignore[override]
+        if rc != 0:
+            self._write_log(f"Connexion MQTT refusée (code {rc})")
+            return
+
+        for topic in sorted(self._topics):
+            self.client.subscribe(topic, qos=1)
+        self._connected = True
+        self._connected_since = time.time()
+        _CONNECTED.set(1)
+        self._write_log("Connexion au broker MQTT établie")
+        self._flush_offline_queue()
+
+    def on_disconnect(self, client, userdata, rc) -> None:  # type: ignore[override]
+        self._connected = False
+        self._last_disconnect = time.time()
+        _CONNECTED.set(0)
+        if rc != 0:
+            self._disconnects += 1
+            _DISCONNECTS.inc()
+            self._write_log(f"Connexion au broker MQTT perdue (code {rc}), reconnexion automatique")
+
     def on_message(self, client, userdata, message) -> None:  # type: ignore[override]
         payload = message.payload.decode("utf-8")
+        received_at = datetime.now(TIMEZONE).timestamp()
         with self._lock:
-            self.message_recu.append((datetime.now(TIMEZONE).timestamp(), payload))
+            self.message_recu.append((received_at, payload))
+            _BUFFERED.set(len(self.message_recu))
+        _RECEIVED.inc(topic=message.topic)
+        for listener in self._listeners:
+            try:
+                listener(received_at, payload)
+            except Exception as exc:  # pragma: no cover - keep the network loop alive
+                self._write_log(f"Erreur lors du traitement du message: {exc!r}")
+        self._write_log(payload)
+
+    def _write_log(self, line: str) -> None:
         if self._log_path:
             timestamp = datetime.now(TIMEZONE).strftime("%Y-%m-%d %H:%M:%S")
             with open(self._log_path, "a", encoding="utf-8") as file:
-                file.write(f"{timestamp} : {payload}\n")
+                file.write(f"{timestamp} : {line}\n")
 
     def unsubscribe(self) -> int:
         self.client.loop_stop()
@@ -48,5 +421,6 @@ class MQTTClient:
 
     def reset_message_recu(self) -> int:
         with self._lock:
-            self.message_recu = []
+            self.message_recu.clear()
+            _BUFFERED.set(0)
         return 1
@@ -0,0 +1,746 @@
+"""Weekly plannings per zone and per radiator.
+
+``data.json`` remains the default planning of every radiator.  ``zones.json``
+groups radiators into zones, optionally nested through ``parent``, and may
+override the planning of a zone or of a single radiator day by day; a day
+missing from an override is inherited from the parent zone, then from the
+default planning.
+
+The resolved planning of each radiator is compiled into a :class:`Timeline`,
+the sorted week minutes where the planned mode actually changes.  Radiators
+with identical plannings share one timeline, so the scheduler evaluates each
+distinct planning once per minute and publishes one grouped command per
+timeline rather than one per radiator.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .clock import CLOCK
+from .config import TIMEZONE
+from .configstore import file_version, get_config
+from .delivery import TRACKER
+from .locking import locked, replace_text
+from .metrics import REGISTRY
+from .mqtt_client import PRIORITY_SCHEDULE
+from .services import (
+    COMMAND_MODES,
+    WEEKDAYS,
+    enregistrer_log,
+    envoyer_changement_etat_mqtt,
+    get_liste_etat,
+    load_disabled_states,
+    radiateurs_disponibles,
+    signaler_changement_etat,
+)
+from .timers import TICK, TimerWheel
+
+ZONES_FILE_PATH = Path(__file__).resolve().parent / "templates" / "zones.json"
+BOOSTS_FILE = "boosts.json"
+BOOSTS_LOCK_FILE = "boosts.lock"
+BOOST_MODES = COMMAND_MODES
+MAX_BOOST_DURATION = 7 * 86400
+
+MINUTES_IN_DAY = 24 * 60
+WEEK_MINUTES = 7 * MINUTES_IN_DAY
+DEFAULT_LABEL = "défaut"
+
+_PLANNING_TRANSITIONS = REGISTRY.counter(
+    "radiateur_planning_transitions_total",
+    "Transitions déclenchées par le planning.",
+    ("mode",),
+)
+_PLANNING_SKIPPED = REGISTRY.counter(
+    "radiateur_planning_commands_skipped_total",
+    "Commandes du planning évitées car le radiateur est déjà dans le mode visé.",
+)
+_PLANNING_TIMELINES = REGISTRY.gauge(
+    "radiateur_planning_timelines",
+    "Plannings distincts évalués par le planificateur.",
+)
+
+Schedule = Dict[str, List[Dict[str, str]]]
+
+
+def parse_time(value: str, *, allow_midnight: bool) -> int:
+    """Parse an HH:MM string into minutes, optionally allowing 24:00."""
+
+    if value == "24:00":
+        if allow_midnight:
+            return MINUTES_IN_DAY
+        raise ValueError("L'heure 24:00 n'est autorisée qu'en fin de créneau.")
+
+    try:
+        parsed = datetime.strptime(value, "%H:%M")
+    except ValueError as exc:
+        raise ValueError("Format d'heure invalide. Utilisez HH:MM.") from exc
+
+    return parsed.hour * 60 + parsed.minute
+
+
+def format_time(minutes: int) -> str:
+    """Convert minutes to HH:MM, handling 24:00 as a special case."""
+
+    if minutes == MINUTES_IN_DAY:
+        return "24:00"
+    hours, mins = divmod(minutes, 60)
+    return f"{hours:02d}:{mins:02d}"
+
+
+def validate_schedule(payload: object, *, partial: bool = False) -> Schedule:
+    """Validate and normalize a weekly schedule.
+
+    With ``partial``, only the days present in ``payload`` are returned (the
+    others are inherited).
+    """
+
+    if not isinstance(payload, dict):
+        raise ValueError("Le planning doit être un objet JSON.")
+
+    schedule: Schedule = {}
+    for day in WEEKDAYS:
+        if partial and day not in payload:
+            continue
+        raw_entries = payload.get(day, [])
+        if raw_entries in (None, ""):
+            raw_entries = []
+
+        if not isinstance(raw_entries, list):
+            raise ValueError(f"Le jour {day} doit contenir une liste de créneaux.")
+
+        parsed_entries: List[Tuple[int, int]] = []
+        for raw_entry in raw_entries:
+            if not isinstance(raw_entry, dict):
+                raise ValueError("Chaque créneau doit être un objet JSON.")
+
+            start = raw_entry.get("start")
+            end = raw_entry.get("end")
+
+            if not isinstance(start, str) or not isinstance(end, str):
+                raise ValueError("Les heures doivent être des chaînes au format HH:MM.")
+
+            start_minutes = parse_time(start, allow_midnight=False)
+            end_minutes = parse_time(end, allow_midnight=True)
+
+            if start_minutes >= end_minutes:
+                raise ValueError("L'heure de fin doit être postérieure à l'heure de début.")
+
+            parsed_entries.append((start_minutes, end_minutes))
+
+        parsed_entries.sort(key=lambda entry: entry[0])
+
+        normalized: List[Dict[str, str]] = []
+        previous_end = None
+        for start_minutes, end_minutes in parsed_entries:
+            if previous_end is not None and start_minutes < previous_end:
+                raise ValueError("Les créneaux ne doivent pas se chevaucher.")
+            normalized.append({
+                "start": format_time(start_minutes),
+                "end": format_time(end_minutes),
+            })
+            previous_end = end_minutes
+
+        schedule[day] = normalized
+
+    return schedule
+
+
+# -- zones.json ----------------------------------------------------------------
+
+
+def default_zones() -> Dict[str, Dict[str, object]]:
+    return {"zones": {}, "devices": {}}
+
+
+def validate_zones(payload: object) -> Dict[str, Dict[str, object]]:
+    """Validate and normalize the zones definition.
+
+    ``{"zones": {name: {"parent": str|null, "radiators": [...], "schedule":
+    {day: [...]}}}, "devices": {radiator: {day: [...]}}}``
+    """
+
+    if not isinstance(payload, dict):
+        raise ValueError("La configuration des zones doit être un objet JSON.")
+    raw_zones = payload.get("zones") or {}
+    raw_devices = payload.get("devices") or {}
+    if not isinstance(raw_zones, dict) or not isinstance(raw_devices, dict):
+        raise ValueError("'zones' et 'devices' doivent être des objets JSON.")
+
+    zones: Dict[str, Dict[str, object]] = {}
+    owners: Dict[str, str] = {}
+    for name, raw_zone in raw_zones.items():
+        if not name.strip() or not isinstance(raw_zone, dict):
+            raise ValueError("Chaque zone doit avoir un nom et être un objet JSON.")
+        parent = raw_zone.get("parent") or None
+        if parent is not None and not isinstance(parent, str):
+            raise ValueError(f"Zone parente invalide pour {name}.")
+        radiators = raw_zone.get("radiators") or []
+        if not isinstance(radiators, list) or not all(isinstance(item, str) for item in radiators):
+            raise ValueError(f"Les radiateurs de la zone {name} doivent être une liste de noms.")
+        for radiator in radiators:
+            if radiator in owners:
+                raise ValueError(f"Le radiateur {radiator} appartient déjà à la zone {owners[radiator]}.")
+            owners[radiator] = name
+        zones[name] = {
+            "parent": parent,
+            "radiators": list(radiators),
+            "schedule": validate_schedule(raw_zone.get("schedule") or {}, partial=True),
+        }
+
+    for name, zone in zones.items():
+        seen = {name}
+        parent = zone["parent"]
+        while parent is not None:
+            if parent not in zones:
+                raise ValueError(f"Zone parente inconnue pour {name} : {parent}.")
+            if parent in seen:
+                raise ValueError(f"Héritage circulaire entre zones : {name}.")
+            seen.add(parent)
+            parent = zones[parent]["parent"]
+
+    devices = {
+        str(radiator): validate_schedule(schedule, partial=True)
+        for radiator, schedule in raw_devices.items()
+    }
+    return {"zones": zones, "devices": devices}
+
+
+def load_zones() -> Dict[str, Dict[str, object]]:
+    """Return the validated zones (none when missing or invalid)."""
+
+    try:
+        data = json.loads(ZONES_FILE_PATH.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return default_zones()
+    try:
+        return validate_zones(data)
+    except ValueError as exc:
+        enregistrer_log(f"Fichier des zones invalide, ignoré: {exc}")
+        return default_zones()
+
+
+def save_zones(payload: object) -> Dict[str, Dict[str, object]]:
+    """Validate ``payload`` and persist it; raise ``ValueError`` when invalid."""
+
+    zones = validate_zones(payload)
+    ZONES_FILE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    ZONES_FILE_PATH.write_text(json.dumps(zones, indent=4, ensure_ascii=False), encoding="utf-8")
+    notifier_modification()
+    return zones
+
+
+# -- compilation -----------------------------------------------------------------
+
+
+class Timeline:
+    """Week minutes (Monday 00:00 = 0) where the planned mode changes."""
+
+    __slots__ = ("transitions", "_minutes")
+
+    def __init__(self, transitions: Iterable[Tuple[int, str]]) -> None:
+        self.transitions: Tuple[Tuple[int, str], ...] = tuple(transitions)
+        self._minutes = [minute for minute, _mode in self.transitions]
+
+    def last_change(self, after: int, length: int) -> Optional[str]:
+        """Return the mode set by the last change in ``(after, after + length]``.
+
+        Week minutes wrap around; ``None`` when the planning does not change
+        in that window.
+        """
+
+        if not self.transitions or length <= 0:
+            return None
+        if length >= WEEK_MINUTES:
+            return self.mode_at(after + length)
+        end = after + length
+        if end >= WEEK_MINUTES:
+            index = bisect.bisect_right(self._minutes, end - WEEK_MINUTES) - 1
+            if index >= 0:
+                return self.transitions[index][1]
+            end = WEEK_MINUTES - 1
+        index = bisect.bisect_right(self._minutes, end) - 1
+        if index >= 0 and self._minutes[index] > after:
+            return self.transitions[index][1]
+        return None
+
+    def minutes_to_next(self, after: int) -> Optional[int]:
+        """Return how many minutes after ``after`` the next change happens."""
+
+        if not self.transitions:
+            return None
+        index = bisect.bisect_right(self._minutes, after)
+        if index < len(self._minutes):
+            return self._minutes[index] - after
+        return self._minutes[0] + WEEK_MINUTES - after
+
+    def mode_at(self, week_minute: int) -> str:
+        """Return the planned mode in force at ``week_minute``."""
+
+        if not self.transitions:
+            return "ECO"
+        # Before the first change of the week, the last one still applies.
+        return self.transitions[bisect.bisect_right(self._minutes, week_minute % WEEK_MINUTES) - 1][1]
+
+
+def week_minute(moment: datetime) -> int:
+    return moment.weekday() * MINUTES_IN_DAY + moment.hour * 60 + moment.minute
+
+
+def wall_minutes(moment: datetime) -> int:
+    """Minutes of local wall-clock time since 1970-01-01 00:00 (DST-shifted)."""
+
+    return int((moment.replace(tzinfo=None) - datetime(1970, 1, 1)).total_seconds() // 60)
+
+
+@lru_cache(maxsize=256)
+def _compile(slots: Tuple[Tuple[Tuple[int, int], ...], ...]) -> Tuple[Tuple[int, str], ...]:
+    covered = bytearray(WEEK_MINUTES)
+    for day_index, day_slots in enumerate(slots):
+        base = day_index * MINUTES_IN_DAY
+        for start, end in day_slots:
+            covered[base + start : base + end] = b"\x01" * (end - start)
+    if not any(covered):
+        return ()
+    if all(covered):
+        # No change during the week: a single transition keeps it COMFORT.
+        return ((0, "COMFORT"),)
+    return tuple(
+        (minute, "COMFORT" if covered[minute] else "ECO")
+        for minute in range(WEEK_MINUTES)
+        if covered[minute] != covered[minute - 1]
+    )
+
+
+def _slots(schedule: Schedule) -> Tuple[Tuple[Tuple[int, int], ...], ...]:
+    days = []
+    for day in WEEKDAYS:
+        day_slots = []
+        for entry in schedule.get(day, []):
+            try:
+                start = parse_time(entry["start"], allow_midnight=False)
+                end = parse_time(entry["end"], allow_midnight=True)
+            except (KeyError, ValueError):
+                continue
+            if start < end:
+                day_slots.append((start, end))
+        days.append(tuple(sorted(day_slots)))
+    return tuple(days)
+
+
+def compile_timeline(schedule: Schedule) -> Timeline:
+    """Compile a weekly schedule (COMFORT inside the slots, ECO elsewhere)."""
+
+    return Timeline(_compile(_slots(schedule)))
+
+
+@dataclass
+class CompiledPlanning:
+    """Distinct timelines and the radiators sharing each of them."""
+
+    timelines: Dict[Tuple[Tuple[int, str], ...], Timeline] = field(default_factory=dict)
+    groups: Dict[Tuple[Tuple[int, str], ...], List[str]] = field(default_factory=dict)
+    labels: Dict[Tuple[Tuple[int, str], ...], str] = field(default_factory=dict)
+    default: Timeline = field(default_factory=lambda: Timeline(()))
+    _device_keys: Dict[str, Tuple[Tuple[int, str], ...]] = field(default_factory=dict)
+
+    def timeline_for(self, device: str) -> Timeline:
+        key = self._device_keys.get(device)
+        return self.timelines[key] if key is not None else self.default
+
+    def due(self, previous: datetime, current: datetime) -> List[Tuple[str, str, List[str]]]:
+        """Return ``(label, mode, radiators)`` for the timelines changing in ``(previous, current]``.
+
+        The window is measured in local wall-clock minutes: the hour skipped
+        in spring is caught up at once, the hour repeated in autumn is not
+        replayed.  Only the net mode of each timeline is returned.
+        """
+
+        length = wall_minutes(current) - wall_minutes(previous)
+        after = week_minute(previous)
+        due = []
+        for key, timeline in self.timelines.items():
+            mode = timeline.last_change(after, length)
+            if mode is not None:
+                due.append((self.labels[key], mode, self.groups[key]))
+        return due
+
+    def next_change(self, moment: datetime) -> Optional[datetime]:
+        """Return the local wall-clock minute of the next change after ``moment``."""
+
+        after = week_minute(moment)
+        delays = [
+            delay for delay in (timeline.minutes_to_next(after) for timeline in self.timelines.values())
+            if delay is not None
+        ]
+        if not delays:
+            return None
+        start = moment.replace(tzinfo=None, second=0, microsecond=0)
+        return start + timedelta(minutes=min(delays))
+
+    @property
+    def has_transitions(self) -> bool:
+        """Whether any radiator's planning changes during the week."""
+
+        return any(timeline.transitions for timeline in self.timelines.values())
+
+    def describe(self) -> List[Dict[str, object]]:
+        return [
+            {"label": self.labels[key], "radiators": self.groups[key], "transitions": len(key)}
+            for key in self.timelines
+        ]
+
+
+def compile_planning(
+    default: Schedule, zones: Dict[str, Dict[str, object]], devices: Iterable[str]
+) -> CompiledPlanning:
+    """Resolve the planning of every radiator and share identical timelines."""
+
+    zone_defs: Dict[str, Dict[str, object]] = zones.get("zones", {})  # type: ignore[assignment]
+    overrides: Dict[str, Schedule] = zones.get("devices", {})  # type: ignore[assignment]
+    zone_of = {
+        radiator: name for name, zone in zone_defs.items() for radiator in zone["radiators"]  # type: ignore[union-attr]
+    }
+
+    compiled = CompiledPlanning(default=compile_timeline(default))
+    for device in devices:
+        chain: List[Schedule] = []
+        if device in overrides:
+            chain.append(overrides[device])
+        zone = zone_of.get(device)
+        label = device if device in overrides else (zone or DEFAULT_LABEL)
+        while zone is not None:
+            chain.append(zone_defs[zone]["schedule"])  # type: ignore[arg-type]
+            zone = zone_defs[zone]["parent"]  # type: ignore[assignment]
+        chain.append(default)
+
+        resolved = {day: next(schedule[day] for schedule in chain if day in schedule) for day in WEEKDAYS}
+        timeline = compile_timeline(resolved)
+        key = timeline.transitions
+        if key not in compiled.timelines:
+            compiled.timelines[key] = timeline
+            compiled.groups[key] = []
+            compiled.labels[key] = label
+        elif label not in compiled.labels[key].split(", "):
+            compiled.labels[key] += f", {label}"
+        compiled.groups[key].append(device)
+        compiled._device_keys[device] = key
+    return compiled
+
+
+_compiled: Optional[Tuple[Tuple, CompiledPlanning]] = None
+_compiled_lock = threading.Lock()
+
+
+def get_planning() -> CompiledPlanning:
+    """Return the compiled planning, recompiled when a file or the radiators change."""
+
+    global _compiled
+    config = get_config()
+    key = (config.version, file_version(ZONES_FILE_PATH))
+    with _compiled_lock:
+        if _compiled is None or _compiled[0] != key:
+            planning = compile_planning(config.schedule_dict(), load_zones(), config.radiators)
+            _compiled = (key, planning)
+            _PLANNING_TIMELINES.set(len(planning.timelines))
+        return _compiled[1]
+
+
+# -- scheduler -------------------------------------------------------------------
+
+
+def radiateurs_a_modifier(mode: str, liste_radiateur: Iterable[str]) -> List[str]:
+    """Keep the radiators whose confirmed or pending mode differs from the target.
+
+    Disabled radiators are compared against ECO, the mode they are forced to.
+    """
+
+    disabled_map = load_disabled_states()
+    en_attente = TRACKER.pending_modes()
+    etats = get_liste_etat()
+    a_modifier = []
+    for appareil in liste_radiateur:
+        cible = "ECO" if disabled_map.get(appareil) else mode
+        actuel = en_attente.get(appareil, etats.get(appareil))
+        if actuel == cible:
+            _PLANNING_SKIPPED.inc()
+            continue
+        a_modifier.append(appareil)
+    return a_modifier
+
+
+def appliquer_planning(
+    mqtt_client,
+    precedent: datetime,
+    maintenant: datetime,
+    compiled: Optional[CompiledPlanning] = None,
+) -> Dict[str, List[str]]:
+    """Publish the planned changes due since ``precedent``, one command per timeline.
+
+    Radiators under a boost keep their mode until the boost ends.
+    """
+
+    envoyes: Dict[str, List[str]] = {}
+    boosts = get_boosts()
+    compiled = compiled or get_planning()
+    for label, mode, radiateurs in compiled.due(precedent, maintenant):
+        _PLANNING_TRANSITIONS.inc(mode=mode)
+        radiateurs = [appareil for appareil in radiateurs if appareil not in boosts]
+        a_modifier = radiateurs_a_modifier(mode, radiateurs_disponibles(radiateurs))
+        enregistrer_log(f"Depuis planning ({label}) --> {mode} : {a_modifier or 'aucun changement'}")
+        if a_modifier:
+            envoyer_changement_etat_mqtt(mode, mqtt_client, a_modifier, priority=PRIORITY_SCHEDULE)
+            envoyes[label] = a_modifier
+    return envoyes
+
+
+class PlanningScheduler:
+    """Apply the plannings, sleeping until the next change instead of polling."""
+
+    MAX_SLEEP = 3600.0
+
+    def __init__(
+        self,
+        mqtt_client,
+        clock=CLOCK,
+        source: Callable[[], CompiledPlanning] = get_planning,
+    ) -> None:
+        self.mqtt_client = mqtt_client
+        self.clock = clock
+        self.source = source
+        self._precedent = clock.now()
+        self._reveil = threading.Event()
+        self._stop = threading.Event()
+
+    def step(self) -> float:
+        """Apply what is due since the previous step; return the seconds to wait."""
+
+        maintenant = self.clock.now()
+        compiled = self.source()
+        if wall_minutes(maintenant) > wall_minutes(self._precedent):
+            appliquer_planning(self.mqtt_client, self._precedent, maintenant, compiled)
+            self._precedent = maintenant
+
+        prochain = compiled.next_change(maintenant)
+        if prochain is None:
+            return self.MAX_SLEEP
+        # First occurrence of that wall-clock time (a gap resolves to before it).
+        cible = TIMEZONE.localize(prochain, is_dst=True).timestamp()
+        delai = cible - self.clock.time()
+        if delai <= 0:
+            # Inside the spring DST gap: check again every minute until it ends.
+            return 60.0
+        return min(self.MAX_SLEEP, delai + 0.5)
+
+    def wake(self) -> None:
+        """Re-evaluate now (the plannings changed)."""
+
+        self._reveil.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._reveil.set()
+
+    def run(self) -> None:
+        while not self._stop.is_set():
+            delai = self.step()
+            self.clock.wait(self._reveil, delai)
+            self._reveil.clear()
+
+
+_scheduler: Optional[PlanningScheduler] = None
+
+
+def notifier_modification() -> None:
+    """Tell the running scheduler that a planning file was saved."""
+
+    if _scheduler is not None:
+        _scheduler.wake()
+
+
+def maj_etat_selon_planning(mqtt_client) -> None:
+    """Update radiator states according to the plannings (thread target)."""
+
+    global _scheduler
+    if not mqtt_client:
+        return
+
+    # data.json is optional: zones.json may define every planning.  Without
+    # any transition the scheduler idles until a planning is saved.
+    if not get_planning().has_transitions:
+        enregistrer_log("Aucune transition planifiée, en attente d'une modification du planning")
+
+    _scheduler = PlanningScheduler(mqtt_client)
+    _scheduler.run()
+
+
+# -- boosts ------------------------------------------------------------------------
+#
+# Each server process (Gunicorn worker) runs its own runtime, so the boosts
+# live in ``boosts.json``, shared by all of them: changes are locked
+# read-modify-replace cycles of the file, and every process re-arms its
+# timer wheel when the file changed.  The first process whose wheel fires
+# removes the boost from the file and restores the planned mode; the others
+# find it gone and do nothing.
+
+_boosts: Optional[TimerWheel] = None
+_boosts_path: Optional[Path] = None
+_boosts_stamp: Optional[str] = None
+_boosts_sync_lock = threading.Lock()
+_client_getter: Callable[[], object] = lambda: None
+
+
+def mode_planifie(appareil: str, moment: Optional[datetime] = None) -> str:
+    """Return the mode the planning gives ``appareil`` at ``moment`` (now by default)."""
+
+    if load_disabled_states().get(appareil):
+        return "ECO"
+    moment = moment or CLOCK.now()
+    return get_planning().timeline_for(appareil).mode_at(week_minute(moment))
+
+
+def _fin_boost(appareil: str, payload: object) -> None:
+    signaler_changement_etat()
+    mode = mode_planifie(appareil)
+    enregistrer_log(f"Fin du boost de {appareil}, retour au planning : {mode}")
+    mqtt_client = _client_getter()
+    if mqtt_client and radiateurs_a_modifier(mode, [appareil]):
+        envoyer_changement_etat_mqtt(mode, mqtt_client, [appareil])
+
+
+def boosts_version() -> Optional[str]:
+    """Return a stamp of ``boosts.json`` changing whenever any process saves it."""
+
+    if _boosts_path is None:
+        return None
+    try:
+        stat = _boosts_path.stat()
+    except OSError:
+        return None
+    # The file is replaced on each save: a new inode even within one mtime tick.
+    return f"{stat.st_ino}.{stat.st_mtime_ns}"
+
+
+def _lire_boosts() -> Dict[str, Dict[str, object]]:
+    try:
+        raw = json.loads(_boosts_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+    if not isinstance(raw, dict):
+        return {}
+    return {
+        appareil: entry
+        for appareil, entry in raw.items()
+        if isinstance(entry, dict) and isinstance(entry.get("deadline"), (int, float))
+    }
+
+
+@contextmanager
+def _boosts_partages() -> Iterator[Dict[str, Dict[str, object]]]:
+    """Lock ``boosts.json`` across processes; changes to the yielded dict are saved."""
+
+    with locked(_boosts_path.with_name(BOOSTS_LOCK_FILE)):
+        boosts = _lire_boosts()
+        avant = dict(boosts)
+        yield boosts
+        if boosts != avant:
+            replace_text(_boosts_path, json.dumps(boosts, ensure_ascii=False))
+
+
+def _synchroniser_boosts() -> None:
+    """Re-arm the local wheel from ``boosts.json`` when another process changed it."""
+
+    global _boosts_stamp
+    with _boosts_sync_lock:
+        stamp = boosts_version()
+        if stamp == _boosts_stamp:
+            return
+        boosts = _lire_boosts()
+        armed = _boosts.pending()
+        for appareil in armed.keys() - boosts.keys():
+            _boosts.cancel(appareil)
+        for appareil, entry in boosts.items():
+            if armed.get(appareil) != (entry["deadline"], entry.get("payload")):
+                _boosts.schedule(appareil, entry["deadline"], entry.get("payload"))
+        _boosts_stamp = stamp
+
+
+def _expirer_boost(appareil: str, payload: object) -> None:
+    """Wheel callback: end the boost unless another process ended or extended it."""
+
+    with _boosts_partages() as boosts:
+        entry = boosts.get(appareil)
+        if entry is None:
+            return
+        # The wheel may fire up to one tick before the deadline.
+        if entry["deadline"] > CLOCK.time() + TICK:
+            _boosts.schedule(appareil, entry["deadline"], entry.get("payload"))
+            return
+        del boosts[appareil]
+    _fin_boost(appareil, payload)
+
+
+def demarrer_boosts(directory: Path, client_getter: Callable[[], object]) -> TimerWheel:
+    """Create the boost timer wheel, arm the shared boosts and start it."""
+
+    global _boosts, _boosts_path, _client_getter
+    _client_getter = client_getter
+    if _boosts is None:
+        _boosts_path = Path(directory) / BOOSTS_FILE
+        _boosts = TimerWheel(_expirer_boost, clock=CLOCK.time)
+        _synchroniser_boosts()
+        restored = len(_boosts.pending())
+        if restored:
+            enregistrer_log(f"{restored} boost(s) restauré(s)")
+        _boosts.start()
+    return _boosts
+
+
+def get_boosts() -> Dict[str, Dict[str, object]]:
+    """Return the active boosts as ``radiator -> {mode, until}``, whichever process started them."""
+
+    if _boosts is None:
+        return {}
+    _synchroniser_boosts()
+    return {
+        appareil: {"mode": payload, "until": deadline}
+        for appareil, (deadline, payload) in _boosts.pending().items()
+    }
+
+
+def demarrer_boost(mqtt_client, appareil: str, mode: str, duree: float) -> Dict[str, str] | None:
+    """Force ``mode`` on ``appareil`` for ``duree`` seconds, then resume the planning."""
+
+    if _boosts is None:
+        raise RuntimeError("Les boosts ne sont pas initialisés")
+    if mode not in BOOST_MODES or not 0 < duree <= MAX_BOOST_DURATION:
+        raise ValueError("Boost invalide.")
+    echeance = CLOCK.time() + duree
+    with _boosts_partages() as boosts:
+        boosts[appareil] = {"deadline": echeance, "payload": mode}
+    _boosts.schedule(appareil, echeance, mode)
+    signaler_changement_etat()
+    enregistrer_log(f"Boost {mode} pour {appareil} pendant {int(duree // 60)} min")
+    return envoyer_changement_etat_mqtt(mode, mqtt_client, [appareil])
+
+
+def annuler_boost(appareil: str) -> bool:
+    """End the boost of ``appareil`` now and restore its planned mode."""
+
+    if _boosts is None:
+        return False
+    with _boosts_partages() as boosts:
+        entry = boosts.pop(appareil, None)
+    _boosts.cancel(appareil)
+    if entry is None:
+        return False
+    _fin_boost(appareil, None)
+    return True
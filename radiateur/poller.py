@@ -0,0 +1,126 @@
+"""Background STATE poller spreading requests over the polling interval.
+
+Instead of asking every radiator at once on each dashboard refresh, the
+poller sends one STATE request at a time, evenly spaced across the interval
+with a random jitter, so the broker and the ESP8266 Wi-Fi never see a burst.
+The interval grows with the fleet size and while nothing changes, and drops
+back to its minimum as soon as a command or a state change is observed.
+HTTP views only read the cache fed by the replies.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from . import services
+from .clock import CLOCK
+from .health import HEALTH
+from .metrics import REGISTRY
+
+POLL_INTERVAL = 30.0
+MIN_INTERVAL = 10.0
+MAX_INTERVAL = 300.0
+MIN_DEVICE_SPACING = 0.5
+ACTIVE_WINDOW = 120.0
+QUIET_GROWTH = 1.5
+JITTER = 0.5
+
+_INTERVAL = REGISTRY.gauge(
+    "radiateur_poll_interval_seconds",
+    "Intervalle courant entre deux interrogations d'un même radiateur.",
+)
+_POLLS = REGISTRY.counter(
+    "radiateur_poll_requests_total",
+    "Requêtes STATE envoyées par l'interrogation en arrière-plan.",
+)
+
+
+class StatePoller:
+    """Poll radiators one after another on a daemon thread."""
+
+    def __init__(
+        self,
+        mqtt_client,
+        interval: float = POLL_INTERVAL,
+        *,
+        min_interval: float = MIN_INTERVAL,
+        max_interval: float = MAX_INTERVAL,
+        jitter: float = JITTER,
+        devices: Callable[[], List[str]] = services.get_all_radiator_names,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self.mqtt_client = mqtt_client
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, interval)
+        self.jitter = jitter
+        self._devices = devices
+        self._rng = rng or random.Random()
+        self._quiet_cycles = 0
+        self._sent: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def next_interval(self, device_count: int, now: float | None = None) -> float:
+        """Return the duration of the next cycle for ``device_count`` radiators."""
+
+        now = CLOCK.time() if now is None else now
+        floor = device_count * MIN_DEVICE_SPACING
+        if now - services.get_dernier_changement() < ACTIVE_WINDOW:
+            self._quiet_cycles = 0
+            return max(self.min_interval, floor)
+
+        interval = self.interval * (QUIET_GROWTH ** self._quiet_cycles)
+        if interval < self.max_interval:
+            self._quiet_cycles += 1
+        return max(floor, min(self.max_interval, interval))
+
+    def offsets(self, device_count: int, interval: float) -> List[float]:
+        """Spread ``device_count`` sends over ``interval`` with a random jitter."""
+
+        if not device_count:
+            return []
+        slot = interval / device_count
+        return [slot * (index + self._rng.uniform(0, self.jitter)) for index in range(device_count)]
+
+    def run_cycle(self) -> float:
+        """Poll every available radiator once; return the cycle duration."""
+
+        devices = HEALTH.filter_available(self._devices())
+        interval = self.next_interval(len(devices))
+        _INTERVAL.set(interval)
+        started = time.monotonic()
+
+        for device, offset in zip(devices, self.offsets(len(devices), interval)):
+            if self._stop.wait(max(0.0, started + offset - time.monotonic())):
+                return interval
+            if not self.mqtt_client.is_connected():
+                continue
+            previous = self._sent.pop(device, None)
+            if previous is not None:
+                services.verifier_reponse_etat(device, previous)
+            self._sent[device] = services.envoyer_requete_etat(self.mqtt_client, device)
+            _POLLS.inc()
+
+        self._stop.wait(max(0.0, started + interval - time.monotonic()))
+        return interval
+
+    def run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_cycle()
+            except Exception as exc:  # pragma: no cover - keep polling alive
+                services.enregistrer_log(f"Erreur de l'interrogation périodique: {exc!r}")
+                self._stop.wait(self.min_interval)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.run, name="radiateur-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,101 @@
+"""Per-radiator round-trip time estimation (RFC 6298 style).
+
+Every STATE reply and command acknowledgement feeds a smoothed RTT and its
+variance for the responding radiator.  The resulting retransmission timeout
+(RTO) replaces the fixed two-second window: a fast radiator is retried after a
+few hundred milliseconds while a slow one gets the time it usually needs.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from threading import Lock
+from typing import Dict, Optional
+
+from .metrics import REGISTRY
+
+ALPHA = 1 / 8
+BETA = 1 / 4
+K = 4
+CLOCK_GRANULARITY = 0.05
+INITIAL_RTO = 2.0
+MIN_RTO = 0.2
+MAX_RTO = 8.0
+
+_RTO = REGISTRY.gauge(
+    "radiateur_device_rto_seconds",
+    "Délai de retransmission estimé pour chaque radiateur.",
+    ("device",),
+)
+_SRTT = REGISTRY.gauge(
+    "radiateur_device_srtt_seconds",
+    "Temps aller-retour lissé mesuré pour chaque radiateur.",
+    ("device",),
+)
+
+
+@dataclass
+class RttEstimator:
+    """Smoothed RTT, RTT variance and derived timeout of one radiator."""
+
+    srtt: Optional[float] = None
+    rttvar: float = 0.0
+    rto: float = INITIAL_RTO
+    samples: int = 0
+
+    def observe(self, sample: float) -> None:
+        sample = max(0.0, sample)
+        if self.srtt is None:
+            self.srtt = sample
+            self.rttvar = sample / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - sample)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * sample
+        self.samples += 1
+        self.rto = min(MAX_RTO, max(MIN_RTO, self.srtt + max(CLOCK_GRANULARITY, K * self.rttvar)))
+
+    def backoff(self) -> None:
+        """Double the timeout after an unanswered request (kept until the next sample)."""
+
+        self.rto = min(MAX_RTO, self.rto * 2)
+
+
+class RttRegistry:
+    """Thread-safe collection of estimators indexed by radiator name."""
+
+    def __init__(self) -> None:
+        self._estimators: Dict[str, RttEstimator] = {}
+        self._lock = Lock()
+
+    def _get(self, device: str) -> RttEstimator:
+        estimator = self._estimators.get(device)
+        if estimator is None:
+            estimator = self._estimators[device] = RttEstimator()
+        return estimator
+
+    def rto(self, device: str) -> float:
+        with self._lock:
+            return self._get(device).rto
+
+    def observe(self, device: str, sample: float) -> None:
+        with self._lock:
+            estimator = self._get(device)
+            estimator.observe(sample)
+            _RTO.set(estimator.rto, device=device)
+            _SRTT.set(estimator.srtt or 0.0, device=device)
+
+    def backoff(self, device: str) -> None:
+        with self._lock:
+            estimator = self._get(device)
+            estimator.backoff()
+            _RTO.set(estimator.rto, device=device)
+
+    def snapshot(self) -> Dict[str, Dict[str, float | None]]:
+        with self._lock:
+            return {
+                device: {"srtt": estimator.srtt, "rto": estimator.rto}
+                for device, estimator in self._estimators.items()
+            }
+
+
+RTT = RttRegistry()
@@ -6,19 +6,41 @@ import socket
 import subprocess
 import threading
 import time
-from typing import Optional
+from pathlib import Path
+from typing import Mapping, Optional, Sequence
 
-from .config import MQTT_SETTINGS
+from django.conf import settings
+
+from . import events, planning
+from .config import DATA_DIRECTORY, MQTT_SETTINGS
+from .health import HEALTH
+from .history import get_store as get_history_store
+from .metrics import REGISTRY
 from .mqtt_client import MQTTClient
+from .poller import StatePoller
+from .snapshot import StateSnapshot
 from .services import (
+    boucle_relance_commandes,
+    boucle_sonde_appareils,
     enregistrer_log,
-    maj_etat_selon_planning,
+    register_state_listener,
     set_liste_etat,
+    traiter_message_recu,
 )
 
 _state_lock = threading.Lock()
 _initialized = False
 _mqtt_client: Optional[MQTTClient] = None
+_poller: Optional[StatePoller] = None
+
+_INITIALIZE_DURATION = REGISTRY.gauge(
+    "radiateur_runtime_initialize_seconds",
+    "Durée de la dernière initialisation du runtime MQTT.",
+)
+_BROKER_START_ATTEMPTS = REGISTRY.counter(
+    "radiateur_broker_start_attempts_total",
+    "Tentatives de démarrage automatique du broker MQTT.",
+)
 
 
 def _can_connect() -> bool:
@@ -43,6 +65,7 @@ def _ensure_broker_running() -> None:
     if not command:
         return
 
+    _BROKER_START_ATTEMPTS.inc()
     try:
         subprocess.Popen(
             command,
@@ -69,39 +92,185 @@ def _ensure_broker_running() -> None:
     )
 
 
+# Management commands that need the MQTT runtime (everything else, such as
+# ``migrate`` or ``test``, boots without touching the broker).
+RUNTIME_COMMANDS = frozenset({"runserver"})
+# Programs serving requests; any other process (tests, scripts, wrappers)
+# only starts the runtime when RADIATEUR_START_RUNTIME=1 is set.
+SERVER_PROGRAMS = frozenset({"gunicorn", "uwsgi", "daphne", "uvicorn", "hypercorn"})
+MANAGEMENT_PROGRAMS = frozenset({"manage.py", "django-admin", "django"})
+
+CONNECT_BACKOFF_INITIAL = 0.5
+CONNECT_BACKOFF_MAX = 30.0
+
+_started = False
+_stop_event = threading.Event()
+_workers_started = False
+
+
+def should_start_runtime(argv: Sequence[str], environ: Mapping[str, str]) -> bool:
+    """Return True when the current process needs the MQTT runtime."""
+
+    if settings.RADIATEUR_RUNTIME_MODE == "off":
+        return False
+    if environ.get("RADIATEUR_START_RUNTIME") == "1":
+        return True
+
+    path = Path(argv[0]) if argv else Path()
+    # ``python -m django`` / ``python -m gunicorn`` run the package's __main__.py.
+    program = path.parent.name if path.name == "__main__.py" else path.name
+    if program in SERVER_PROGRAMS:
+        return True
+    if program not in MANAGEMENT_PROGRAMS:
+        return False
+
+    command = argv[1] if len(argv) > 1 else ""
+    if command not in RUNTIME_COMMANDS:
+        return False
+
+    # The autoreloader parent only watches files; the child serves requests.
+    if "--noreload" not in argv and environ.get("RUN_MAIN") != "true":
+        return False
+    return True
+
+
+def _prepare_state() -> None:
+    """Seed the state cache from the on-disk snapshot (revalidated by the poller)."""
+
+    enregistrer_log("Démarrage du serveur")
+    snapshot = StateSnapshot(DATA_DIRECTORY)
+    entries = snapshot.load()
+    liste_initiale = {radiateur: "DEFAULT" for radiateur in MQTT_SETTINGS.devices}
+    for radiateur, entry in entries.items():
+        mode = entry.get("mode")
+        if isinstance(mode, str):
+            liste_initiale[radiateur] = mode
+        last_seen = entry.get("last_seen")
+        if isinstance(last_seen, (int, float)):
+            HEALTH.record_success(radiateur, last_seen)
+    set_liste_etat(liste_initiale)
+    register_state_listener(snapshot.record)
+
+    planning.demarrer_boosts(DATA_DIRECTORY, get_mqtt_client)
+
+    try:
+        events.open_journal(DATA_DIRECTORY)
+    except OSError as exc:  # pragma: no cover - unwritable data directory
+        enregistrer_log(f"Journal des événements indisponible: {exc!r}")
+
+    try:
+        history = get_history_store()
+    except Exception as exc:  # pragma: no cover - unwritable database
+        enregistrer_log(f"Historique des modes indisponible: {exc!r}")
+    else:
+        history.start()
+        register_state_listener(history.record)
+    if entries:
+        enregistrer_log(f"État restauré pour {len(entries)} radiateur(s)")
+
+
+def _connect_once() -> bool:
+    """Try to create the shared client; return True on success.
+
+    The client keeps reconnecting on its own once created, so this only
+    fails on configuration errors (unresolvable host, invalid port...).
+    """
+
+    global _mqtt_client, _poller, _workers_started
+    try:
+        client = MQTTClient(
+            MQTT_SETTINGS.host,
+            MQTT_SETTINGS.port,
+            MQTT_SETTINGS.log_file,
+            queue_size=MQTT_SETTINGS.offline_queue_size,
+            queue_ttl=MQTT_SETTINGS.offline_queue_ttl,
+            publish_rate=MQTT_SETTINGS.publish_rate,
+            publish_burst=MQTT_SETTINGS.publish_burst,
+            device_rate=MQTT_SETTINGS.device_publish_rate,
+            device_burst=MQTT_SETTINGS.device_publish_burst,
+        )
+        client.add_listener(traiter_message_recu)
+        client.subscribe(MQTT_SETTINGS.topic)
+    except Exception as exc:  # pragma: no cover - network failures during tests
+        enregistrer_log(f"Impossible de créer le client MQTT: {exc}")
+        return False
+
+    _mqtt_client = client
+    enregistrer_log("Client MQTT démarré")
+    if not _workers_started:
+        _workers_started = True
+        for target in (planning.maj_etat_selon_planning, boucle_relance_commandes, boucle_sonde_appareils):
+            threading.Thread(target=target, args=(client,), daemon=True).start()
+        _poller = StatePoller(client, settings.RADIATEUR_POLL_INTERVAL)
+        _poller.start()
+    return True
+
+
 def initialize() -> None:
-    """Initialize MQTT client and background workers once."""
+    """Initialize MQTT client and background workers once (blocking)."""
 
-    global _initialized, _mqtt_client
+    global _initialized
     with _state_lock:
         if _initialized:
             return
 
-        enregistrer_log("Démarrage du serveur")
-        liste_initiale = {radiateur: "DEFAULT" for radiateur in MQTT_SETTINGS.devices}
-        set_liste_etat(liste_initiale)
-
+        started = time.perf_counter()
+        _prepare_state()
         _ensure_broker_running()
+        _connect_once()
+        _INITIALIZE_DURATION.set(time.perf_counter() - started)
+        _initialized = True
 
-        try:
-            client = MQTTClient(
-                MQTT_SETTINGS.host,
-                MQTT_SETTINGS.port,
-                MQTT_SETTINGS.log_file,
-            )
-            client.subscribe(MQTT_SETTINGS.topic)
-            _mqtt_client = client
-            enregistrer_log("Client MQTT connecté")
-            threading.Thread(
-                target=maj_etat_selon_planning,
-                args=(client,),
-                daemon=True,
-            ).start()
-        except Exception as exc:  # pragma: no cover - network failures during tests
-            enregistrer_log(f"Impossible de joindre le serveur MQTT: {exc}")
-            _mqtt_client = None
 
-        _initialized = True
+def _initialize_in_background() -> None:
+    """Create the client with exponential backoff; it then reconnects by itself."""
+
+    global _initialized
+    started = time.perf_counter()
+    _ensure_broker_running()
+
+    delay = CONNECT_BACKOFF_INITIAL
+    while not _stop_event.is_set():
+        if _connect_once():
+            break
+        enregistrer_log(f"Nouvelle tentative de connexion MQTT dans {delay:.1f} s")
+        _stop_event.wait(delay)
+        delay = min(delay * 2, CONNECT_BACKOFF_MAX)
+
+    _INITIALIZE_DURATION.set(time.perf_counter() - started)
+    _initialized = True
+
+
+def start() -> None:
+    """Start the runtime without blocking the calling thread.
+
+    ``RADIATEUR_RUNTIME_MODE=sync`` keeps the historical blocking behaviour.
+    """
+
+    global _started
+    with _state_lock:
+        if _started:
+            return
+        _started = True
+
+    if settings.RADIATEUR_RUNTIME_MODE == "sync":
+        initialize()
+        return
+
+    _prepare_state()
+    threading.Thread(
+        target=_initialize_in_background,
+        name="radiateur-runtime-init",
+        daemon=True,
+    ).start()
+
+
+def stop() -> None:
+    """Abort pending background connection attempts and stop polling."""
+
+    _stop_event.set()
+    if _poller is not None:
+        _poller.stop()
 
 
 def get_mqtt_client() -> Optional[MQTTClient]:
@@ -110,8 +279,16 @@ def get_mqtt_client() -> Optional[MQTTClient]:
     return _mqtt_client
 
 
+def get_connection_health() -> dict:
+    """Describe the broker connection for the health endpoint."""
+
+    if _mqtt_client is None:
+        return {"connected": False, "initialized": _initialized, "queued_messages": 0}
+    return {"initialized": _initialized, **_mqtt_client.health()}
+
+
 def runtime_ready() -> bool:
-    """Indicate whether the runtime initialization has been attempted."""
+    """Indicate whether the runtime initialization has completed."""
 
     return _initialized
 
@@ -0,0 +1,140 @@
+"""Named scenes ("absent", "nuit", "vacances"...) re-applied in one request.
+
+Scenes are stored in ``templates/scenes.json`` next to ``options.json`` and
+edited from the options page.  Each scene is compiled once: disabled
+radiators are forced to ECO, radiators that no longer exist are dropped and
+every command payload is pre-encoded around its command id.  Scenes are
+recompiled only when the scenes, the options or the radiator list change,
+so activating one is a dictionary lookup followed by a burst of ready-made
+publishes.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from .coalescer import COALESCER
+from .configstore import OPTIONS_FILE_PATH, ConfigSnapshot, file_version, get_config
+from .services import COMMAND_MODES, encoder_commande, enregistrer_log, envoyer_modes_mqtt
+
+SCENES_FILE_PATH = OPTIONS_FILE_PATH.parent / "scenes.json"
+
+
+def default_scenes() -> Dict[str, Dict[str, Dict[str, str]]]:
+    return {"scenes": {}}
+
+
+def validate_scenes(payload: object) -> Dict[str, Dict[str, Dict[str, str]]]:
+    """Validate ``{"scenes": {name: {radiator: mode}}}``."""
+
+    if not isinstance(payload, dict) or not isinstance(payload.get("scenes", {}), dict):
+        raise ValueError("Les scènes doivent être un objet JSON {\"scenes\": {nom: {radiateur: mode}}}.")
+    scenes: Dict[str, Dict[str, str]] = {}
+    for name, modes in payload.get("scenes", {}).items():
+        name = name.strip()
+        if not name or "/" in name:
+            raise ValueError("Chaque scène doit avoir un nom (sans « / »).")
+        if not isinstance(modes, dict) or not modes:
+            raise ValueError(f"La scène {name} doit associer au moins un radiateur à un mode.")
+        for radiator, mode in modes.items():
+            if mode not in COMMAND_MODES:
+                raise ValueError(f"Mode invalide pour {radiator} dans la scène {name} : {mode}.")
+        scenes[name] = {str(radiator): mode for radiator, mode in modes.items()}
+    return {"scenes": scenes}
+
+
+def load_scenes() -> Dict[str, Dict[str, Dict[str, str]]]:
+    """Return the validated scenes (none when missing or invalid)."""
+
+    try:
+        data = json.loads(SCENES_FILE_PATH.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return default_scenes()
+    try:
+        return validate_scenes(data)
+    except ValueError as exc:
+        enregistrer_log(f"Fichier des scènes invalide, ignoré: {exc}")
+        return default_scenes()
+
+
+def save_scenes(payload: object) -> Dict[str, Dict[str, Dict[str, str]]]:
+    """Validate ``payload`` and persist it; raise ``ValueError`` when invalid."""
+
+    scenes = validate_scenes(payload)
+    SCENES_FILE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    SCENES_FILE_PATH.write_text(json.dumps(scenes, indent=4, ensure_ascii=False), encoding="utf-8")
+    return scenes
+
+
+@dataclass(frozen=True)
+class CompiledScene:
+    """A scene ready to publish: final modes, radiators per mode and encoded payloads."""
+
+    name: str
+    modes: Dict[str, str]
+    groups: Dict[str, Tuple[str, ...]]
+    payloads: Dict[str, Tuple[str, str]]
+    libelle: str
+
+    def describe(self) -> Dict[str, object]:
+        return {"modes": dict(self.modes), "groups": {mode: list(group) for mode, group in self.groups.items()}}
+
+
+def compile_scenes(
+    scenes: Dict[str, Dict[str, str]], devices: Iterable[str], disabled: Dict[str, bool]
+) -> Dict[str, CompiledScene]:
+    known = set(devices)
+    compiled: Dict[str, CompiledScene] = {}
+    for name, requested in scenes.items():
+        modes = {
+            radiator: "ECO" if disabled.get(radiator) else mode
+            for radiator, mode in requested.items()
+            if radiator in known
+        }
+        groups: Dict[str, Tuple[str, ...]] = {}
+        for radiator, mode in modes.items():
+            groups[mode] = groups.get(mode, ()) + (radiator,)
+        compiled[name] = CompiledScene(
+            name=name,
+            modes=modes,
+            groups=groups,
+            payloads={radiator: encoder_commande(radiator, mode) for radiator, mode in modes.items()},
+            libelle=f"Scène « {name} » : "
+            + ", ".join(f"{radiator} --> {mode}" for radiator, mode in modes.items()),
+        )
+    return compiled
+
+
+_compiled: Optional[Tuple[tuple, Dict[str, CompiledScene]]] = None
+_compiled_lock = threading.Lock()
+
+
+def scenes_version(config: ConfigSnapshot | None = None) -> Tuple[Optional[int], int]:
+    """Return a key that changes with the scenes file or the configuration."""
+
+    return file_version(SCENES_FILE_PATH), (config or get_config()).version
+
+
+def get_scenes() -> Dict[str, CompiledScene]:
+    """Return the compiled scenes, recompiled when a file or the radiators change."""
+
+    global _compiled
+    config = get_config()
+    key = scenes_version(config)
+    with _compiled_lock:
+        if _compiled is None or _compiled[0] != key:
+            _compiled = (key, compile_scenes(load_scenes()["scenes"], config.radiators, config.disabled))
+        return _compiled[1]
+
+
+def activer_scene(name: str, mqtt_client, command_id: str | None = None) -> Dict[str, str] | None:
+    """Publish the scene ``name``; raise ``KeyError`` when it does not exist."""
+
+    scene = get_scenes()[name]
+    COALESCER.discard(scene.modes)
+    return envoyer_modes_mqtt(
+        scene.modes, mqtt_client, command_id, encodees=scene.payloads, libelle=scene.libelle
+    )
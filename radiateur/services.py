@@ -4,84 +4,110 @@ from __future__ import annotations
 
 import ast
 import json
+import threading
 import time
-from datetime import datetime, timedelta
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Iterable, List
-
-from .config import APP_LOG_FILE, MQTT_SETTINGS, TIMEZONE
-from .models import get_device_names
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import events, tracing
+from .clock import CLOCK
+from .config import APP_LOG_FILE, MQTT_SETTINGS
+# The file paths and WEEKDAYS are re-exported for the older call sites.
+from .configstore import (
+    OPTIONS_FILE_PATH,
+    PLANNING_FILE_PATH,
+    WEEKDAYS,
+    ConfigSnapshot,
+    get_config,
+    save_disabled,
+)
+from .delivery import TRACKER
+from .health import HEALTH
+from .metrics import REGISTRY
+from .mqtt_client import PRIORITY_MANUAL, PRIORITY_POLL, PRIORITY_SCHEDULE
+from .rtt import RTT
 
 
 _liste_etat: Dict[str, str] = {}
 
-OPTIONS_FILE_PATH = Path(__file__).resolve().parent / "templates" / "options.json"
+# Timestamp of the last state report of each radiator, signalled to the
+# threads waiting in demander_etat_au_appareil.
+_dernieres_reponses: Dict[str, float] = {}
+_reponses_condition = threading.Condition()
+# Time of the last observed state change or command, used by the poller to
+# speed up while the installation is in use.
+_dernier_changement: float = 0.0
+
+# Generation of everything /retourner_etat/ reports (states, pending commands,
+# health, boosts), bumped on each change; long-polling requests wait on it.
+_version_etat = 0
+_version_condition = threading.Condition()
+
+# Callbacks notified of every cache update as
+# ``callback(appareil, etat, precedent, source, horaire)``.
+_state_listeners: List[Callable[[str, str, Optional[str], str, float], None]] = []
+
+_COMMANDS_SENT = REGISTRY.counter(
+    "radiateur_commands_sent_total",
+    "Commandes de changement de mode envoyées aux radiateurs.",
+    ("mode",),
+)
+_STATE_QUERY_DURATION = REGISTRY.histogram(
+    "radiateur_state_query_duration_seconds",
+    "Durée complète d'une interrogation d'état (toutes tentatives comprises).",
+)
+_STATE_QUERY_RETRIES = REGISTRY.counter(
+    "radiateur_state_query_retries_total",
+    "Nouvelles tentatives d'interrogation d'état déclenchées faute de réponse.",
+)
+_DEVICE_REPLY_LATENCY = REGISTRY.histogram(
+    "radiateur_device_reply_seconds",
+    "Temps de réponse d'un radiateur à une requête STATE.",
+    ("device",),
+)
+_DEVICE_REPLIES = REGISTRY.counter(
+    "radiateur_device_replies_total",
+    "Réponses STATE reçues par radiateur.",
+    ("device",),
+)
+_DEVICE_TIMEOUTS = REGISTRY.counter(
+    "radiateur_device_timeouts_total",
+    "Radiateurs marqués en erreur après épuisement des tentatives.",
+    ("device",),
+)
+
+# Modes a radiator can be commanded into.
+COMMAND_MODES = ("COMFORT", "ECO", "HORSGEL", "OFF")
 
 
 def get_all_radiator_names() -> List[str]:
     """Return the union of configured and user-declared radiators."""
 
-    base = [name.strip() for name in MQTT_SETTINGS.devices if name.strip()]
-    seen = {name for name in base}
+    return list(get_config().radiators)
 
-    extras = get_device_names()
 
-    for extra in extras:
-        if extra and extra not in seen:
-            base.append(extra)
-            seen.add(extra)
-
-    return base
-
-
-def _ensure_state_entries() -> None:
+def _ensure_state_entries(config: ConfigSnapshot | None = None) -> None:
     """Ensure the shared state dictionary tracks every known radiator."""
 
-    for radiator in get_all_radiator_names():
+    for radiator in (config or get_config()).radiators:
         _liste_etat.setdefault(radiator, "DEFAULT")
 
 
-def _default_disabled_states() -> Dict[str, bool]:
-    """Return the default disabled state for each configured radiator."""
-
-    return {radiator: False for radiator in get_all_radiator_names()}
-
-
 def load_disabled_states() -> Dict[str, bool]:
-    """Load the per-radiator disabled configuration from disk."""
-
-    defaults = _default_disabled_states()
-    if not OPTIONS_FILE_PATH.exists():
-        return defaults
-
-    try:
-        raw = json.loads(OPTIONS_FILE_PATH.read_text(encoding="utf-8"))
-    except (OSError, json.JSONDecodeError):
-        return defaults
-
-    if not isinstance(raw, dict):
-        return defaults
-
-    for radiator, value in raw.items():
-        if radiator in defaults:
-            defaults[radiator] = bool(value)
+    """Return the per-radiator disabled configuration."""
 
-    return defaults
+    return get_config().disabled_map()
 
 
 def save_disabled_states(states: Dict[str, bool]) -> Dict[str, bool]:
     """Persist the disabled map to disk and return the sanitized structure."""
 
-    sanitized = _default_disabled_states()
-    for radiator, value in states.items():
-        if radiator in sanitized:
-            sanitized[radiator] = bool(value)
-
-    OPTIONS_FILE_PATH.parent.mkdir(parents=True, exist_ok=True)
-    OPTIONS_FILE_PATH.write_text(
-        json.dumps(sanitized, ensure_ascii=False, indent=4), encoding="utf-8"
-    )
-    return sanitized
+    disabled = save_disabled(states).disabled_map()
+    signaler_changement_etat()
+    return disabled
 
 
 def update_disabled_state(radiator: str, disabled: bool) -> Dict[str, bool]:
@@ -109,26 +135,111 @@ def get_liste_etat() -> Dict[str, str]:
     return _liste_etat
 
 
+def get_version_etat() -> int:
+    """Return the generation of the reported state (see :func:`signaler_changement_etat`)."""
+
+    return _version_etat
+
+
+def signaler_changement_etat() -> None:
+    """Bump the state generation and wake the requests waiting for a change."""
+
+    global _version_etat
+    with _version_condition:
+        _version_etat += 1
+        _version_condition.notify_all()
+
+
+def attendre_changement_etat(version: int, timeout: float) -> int:
+    """Wait up to ``timeout`` seconds for the generation to move past ``version``."""
+
+    with _version_condition:
+        _version_condition.wait_for(lambda: _version_etat != version, timeout)
+        return _version_etat
+
+
+# The circuits reported by /retourner_etat/ also change on their own
+# (cool-down elapsed, probe unanswered).
+HEALTH.register_listener(signaler_changement_etat)
+
+
+def register_state_listener(
+    callback: Callable[[str, str, Optional[str], str, float], None]
+) -> None:
+    """Be notified of every update of the state cache (snapshot, history...)."""
+
+    if callback not in _state_listeners:
+        _state_listeners.append(callback)
+
+
+def _set_etat(appareil: str, etat: str, source: str, horaire: float | None = None) -> None:
+    """Update the cached state of ``appareil`` and notify the listeners.
+
+    ``source`` tells where the state comes from: ``report`` (STATE reply),
+    ``ack`` (command acknowledgement) or ``timeout``.
+    """
+
+    precedent = _liste_etat.get(appareil)
+    _liste_etat[appareil] = etat
+    signaler_changement_etat()
+    horaire = CLOCK.time() if horaire is None else horaire
+    if source == "timeout":
+        events.record(events.TIMEOUT, appareil, etat)
+    for listener in _state_listeners:
+        try:
+            listener(appareil, etat, precedent, source, horaire)
+        except Exception as exc:  # pragma: no cover - never break the MQTT loop
+            enregistrer_log(f"Erreur lors de l'enregistrement de l'état de {appareil}: {exc!r}")
+
+
+# Log file of the current thread when redirected by log_to (simulations).
+_log_sink: ContextVar[Optional[Path]] = ContextVar("radiateur_log_sink", default=None)
+
+
+@contextmanager
+def log_to(fichier: Path) -> Iterator[None]:
+    """Write the log entries of the current thread to ``fichier`` instead of app.log."""
+
+    token = _log_sink.set(fichier)
+    try:
+        yield
+    finally:
+        _log_sink.reset(token)
+
+
 def enregistrer_log(message: str, fichier: Path | None = None) -> None:
     """Persist an application log entry."""
 
-    log_file = fichier or APP_LOG_FILE
-    timestamp = datetime.now(TIMEZONE).strftime("%Y-%m-%d %H:%M:%S")
+    log_file = fichier or _log_sink.get() or APP_LOG_FILE
+    timestamp = CLOCK.now().strftime("%Y-%m-%d %H:%M:%S")
     log_file.parent.mkdir(parents=True, exist_ok=True)
     with open(log_file, "a", encoding="utf-8") as file:
         file.write(f"[{timestamp}] {message}\n")
 
 
 def envoyer_changement_etat_mqtt(
-    mode: str, mqtt_client, liste_radiateur: Iterable[str] | None = None
+    mode: str,
+    mqtt_client,
+    liste_radiateur: Iterable[str] | None = None,
+    command_id: str | None = None,
+    priority: int = PRIORITY_MANUAL,
+    config: ConfigSnapshot | None = None,
 ) -> Dict[str, str] | None:
     """Send the desired mode to the selected radiators via MQTT.
 
     The function honours the disabled configuration and forces the ECO mode
-    when a radiator has been deactivated from the options page.
+    when a radiator has been deactivated from the options page.  Broadcasts
+    (no explicit ``liste_radiateur``) skip radiators whose circuit is open.
+    ``command_id`` reuses an id already handed out (coalesced commands);
+    ``priority`` is the outbound queue class (planning transitions use
+    ``PRIORITY_SCHEDULE``).  ``config`` is the snapshot the caller already
+    holds, if any.
     """
 
-    liste_radiateur = list(liste_radiateur or get_all_radiator_names())
+    config = config or get_config()
+    if liste_radiateur is None:
+        liste_radiateur = radiateurs_disponibles(config.radiators)
+    liste_radiateur = list(liste_radiateur)
     if not liste_radiateur:
         return {}
 
@@ -136,208 +247,367 @@ def envoyer_changement_etat_mqtt(
         enregistrer_log("Aucun client MQTT disponible pour envoyer le changement d'état")
         return None
 
-    disabled_map = load_disabled_states()
-    applied_modes: Dict[str, str] = {}
+    applied_modes = {appareil: config.target_mode(appareil, mode) for appareil in liste_radiateur}
+    return envoyer_modes_mqtt(applied_modes, mqtt_client, command_id, priority, config=config)
 
-    _ensure_state_entries()
 
-    for appareil in liste_radiateur:
-        forced_mode = "ECO" if disabled_map.get(appareil) else mode
-        message = {
-            "FROM": "Django",
-            "TO": appareil,
-            "COMMAND": forced_mode,
-        }
-        mqtt_client.publish(str(message), MQTT_SETTINGS.topic)
-        applied_modes[appareil] = forced_mode
-        _liste_etat[appareil] = forced_mode
-        enregistrer_log(f"Modification état: {appareil} --> {forced_mode}")
-
-    return applied_modes
-
-
-WEEKDAYS = (
-    "monday",
-    "tuesday",
-    "wednesday",
-    "thursday",
-    "friday",
-    "saturday",
-    "sunday",
-)
+def envoyer_modes_mqtt(
+    modes: Dict[str, str],
+    mqtt_client,
+    command_id: str | None = None,
+    priority: int = PRIORITY_MANUAL,
+    encodees: Dict[str, Tuple[str, str]] | None = None,
+    libelle: str | None = None,
+    config: ConfigSnapshot | None = None,
+) -> Dict[str, str] | None:
+    """Publish ``modes`` (radiator -> mode) as a single command.
 
+    The disabled overrides must already be applied.  All radiators share one
+    command id, one delivery tracking entry and one log line.  Precompiled
+    callers (scenes) pass the encoded payloads (see :func:`encoder_commande`)
+    and the log line.
+    """
 
-def _sanitize_schedule(payload: object) -> Dict[str, List[Dict[str, str]]]:
-    """Return a predictable structure from the raw JSON payload."""
+    if not modes:
+        return {}
 
-    schedule: Dict[str, List[Dict[str, str]]] = {day: [] for day in WEEKDAYS}
-    if not isinstance(payload, dict):
-        return schedule
+    if not mqtt_client:
+        enregistrer_log("Aucun client MQTT disponible pour envoyer le changement d'état")
+        return None
 
-    for day, entries in payload.items():
-        if day not in schedule or not isinstance(entries, list):
-            continue
+    _ensure_state_entries(config)
+
+    with tracing.span("envoyer_changement_etat_mqtt", trace_id=command_id, radiateurs=len(modes)) as span:
+        # Track before publishing so a fast ACK cannot arrive unannounced.
+        TRACKER.track(span.trace_id, modes)
+        _noter_changement()
+        signaler_changement_etat()
+        for appareil, mode in modes.items():
+            encodee = encodees[appareil] if encodees is not None else None
+            _publier_commande(mqtt_client, appareil, mode, span.trace_id, priority, encodee)
+            events.record(events.COMMAND, appareil, mode, span.trace_id)
+            _COMMANDS_SENT.inc(mode=mode)
+        if libelle is None:
+            libelle = "Modification état: " + ", ".join(
+                f"{appareil} --> {mode}" for appareil, mode in modes.items()
+            )
+        enregistrer_log(libelle)
 
-        sanitized_entries: List[Dict[str, str]] = []
-        for entry in entries:
-            if not isinstance(entry, dict):
-                continue
-            start = entry.get("start")
-            end = entry.get("end")
-            if isinstance(start, str) and isinstance(end, str):
-                sanitized_entries.append({"start": start, "end": end})
+    return dict(modes)
 
-        schedule[day] = sanitized_entries
 
-    return schedule
+def radiateurs_disponibles(liste_radiateur: Iterable[str]) -> List[str]:
+    """Drop the radiators whose circuit breaker is open."""
 
+    liste_radiateur = list(liste_radiateur)
+    disponibles = HEALTH.filter_available(liste_radiateur)
+    ignores = [appareil for appareil in liste_radiateur if appareil not in disponibles]
+    if ignores:
+        enregistrer_log(f"Radiateurs hors ligne ignorés: {ignores}")
+    return disponibles
 
-def _parse_slot(time_str: str, reference: datetime) -> datetime | None:
-    """Convert an HH:MM (or 24:00) string to an aware datetime."""
 
-    if time_str == "24:00":
-        base = reference.replace(hour=0, minute=0, second=0, microsecond=0)
-        return base + timedelta(days=1)
+_CID_MARQUEUR = "@CID@"
 
-    try:
-        parsed = datetime.strptime(time_str, "%H:%M")
-    except ValueError:
-        return None
 
-    return reference.replace(
-        hour=parsed.hour,
-        minute=parsed.minute,
-        second=0,
-        microsecond=0,
-    )
+@lru_cache(maxsize=256)
+def encoder_commande(appareil: str, mode: str) -> Tuple[str, str]:
+    """Return the command payload split around its id: ``prefix + cid + suffix``."""
 
+    message = {
+        "FROM": "Django",
+        "TO": appareil,
+        "COMMAND": mode,
+        "CID": _CID_MARQUEUR,
+    }
+    prefix, suffix = str(message).split(_CID_MARQUEUR)
+    return prefix, suffix
 
-def maj_etat_selon_planning(mqtt_client) -> None:
-    """Update radiator states according to the planning definition."""
 
-    if not mqtt_client:
-        return
+def _publier_commande(
+    mqtt_client,
+    appareil: str,
+    mode: str,
+    command_id: str,
+    priority: int = PRIORITY_MANUAL,
+    encodee: Tuple[str, str] | None = None,
+) -> None:
+    """Publish one mode command at QoS 1 and wait for the device ACK."""
 
-    last_minute = datetime.now(TIMEZONE) - timedelta(minutes=1)
-    planning_path = Path(__file__).resolve().parent / "templates" / "data.json"
-    if not planning_path.exists():
-        enregistrer_log(f"Fichier de planning introuvable: {planning_path}")
+    prefix, suffix = encodee or encoder_commande(appareil, mode)
+    tracing.expect_reply(command_id, appareil, command=mode)
+    mqtt_client.publish(prefix + command_id + suffix, MQTT_SETTINGS.topic, qos=1, priority=priority, device=appareil)
+
+
+def get_sante_radiateurs() -> Dict[str, Dict[str, object]]:
+    """Return the circuit breaker state of every known radiator."""
+
+    return HEALTH.snapshot(get_all_radiator_names())
+
+
+def get_commandes_en_attente() -> Dict[str, str]:
+    """Return the modes sent to radiators that have not acknowledged them yet."""
+
+    return TRACKER.pending_modes()
+
+
+def boucle_relance_commandes(mqtt_client) -> None:
+    """Retransmit unacknowledged commands to the silent radiators only."""
+
+    if not mqtt_client:
         return
 
     while True:
-        heure_actuelle = datetime.now(TIMEZONE)
-        if heure_actuelle.minute != last_minute.minute:
-            try:
-                data = json.loads(planning_path.read_text(encoding="utf-8"))
-            except (OSError, json.JSONDecodeError):
-                data = {}
-
-            schedule = _sanitize_schedule(data)
-            weekday = WEEKDAYS[heure_actuelle.weekday()]
-            entries = schedule.get(weekday, [])
-
-            current_time = heure_actuelle.replace(second=0, microsecond=0)
-            for entry in entries:
-                start_time = _parse_slot(entry.get("start", ""), current_time)
-                end_time = _parse_slot(entry.get("end", ""), current_time)
-
-                if not start_time or not end_time:
-                    continue
+        TRACKER.wait_for_deadline()
+        retransmit, failed = TRACKER.collect_due()
+        for command_id, appareil, mode in retransmit:
+            enregistrer_log(f"Commande {command_id} renvoyée à {appareil}: {mode}")
+            _publier_commande(mqtt_client, appareil, mode, command_id, PRIORITY_SCHEDULE)
+            events.record(events.RETRANSMIT, appareil, mode, command_id)
+        for command_id, appareil in failed:
+            _set_etat(appareil, "ERROR", "timeout")
+            enregistrer_log(f"Commande {command_id} non acquittée par {appareil}")
+            _signaler_echec(appareil)
 
-                # Convert the parsed timestamps to the configured timezone
-                if start_time.tzinfo is None:
-                    start_time = TIMEZONE.localize(start_time)
-                if end_time.tzinfo is None:
-                    end_time = TIMEZONE.localize(end_time)
 
-                if end_time == current_time:
-                    enregistrer_log("Depuis planning --> ECO")
-                    envoyer_changement_etat_mqtt("ECO", mqtt_client)
-                elif start_time == current_time:
-                    enregistrer_log("Depuis planning --> COMFORT")
-                    envoyer_changement_etat_mqtt("COMFORT", mqtt_client)
+PROBE_INTERVAL = 5.0
 
-            last_minute = heure_actuelle
-            time.sleep(30)
 
-        time.sleep(10)
+def _signaler_echec(appareil: str) -> bool:
+    tripped = HEALTH.record_failure(appareil)
+    signaler_changement_etat()
+    if tripped:
+        enregistrer_log(f"{appareil} ne répond plus, radiateur mis hors ligne")
+        return True
+    return False
 
 
-def boucle_demander_etat_appareil(
-    mqtt_client,
-    nb_try: int = 1,
-    liste_radiateur: Iterable[str] | None = None,
-    delai: int = 15,
-) -> None:
-    """Continuously request device states at a fixed interval."""
+def _noter_changement() -> None:
+    global _dernier_changement
+    _dernier_changement = CLOCK.time()
+
+
+def get_dernier_changement() -> float:
+    """Return the timestamp of the last state change or command."""
+
+    return _dernier_changement
+
+
+def boucle_sonde_appareils(mqtt_client, intervalle: float = PROBE_INTERVAL) -> None:
+    """Send a single STATE probe to offline radiators once their cool-down elapsed.
+
+    The reply goes through :func:`traiter_message_recu`, which closes the
+    circuit; an unanswered probe re-opens it with a longer cool-down.
+    """
 
-    liste_radiateur = list(liste_radiateur or get_all_radiator_names())
     if not mqtt_client:
-        enregistrer_log("Aucun client MQTT disponible pour interroger les appareils")
         return
 
     while True:
-        demander_etat_au_appareil(mqtt_client, nb_try, liste_radiateur)
-        time.sleep(delai)
+        time.sleep(intervalle)
+        if not mqtt_client.is_connected():
+            continue
+        for appareil in HEALTH.devices_to_probe():
+            with tracing.span("sonde_appareil", appareil=appareil) as span:
+                _envoyer_requete_etat(mqtt_client, appareil, span.trace_id)
+
+
+def _parse_message(payload: str) -> Optional[Dict[str, object]]:
+    """Decode an MQTT payload (Python literal or JSON object) into a dict."""
+
+    try:
+        parsed = ast.literal_eval(payload)
+    except (ValueError, SyntaxError):
+        try:
+            parsed = json.loads(payload)
+        except json.JSONDecodeError:
+            return None
+
+    if not isinstance(parsed, dict):
+        return None
+    return parsed
+
+
+def traiter_message_recu(horaire: float, payload: str) -> None:
+    """Handle a message received on the MQTT topic (registered as listener)."""
+
+    parsed = _parse_message(payload)
+    if not parsed or parsed.get("TO") != "Django":
+        return
+
+    expediteur = parsed.get("FROM")
+    etat = parsed.get("COMMAND")
+    if not isinstance(expediteur, str) or not isinstance(etat, str):
+        return
+
+    if HEALTH.record_success(expediteur, horaire):
+        enregistrer_log(f"{expediteur} répond de nouveau, radiateur remis en ligne")
+
+    correlation_id = parsed.get("CID")
+    events.record(
+        events.ACK if parsed.get("TYPE") == "ACK" else events.REPORT,
+        expediteur,
+        etat,
+        correlation_id if isinstance(correlation_id, str) else None,
+    )
+    if isinstance(correlation_id, str) and correlation_id:
+        tracing.resolve_reply(correlation_id, expediteur, received_at=horaire, state=etat)
+
+    if _liste_etat.get(expediteur) != etat:
+        _noter_changement()
+
+    if parsed.get("TYPE") == "ACK" and isinstance(correlation_id, str):
+        if TRACKER.acknowledge(correlation_id, expediteur, etat) is not None:
+            _set_etat(expediteur, etat, "ack", horaire)
+            enregistrer_log(f"Commande {correlation_id} acquittée par {expediteur} : {etat}")
+        return
+
+    # Plain state reports also confirm a pending command with the same mode
+    # (firmware versions without ACK support).
+    TRACKER.confirm_state(expediteur, etat)
+    _set_etat(expediteur, etat, "report", horaire)
+    with _reponses_condition:
+        _dernieres_reponses[expediteur] = horaire
+        _reponses_condition.notify_all()
+    enregistrer_log(f"Reponse sur son état obtenu de {expediteur} : {etat}")
+
+
+def load_schedule() -> Dict[str, List[Dict[str, str]]]:
+    """Return the sanitized weekly planning (empty days when unreadable)."""
+
+    return get_config().schedule_dict()
+
+
+STATE_QUERY_MAX_ATTEMPTS = 3
 
 
 def demander_etat_au_appareil(mqtt_client, nb_try: int = 1, liste_radiateur: Iterable[str] | None = None):
-    """Request the state of each radiator and update the shared cache."""
+    """Request the state of each radiator and update the shared cache.
+
+    Each radiator gets its own deadline derived from its measured round-trip
+    time and is retried alone when silent, so the call returns as soon as
+    the slowest responsive radiator has answered.  ``nb_try`` is the attempt
+    number to start from (attempts beyond ``STATE_QUERY_MAX_ATTEMPTS`` mark
+    the radiators as ``ERROR``).  Radiators whose circuit is open are left
+    to the background probe and not queried.
+    """
 
-    if not mqtt_client:
+    if not mqtt_client or not mqtt_client.is_connected():
         enregistrer_log("Aucun client MQTT disponible pour demander l'état des appareils")
         return 0
 
-    liste_radiateur = list(liste_radiateur or get_all_radiator_names())
+    with _STATE_QUERY_DURATION.time():
+        return _demander_etat(mqtt_client, nb_try, liste_radiateur)
+
+
+def _envoyer_requete_etat(
+    mqtt_client, appareil: str, correlation_id: str, suivre: bool = True
+) -> float:
+    message = {
+        "FROM": "Django",
+        "TO": appareil,
+        "COMMAND": "STATE",
+        "CID": correlation_id,
+    }
+    envoye = time.time()
+    if suivre:
+        tracing.expect_reply(correlation_id, appareil, command="STATE")
+    mqtt_client.publish(str(message), MQTT_SETTINGS.topic, priority=PRIORITY_POLL, device=appareil)
+    events.record(events.STATE_QUERY, appareil, "STATE", correlation_id)
+    return envoye
+
+
+def envoyer_requete_etat(mqtt_client, appareil: str) -> float:
+    """Publish a STATE request without waiting; return the send timestamp.
+
+    Used by the background poller, whose requests are not traced.
+    """
+
+    return _envoyer_requete_etat(
+        mqtt_client, appareil, tracing.new_correlation_id(), suivre=False
+    )
+
+
+def verifier_reponse_etat(appareil: str, envoye: float) -> bool:
+    """Account for the reply (or the silence) to a request sent at ``envoye``."""
+
+    with _reponses_condition:
+        recu = _dernieres_reponses.get(appareil)
+
+    if recu is not None and recu >= envoye:
+        _DEVICE_REPLIES.inc(device=appareil)
+        _DEVICE_REPLY_LATENCY.observe(recu - envoye, device=appareil)
+        RTT.observe(appareil, recu - envoye)
+        return True
+
+    if _signaler_echec(appareil):
+        _set_etat(appareil, "ERROR", "timeout")
+        _DEVICE_TIMEOUTS.inc(device=appareil)
+    return False
+
+
+def _demander_etat(mqtt_client, nb_try: int, liste_radiateur: Iterable[str] | None) -> int:
+    liste_radiateur = radiateurs_disponibles(liste_radiateur or get_all_radiator_names())
+    if not liste_radiateur:
+        return 1
     enregistrer_log(
         f"Demande etat des appareils: {liste_radiateur} - Tentative : {nb_try}"
     )
 
-    if nb_try >= 4:
+    if nb_try > STATE_QUERY_MAX_ATTEMPTS:
         for radiateur in liste_radiateur:
-            _liste_etat[radiateur] = "ERROR"
+            _set_etat(radiateur, "ERROR", "timeout")
+            _DEVICE_TIMEOUTS.inc(device=radiateur)
+            _signaler_echec(radiateur)
         return 0
 
-    start_time = time.time()
-    reponse_obtenu = {appareil: False for appareil in liste_radiateur}
-
-    for appareil in liste_radiateur:
-        message = {
-            "FROM": "Django",
-            "TO": appareil,
-            "COMMAND": "STATE",
-        }
-        mqtt_client.publish(str(message), MQTT_SETTINGS.topic)
-
-    del message
-
-    old_nb_message = 0
-    run = True
-    while run:
-        message_recu = mqtt_client.get_message_recu()
-        new_nb_message = len(message_recu)
-        for i in range(old_nb_message, new_nb_message):
-            horaire, message = message_recu[i]
-            if horaire >= start_time:
-                parsed = ast.literal_eval(message)
-                expediteur = parsed["FROM"]
-                if parsed["TO"] == "Django" and expediteur in reponse_obtenu:
-                    reponse_obtenu[expediteur] = True
-                    _liste_etat[expediteur] = parsed["COMMAND"]
-                    enregistrer_log(
-                        f"Reponse sur son état obtenu de {expediteur} : {parsed['COMMAND']}"
-                    )
-
-        if all(reponse_obtenu.values()):
-            return 1
-
-        if time.time() - start_time > 2:
-            liste_radiateur_sans_retour = [cle for cle, value in reponse_obtenu.items() if not value]
-            return demander_etat_au_appareil(
-                mqtt_client, nb_try + 1, liste_radiateur_sans_retour
-            )
-
-        old_nb_message = new_nb_message
-        time.sleep(0.01)
+    # appareil -> [tentative, premier envoi, dernier envoi, échéance]
+    en_attente: Dict[str, List[float]] = {}
+    sans_reponse: List[str] = []
+
+    with tracing.span("demander_etat_au_appareil", appareils=len(liste_radiateur)) as span:
+        for appareil in liste_radiateur:
+            envoye = _envoyer_requete_etat(mqtt_client, appareil, span.trace_id)
+            en_attente[appareil] = [nb_try, envoye, envoye, envoye + RTT.rto(appareil)]
+
+        while en_attente:
+            expires: List[str] = []
+            with _reponses_condition:
+                maintenant = time.time()
+                for appareil, (tentative, premier, dernier, echeance) in list(en_attente.items()):
+                    recu = _dernieres_reponses.get(appareil)
+                    if recu is not None and recu >= premier:
+                        del en_attente[appareil]
+                        _DEVICE_REPLIES.inc(device=appareil)
+                        _DEVICE_REPLY_LATENCY.observe(recu - dernier, device=appareil)
+                        # Karn: a reply to a retransmitted request is ambiguous.
+                        if tentative == nb_try:
+                            RTT.observe(appareil, recu - premier)
+                    elif echeance <= maintenant:
+                        expires.append(appareil)
+
+                if en_attente and not expires:
+                    prochaine = min(entry[3] for entry in en_attente.values())
+                    _reponses_condition.wait(max(0.0, prochaine - maintenant))
+                    continue
 
-    return 0
+            for appareil in expires:
+                entry = en_attente[appareil]
+                RTT.backoff(appareil)
+                if entry[0] >= STATE_QUERY_MAX_ATTEMPTS:
+                    del en_attente[appareil]
+                    sans_reponse.append(appareil)
+                    continue
+                _STATE_QUERY_RETRIES.inc()
+                entry[0] += 1
+                entry[2] = _envoyer_requete_etat(mqtt_client, appareil, span.trace_id)
+                entry[3] = entry[2] + RTT.rto(appareil)
+                enregistrer_log(f"Nouvelle demande d'état pour {appareil} - Tentative : {int(entry[0])}")
+
+    for appareil in sans_reponse:
+        _set_etat(appareil, "ERROR", "timeout")
+        _DEVICE_TIMEOUTS.inc(device=appareil)
+        enregistrer_log(f"Pas de réponse de {appareil} malgré {STATE_QUERY_MAX_ATTEMPTS} tentatives")
+        _signaler_echec(appareil)
+
+    return 0 if sans_reponse else 1
@@ -0,0 +1,179 @@
+"""Fast-forward harness for the planning scheduler.
+
+:func:`simulate_planning` runs the real :class:`~radiateur.planning.PlanningScheduler`
+on a :class:`~radiateur.clock.SimulatedClock` against the in-memory radiators
+of the simulator, so a week of transitions (DST changes included) is checked
+in seconds.  The radiator changes are compared with the planning sampled
+minute by minute to report missed, unexpected and duplicated transitions,
+along with the CPU time spent in the scheduler.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from . import planning, services
+from .clock import SimulatedClock, use_clock
+from .config import TIMEZONE
+from .fleet import RadiatorFleet
+
+# A planned change must reach the radiator within this delay.
+TOLERANCE = 120.0
+
+
+class LoopbackClient:
+    """MQTT client stand-in delivering every message to the fleet synchronously."""
+
+    def __init__(self, fleet: RadiatorFleet, clock: SimulatedClock) -> None:
+        self.fleet = fleet
+        self.clock = clock
+        self.published = 0
+
+    def is_connected(self) -> bool:
+        return True
+
+    def publish(self, message: str, topic: str, qos: int = 0, **options) -> None:
+        self.published += 1
+        for reply in self.fleet.handle(message):
+            services.traiter_message_recu(self.clock.time(), str(reply))
+
+
+def expected_changes(
+    compiled: planning.CompiledPlanning,
+    devices: Sequence[str],
+    start: float,
+    end: float,
+    disabled: Dict[str, bool],
+) -> Dict[str, List[Tuple[float, str]]]:
+    """Sample the planning every real minute and list the mode changes.
+
+    The hour repeated when DST ends is not replayed, as by the scheduler.
+    """
+
+    changes: Dict[str, List[Tuple[float, str]]] = {}
+    by_timeline: Dict[object, List[Tuple[float, str]]] = {}
+    for device in devices:
+        timeline = None if disabled.get(device) else compiled.timeline_for(device)
+        key = timeline.transitions if timeline is not None else None
+        if key not in by_timeline:
+            found: List[Tuple[float, str]] = []
+            if timeline is not None:
+                moment = start - start % 60
+                current = timeline.mode_at(planning.week_minute(datetime.fromtimestamp(start, TIMEZONE)))
+                latest_wall = None
+                while moment <= end:
+                    local = datetime.fromtimestamp(moment, TIMEZONE)
+                    wall = planning.wall_minutes(local)
+                    if latest_wall is None or wall > latest_wall:
+                        latest_wall = wall
+                        mode = timeline.mode_at(planning.week_minute(local))
+                        if mode != current:
+                            found.append((moment, mode))
+                            current = mode
+                    moment += 60
+            by_timeline[key] = found
+        changes[device] = by_timeline[key]
+    return changes
+
+
+def simulate_planning(
+    start: datetime,
+    days: float = 7,
+    devices: Optional[Sequence[str]] = None,
+    log_file: Optional[Path] = None,
+) -> Dict[str, object]:
+    """Run the scheduler from ``start`` for ``days`` simulated days and report."""
+
+    devices = list(devices if devices is not None else services.get_all_radiator_names())
+    begin = start.timestamp()
+    end = TIMEZONE.localize(start.replace(tzinfo=None) + timedelta(days=days)).timestamp()
+    clock = SimulatedClock(begin)
+    previous_states = services.get_liste_etat()
+    try:
+        # Simulated days must not end up in app.log.
+        with use_clock(clock), services.log_to(log_file or Path(os.devnull)):
+            compiled = planning.compile_planning(services.load_schedule(), planning.load_zones(), devices)
+            disabled = planning.load_disabled_states()
+            fleet = RadiatorFleet(devices, clock=clock.time)
+            initial = {
+                device: "ECO" if disabled.get(device)
+                else compiled.timeline_for(device).mode_at(planning.week_minute(start))
+                for device in devices
+            }
+            for device, mode in initial.items():
+                fleet.apply(device, mode)
+            fleet.changes.clear()
+            services.set_liste_etat(dict(initial))
+
+            client = LoopbackClient(fleet, clock)
+            scheduler = planning.PlanningScheduler(client, clock, source=lambda: compiled)
+            cpu = 0.0
+            wakeups = 0
+            started = time.perf_counter()
+            while True:
+                before = time.process_time()
+                delay = scheduler.step()
+                cpu += time.process_time() - before
+                wakeups += 1
+                remaining = end - clock.time()
+                if remaining <= 0:
+                    break
+                clock.advance(min(delay, remaining))
+            elapsed = time.perf_counter() - started
+    finally:
+        services.set_liste_etat(previous_states)
+
+    expected = expected_changes(compiled, devices, begin, end, disabled)
+    observed: Dict[str, List[Tuple[float, str]]] = {device: [] for device in devices}
+    for moment, device, _previous, mode in fleet.changes:
+        observed.setdefault(device, []).append((moment, mode))
+
+    missed: List[Dict[str, object]] = []
+    unexpected: List[Dict[str, object]] = []
+    delays: List[float] = []
+    for device in devices:
+        remaining_changes = list(observed.get(device, []))
+        for moment, mode in expected.get(device, []):
+            match = next(
+                (
+                    change for change in remaining_changes
+                    if change[1] == mode and moment <= change[0] <= moment + TOLERANCE
+                ),
+                None,
+            )
+            if match is None:
+                missed.append({"device": device, "at": _format(moment), "mode": mode})
+            else:
+                remaining_changes.remove(match)
+                delays.append(match[0] - moment)
+        unexpected.extend(
+            {"device": device, "at": _format(moment), "mode": mode} for moment, mode in remaining_changes
+        )
+
+    return {
+        "start": _format(begin),
+        "end": _format(end),
+        "devices": len(devices),
+        "timelines": len(compiled.timelines),
+        "expected": sum(len(changes) for changes in expected.values()),
+        "applied": len(fleet.changes),
+        "commands": client.published,
+        "missed": missed,
+        "unexpected": unexpected,
+        "duplicated": [
+            {"device": device, "at": _format(moment), "mode": mode}
+            for moment, device, mode in fleet.redundant_commands
+        ],
+        "max_delay_seconds": max(delays, default=0.0),
+        "wakeups": wakeups,
+        "cpu_seconds": round(cpu, 4),
+        "wall_seconds": round(elapsed, 4),
+    }
+
+
+def _format(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, TIMEZONE).strftime("%Y-%m-%d %H:%M:%S %Z")
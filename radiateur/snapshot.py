@@ -0,0 +1,137 @@
+"""On-disk snapshot of the radiator state cache for warm restarts.
+
+Every mode change is appended as one JSON line to a journal; the journal is
+periodically folded into a compact JSON snapshot written atomically.  All
+the server processes share both files: appends and compactions hold a file
+lock, and a compaction folds the journal as found on disk.  At startup :meth:`StateSnapshot.load` reads the snapshot and replays the
+journal, so the dashboard shows the last known modes immediately while the
+background poller revalidates them.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from .locking import locked, replace_text
+
+SNAPSHOT_FILE = "etat.json"
+JOURNAL_FILE = "etat.journal"
+LOCK_FILE = "etat.lock"
+COMPACT_EVERY = 500
+COMPACT_INTERVAL = 300.0
+
+# Sources for which the radiator itself was heard from.
+DEVICE_SOURCES = {"report", "ack"}
+
+
+class StateSnapshot:
+    """Journaled snapshot of ``device -> {mode, last_seen, source}``."""
+
+    def __init__(
+        self,
+        directory: Path,
+        *,
+        compact_every: int = COMPACT_EVERY,
+        compact_interval: float = COMPACT_INTERVAL,
+    ) -> None:
+        self.directory = Path(directory)
+        self.snapshot_path = self.directory / SNAPSHOT_FILE
+        self.journal_path = self.directory / JOURNAL_FILE
+        self.lock_path = self.directory / LOCK_FILE
+        self.compact_every = compact_every
+        self.compact_interval = compact_interval
+        self._entries: Dict[str, Dict[str, object]] = {}
+        self._journal_lines = 0
+        self._last_compaction = time.monotonic()
+        self._lock = Lock()
+
+    def load(self) -> Dict[str, Dict[str, object]]:
+        """Read the snapshot then replay the journal; return the entries."""
+
+        entries, lines = self._read()
+        with self._lock:
+            self._entries = entries
+            self._journal_lines = lines
+        return {device: dict(entry) for device, entry in entries.items()}
+
+    def _read(self) -> Tuple[Dict[str, Dict[str, object]], int]:
+        entries: Dict[str, Dict[str, object]] = {}
+        try:
+            raw = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            raw = {}
+        if isinstance(raw, dict):
+            entries.update(
+                (device, entry) for device, entry in raw.items() if isinstance(entry, dict)
+            )
+
+        lines = 0
+        try:
+            with open(self.journal_path, encoding="utf-8") as journal:
+                for line in journal:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash may leave a truncated last line.
+                        continue
+                    device = record.pop("device", None)
+                    if isinstance(device, str):
+                        entries[device] = record
+                        lines += 1
+        except OSError:
+            pass
+        return entries, lines
+
+    def record(
+        self, device: str, mode: str, previous: Optional[str], source: str, at: float
+    ) -> None:
+        """State listener: journal mode changes, compact when due."""
+
+        with self._lock:
+            last_seen = self._entries.get(device, {}).get("last_seen")
+            entry = {
+                "mode": mode,
+                "last_seen": at if source in DEVICE_SOURCES else last_seen,
+                "source": source,
+            }
+            self._entries[device] = entry
+            if mode != previous:
+                self._append({"device": device, **entry})
+            if (
+                self._journal_lines >= self.compact_every
+                or time.monotonic() - self._last_compaction >= self.compact_interval
+            ):
+                self._compact()
+
+    def _append(self, record: Dict[str, object]) -> None:
+        with locked(self.lock_path):
+            with open(self.journal_path, "a", encoding="utf-8") as journal:
+                journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._journal_lines += 1
+
+    def _compact(self) -> None:
+        with locked(self.lock_path):
+            # The journal holds the changes of every process: fold it as
+            # found on disk, keeping the entries refreshed here without a
+            # mode change (not journaled).
+            entries, _lines = self._read()
+            for device, entry in self._entries.items():
+                stored = entries.setdefault(device, entry)
+                seen, stored_seen = entry.get("last_seen") or 0, stored.get("last_seen") or 0
+                if stored.get("mode") == entry["mode"] and seen > stored_seen:  # type: ignore[operator]
+                    entries[device] = entry
+            replace_text(self.snapshot_path, json.dumps(entries, ensure_ascii=False))
+            # Replaying the journal over the new snapshot is idempotent, so a
+            # crash between the two steps loses nothing.
+            open(self.journal_path, "w", encoding="utf-8").close()
+        self._entries = entries
+        self._journal_lines = 0
+        self._last_compaction = time.monotonic()
+
+    def compact(self) -> None:
+        with self._lock:
+            self._compact()
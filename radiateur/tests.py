@@ -1,8 +1,81 @@
+import dataclasses
+import gzip
+import json
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import MappingProxyType
+from unittest import mock, skipUnless
+
+import paho.mqtt.client as mqtt
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
 
+from radiateur import (
+    analytics,
+    coalescer,
+    configstore,
+    events,
+    planning,
+    runtime,
+    scenes,
+    services,
+    simulation,
+    timers,
+    tracing,
+    views,
+)
+from radiateur.clock import SimulatedClock, use_clock
+from radiateur.config import TIMEZONE
+from radiateur.delivery import DeliveryTracker
+from radiateur.health import CLOSED, HALF_OPEN, OPEN, HealthMonitor
+from radiateur.history import HistoryStore
+from radiateur.locking import replace_text
+from radiateur.logviewer import LogFile, parse_timestamp
+from radiateur.metrics import MetricsRegistry
+from radiateur.middleware import (
+    SESSION_REFRESHED_KEY,
+    LoginRequiredMiddleware,
+    SessionRefreshMiddleware,
+    compile_exemptions,
+)
+from radiateur.mqtt_client import PRIORITY_POLL, MQTTClient
+from radiateur.poller import StatePoller
+from radiateur.rtt import RTT, RttEstimator
+from radiateur.snapshot import StateSnapshot
+from radiateur.timers import TimerWheel
+
+
+class FakeMQTTClient:
+    """Collect published payloads instead of talking to a broker.
+
+    Radiators listed in ``responders`` answer STATE requests immediately.
+    """
+
+    def __init__(self, responders: dict[str, str] | None = None) -> None:
+        self.published: list[dict] = []
+        self.responders = responders or {}
+
+    def is_connected(self) -> bool:
+        return True
+
+    def publish(self, message: str, topic: str, qos: int = 0, **options) -> None:
+        parsed = services._parse_message(message)
+        self.published.append(parsed)
+        if parsed["COMMAND"] == "STATE" and parsed["TO"] in self.responders:
+            reply = {
+                "FROM": parsed["TO"],
+                "TO": "Django",
+                "COMMAND": self.responders[parsed["TO"]],
+                "CID": parsed["CID"],
+            }
+            services.traiter_message_recu(time.time(), str(reply))
+
 
 class AuthenticationTests(TestCase):
     """Verify that the dashboard requires a valid authenticated session."""
@@ -55,3 +128,944 @@ class AuthenticationTests(TestCase):
             settings.SESSION_COOKIE_AGE,
             delta=5,
         )
+
+    def test_exempt_paths_skip_the_session_and_user(self) -> None:
+        """Static files and public URLs are matched once, before the user is loaded."""
+
+        matcher = compile_exemptions(("/admin/*", "/metrics"), ("/static/", ""))
+        self.assertTrue(matcher("/static/js/app.js"))
+        self.assertTrue(matcher("/admin/login/"))
+        self.assertTrue(matcher("/metrics"))
+        self.assertFalse(matcher("/metrics/extra"))
+        self.assertFalse(matcher("/options/"))
+        self.assertFalse(matcher(""))
+
+        class Untouchable:
+            path_info = "/service-worker.js"
+
+            @property
+            def user(self):
+                raise AssertionError("the user must not be loaded")
+
+        middleware = LoginRequiredMiddleware(lambda request: HttpResponse("ok"))
+        self.assertEqual(middleware(Untouchable()).status_code, 200)
+        self.assertEqual(SessionRefreshMiddleware(middleware)(Untouchable()).status_code, 200)
+
+    def test_session_is_only_rewritten_when_its_refresh_is_due(self) -> None:
+        """Polling does not resave the session until the refresh interval has elapsed."""
+
+        self.client.post(reverse("login"), {"username": self.user.username, "password": self.password})
+        response = self.client.get(reverse("retourner_etat"))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+        refreshed_at = self.client.session[SESSION_REFRESHED_KEY]
+        with mock.patch("radiateur.middleware.time.time", return_value=refreshed_at + settings.SESSION_REFRESH_INTERVAL):
+            response = self.client.get(reverse("retourner_etat"))
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertEqual(
+            self.client.session[SESSION_REFRESHED_KEY], refreshed_at + settings.SESSION_REFRESH_INTERVAL
+        )
+
+
+class MetricsTests(TestCase):
+    """Check the metrics registry rendering and the /metrics endpoint."""
+
+    def test_histogram_renders_cumulative_buckets(self) -> None:
+        registry = MetricsRegistry()
+        histogram = registry.histogram("demo_seconds", "Demo.", ("device",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, device="salon")
+        histogram.observe(0.5, device="salon")
+        histogram.observe(3, device="salon")
+
+        rendered = registry.render()
+        self.assertIn('demo_seconds_bucket{device="salon",le="0.1"} 1', rendered)
+        self.assertIn('demo_seconds_bucket{device="salon",le="1"} 2', rendered)
+        self.assertIn('demo_seconds_bucket{device="salon",le="+Inf"} 3', rendered)
+        self.assertIn('demo_seconds_count{device="salon"} 3', rendered)
+
+    def test_metrics_endpoint_requires_session_or_token(self) -> None:
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+
+        with override_settings(METRICS_TOKEN="secret"):
+            response = self.client.get(
+                reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("# TYPE radiateur_http_request_duration_seconds histogram", response.content.decode())
+
+
+class TracingTests(TestCase):
+    """Correlation ids must link a command with the radiator reply."""
+
+    def setUp(self) -> None:
+        tracing.clear()
+
+    def test_reply_with_echoed_correlation_id_closes_device_span(self) -> None:
+        client = FakeMQTTClient()
+        services.envoyer_changement_etat_mqtt("COMFORT", client, ["salon"])
+
+        correlation_id = client.published[0]["CID"]
+        reply = {"FROM": "salon", "TO": "Django", "COMMAND": "COMFORT", "CID": correlation_id}
+        services.traiter_message_recu(time.time(), str(reply))
+
+        trace = tracing.export_traces()[0]
+        self.assertEqual(trace["trace_id"], correlation_id)
+        self.assertFalse(trace["pending"])
+        names = [span["name"] for span in trace["spans"]]
+        self.assertIn("device.reply", names)
+
+
+class RuntimeStartupTests(SimpleTestCase):
+    """Only request-serving processes should start the MQTT runtime."""
+
+    def test_management_commands_skip_runtime(self) -> None:
+        for command in ("migrate", "test", "createsuperuser", "shell"):
+            with self.subTest(command=command):
+                self.assertFalse(runtime.should_start_runtime(["manage.py", command], {}))
+
+    def test_unknown_entry_points_need_an_explicit_opt_in(self) -> None:
+        django_main = "/usr/lib/python3/site-packages/django/__main__.py"
+        for argv in (
+            [django_main, "migrate"],
+            ["/srv/.venv/bin/pytest"],
+            ["/usr/local/bin/radiateur-admin", "runserver"],
+            [],
+        ):
+            with self.subTest(argv=argv):
+                self.assertFalse(runtime.should_start_runtime(argv, {}))
+        self.assertTrue(runtime.should_start_runtime(["/usr/sbin/apache2"], {"RADIATEUR_START_RUNTIME": "1"}))
+        self.assertTrue(runtime.should_start_runtime([django_main, "runserver", "--noreload"], {}))
+
+    def test_runserver_starts_runtime_in_reloader_child_only(self) -> None:
+        argv = ["manage.py", "runserver"]
+        self.assertFalse(runtime.should_start_runtime(argv, {}))
+        self.assertTrue(runtime.should_start_runtime(argv, {"RUN_MAIN": "true"}))
+        self.assertTrue(runtime.should_start_runtime(argv + ["--noreload"], {}))
+
+    def test_wsgi_server_starts_runtime_unless_disabled(self) -> None:
+        self.assertTrue(runtime.should_start_runtime(["gunicorn"], {}))
+        self.assertTrue(runtime.should_start_runtime(["/srv/.venv/lib/gunicorn/__main__.py", "app.wsgi"], {}))
+        with override_settings(RADIATEUR_RUNTIME_MODE="off"):
+            self.assertFalse(runtime.should_start_runtime(["gunicorn"], {}))
+
+
+class MQTTConnectionManagerTests(SimpleTestCase):
+    """Commands published while offline are queued and replayed."""
+
+    def setUp(self) -> None:
+        # Nothing listens on port 9: the client stays disconnected.
+        self.client = MQTTClient("127.0.0.1", 9, queue_size=2, queue_ttl=60)
+        self.addCleanup(self.client.unsubscribe)
+
+    def test_offline_messages_are_flushed_on_reconnect(self) -> None:
+        self.client.subscribe("test")
+        for index in range(3):
+            self.client.publish(f"message {index}", "test")
+        self.assertEqual(self.client.health()["queued_messages"], 2)
+
+        with mock.patch.object(self.client.client, "publish") as publish, \
+                mock.patch.object(self.client.client, "subscribe") as subscribe:
+            self.client.on_connect(self.client.client, None, {}, 0)
+
+        subscribe.assert_called_once_with("test", qos=1)
+        self.assertEqual(
+            [call.args for call in publish.call_args_list],
+            [("test", "message 1"), ("test", "message 2")],
+        )
+        self.assertTrue(self.client.health()["connected"])
+        self.assertEqual(self.client.health()["queued_messages"], 0)
+
+    def test_only_qos0_publishes_refused_by_paho_are_requeued(self) -> None:
+        self.client._connected = True
+        refused = mock.Mock(rc=mqtt.MQTT_ERR_NO_CONN)
+        with mock.patch.object(self.client.client, "publish", return_value=refused):
+            self.client.publish("qos 0", "test")
+            self.client.publish("qos 1", "test", qos=1)
+        self.assertEqual([entry[2] for entry in self.client._offline_queue], ["qos 0"])
+
+    def test_expired_messages_are_dropped(self) -> None:
+        self.client._queue_ttl = 0
+        self.client.publish("trop tard", "test")
+        with mock.patch.object(self.client.client, "publish") as publish:
+            self.client.on_connect(self.client.client, None, {}, 0)
+        publish.assert_not_called()
+
+
+class OutboundQueueTests(SimpleTestCase):
+    """Publishes are paced per radiator and globally, manual commands first."""
+
+    def test_background_traffic_keeps_a_reserve_for_manual_commands(self) -> None:
+        client = MQTTClient(
+            "127.0.0.1", 9, publish_rate=0.001, publish_burst=4, device_rate=0.001, device_burst=1
+        )
+        self.addCleanup(client.unsubscribe)
+        client._connected = True
+        with mock.patch.object(client.client, "publish", return_value=mock.Mock(rc=0)) as publish:
+            client.publish("p-salon", "test", priority=PRIORITY_POLL, device="salon")
+            client.publish("p-salon-2", "test", priority=PRIORITY_POLL, device="salon")
+            client.publish("p-cuisine", "test", priority=PRIORITY_POLL, device="cuisine")
+            client.publish("p-bureau", "test", priority=PRIORITY_POLL, device="bureau")
+            client.publish("m-bureau", "test", device="bureau")
+            client.publish("m-salon", "test", device="salon")
+
+        self.assertEqual([call.args[1] for call in publish.call_args_list], ["p-salon", "p-cuisine", "m-bureau"])
+        self.assertEqual(client.health()["outbound_messages"], {"manual": 1, "schedule": 0, "poll": 2})
+
+    def test_small_global_burst_still_lets_background_traffic_through(self) -> None:
+        client = MQTTClient("127.0.0.1", 9, publish_rate=0.001, publish_burst=2)
+        self.addCleanup(client.unsubscribe)
+        client._connected = True
+        with mock.patch.object(client.client, "publish", return_value=mock.Mock(rc=0)) as publish:
+            client.publish("p-salon", "test", priority=PRIORITY_POLL, device="salon")
+
+        self.assertEqual([call.args[1] for call in publish.call_args_list], ["p-salon"])
+
+
+class DeliveryTrackerTests(SimpleTestCase):
+    """Only radiators that did not acknowledge a command are retried."""
+
+    def test_selective_retransmit_then_failure(self) -> None:
+        tracker = DeliveryTracker(ack_timeout=1.0, max_attempts=2)
+        tracker.track("cid1", {"salon": "ECO", "cuisine": "ECO"}, now=0.0)
+        tracker.acknowledge("cid1", "salon", "ECO")
+
+        retransmit, failed = tracker.collect_due(now=1.5)
+        self.assertEqual(retransmit, [("cid1", "cuisine", "ECO")])
+        self.assertEqual(failed, [])
+
+        retransmit, failed = tracker.collect_due(now=10.0)
+        self.assertEqual(retransmit, [])
+        self.assertEqual(failed, [("cid1", "cuisine")])
+        status = tracker.status("cid1")
+        self.assertTrue(status["complete"])
+        self.assertEqual(status["acknowledged"], {"salon": "ECO"})
+        self.assertEqual(status["failed"], ["cuisine"])
+
+    def test_state_report_confirms_matching_pending_command(self) -> None:
+        tracker = DeliveryTracker()
+        tracker.track("cid1", {"salon": "COMFORT"})
+        self.assertEqual(tracker.confirm_state("salon", "ECO"), [])
+        self.assertEqual(tracker.confirm_state("salon", "COMFORT"), ["cid1"])
+        self.assertEqual(tracker.pending_modes(), {})
+
+    def test_ack_message_updates_confirmed_state(self) -> None:
+        client = FakeMQTTClient()
+        services.envoyer_changement_etat_mqtt("HORSGEL", client, ["bureau"])
+        command_id = client.published[0]["CID"]
+        self.assertEqual(services.get_commandes_en_attente().get("bureau"), "HORSGEL")
+
+        ack = {"FROM": "bureau", "TO": "Django", "COMMAND": "HORSGEL", "CID": command_id, "TYPE": "ACK"}
+        services.traiter_message_recu(time.time(), str(ack))
+
+        self.assertNotIn("bureau", services.get_commandes_en_attente())
+        self.assertEqual(services.get_liste_etat()["bureau"], "HORSGEL")
+
+
+def make_config(radiators, disabled=None, version=1) -> configstore.ConfigSnapshot:
+    disabled = disabled or {}
+    return configstore.ConfigSnapshot(
+        version=version,
+        radiators=tuple(radiators),
+        devices=(),
+        disabled=MappingProxyType({radiator: bool(disabled.get(radiator)) for radiator in radiators}),
+        schedule=MappingProxyType({}),
+    )
+
+
+class ConfigSnapshotTests(SimpleTestCase):
+    """The configuration is read once and replaced by a new version on every write."""
+
+    def test_snapshot_is_shared_until_a_file_changes(self) -> None:
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(
+            configstore, "OPTIONS_FILE_PATH", Path(directory) / "options.json"
+        ), mock.patch.object(configstore, "PLANNING_FILE_PATH", Path(directory) / "data.json"), mock.patch.object(
+            configstore, "DEVICES_FILE_PATH", Path(directory) / "devices.json"
+        ), mock.patch.object(configstore, "load_devices", return_value=[]), mock.patch.object(
+            configstore, "MQTT_SETTINGS", dataclasses.replace(configstore.MQTT_SETTINGS, devices=["salon", "cuisine"])
+        ):
+            first = configstore.refresh()
+            self.assertIs(configstore.get_config(), first)
+            self.assertEqual(first.disabled_map(), {"salon": False, "cuisine": False})
+            self.assertEqual(first.schedule_dict()["monday"], [])
+
+            second = configstore.save_disabled({"cuisine": True, "cave": True})
+            self.assertEqual(second.version, first.version + 1)
+            self.assertIs(configstore.get_config(), second)
+            self.assertEqual(second.target_mode("cuisine", "COMFORT"), "ECO")
+            self.assertEqual(first.target_mode("cuisine", "COMFORT"), "COMFORT")
+            with self.assertRaises(TypeError):
+                second.disabled["salon"] = True  # type: ignore[index]
+        configstore.refresh()
+
+
+class CommandCoalescerTests(SimpleTestCase):
+    """Rapid manual changes publish the last mode only, and nothing when already applied."""
+
+    def test_bursts_are_merged_and_noops_skipped(self) -> None:
+        client = FakeMQTTClient()
+        merger = coalescer.CommandCoalescer(window=60.0)
+        with mock.patch.object(services, "_liste_etat", {"salon": "ECO", "cuisine": "ECO"}), mock.patch.object(
+            coalescer, "get_config", return_value=make_config(["salon", "cuisine"])
+        ), mock.patch.object(coalescer, "COALESCER", merger):
+            first = merger.submit("COMFORT", client, ["salon", "cuisine"])[1]
+            merger.submit("OFF", client, ["salon", "cuisine"])
+            applied, last = merger.submit("ECO", client, ["salon"])
+            self.assertEqual(applied, {"salon": "ECO"})
+            self.assertEqual(client.published, [])
+            self.assertTrue(coalescer.command_status(first)["complete"])
+            self.assertEqual(coalescer.command_status(last)["pending"], {"salon": "ECO"})
+
+            merger.flush()
+
+            self.assertEqual([(m["TO"], m["COMMAND"]) for m in client.published], [("cuisine", "OFF")])
+            self.assertEqual(coalescer.command_status(last)["acknowledged"], {"salon": "ECO"})
+            self.assertEqual(services.get_commandes_en_attente().get("cuisine"), "OFF")
+
+
+class BatchCommandTests(TestCase):
+    """A radiator -> mode map is validated as a whole and sent as one command."""
+
+    def setUp(self) -> None:
+        user = get_user_model().objects.create_user(username="radiateur", password="super-secret")
+        self.client.force_login(user)
+        self.mqtt = FakeMQTTClient()
+        for target, value in (
+            ("get_mqtt_client", lambda: self.mqtt),
+            ("get_config", lambda: make_config(["salon", "cuisine", "garage"], {"garage": True})),
+        ):
+            patcher = mock.patch(f"radiateur.views.{target}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(services, "_liste_etat", {"salon": "ECO", "cuisine": "ECO", "garage": "ECO"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, payload):
+        return self.client.post(reverse("changement_etat_lot"), json.dumps(payload), content_type="application/json")
+
+    def test_invalid_entry_rejects_the_whole_batch(self) -> None:
+        response = self.post({"modes": {"salon": "COMFORT", "cave": "ECO", "cuisine": "TURBO"}})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()["errors"]), {"cave", "cuisine"})
+        self.assertEqual(self.mqtt.published, [])
+
+    def test_batch_is_sent_as_one_command_with_per_device_results(self) -> None:
+        response = self.post({"modes": {"salon": "COMFORT", "cuisine": "ECO", "garage": "HORSGEL"}})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["results"], {
+            "salon": {"mode": "COMFORT", "status": "sent"},
+            "cuisine": {"mode": "ECO", "status": "unchanged"},
+            "garage": {"mode": "ECO", "status": "unchanged"},
+        })
+        self.assertEqual([(m["TO"], m["COMMAND"], m["CID"]) for m in self.mqtt.published],
+                         [("salon", "COMFORT", data["command_id"])])
+
+
+class ConditionalStateTests(TestCase):
+    """Unchanged state and pages cost a 304; long polls return once the state moves."""
+
+    def setUp(self) -> None:
+        user = get_user_model().objects.create_user(username="radiateur", password="super-secret")
+        self.client.force_login(user)
+        patcher = mock.patch.object(services, "_liste_etat", {"salon": "ECO"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unchanged_state_and_pages_are_not_resent(self) -> None:
+        for url in (reverse("retourner_etat"), reverse("planning"), reverse("options")):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                etag = response["ETag"]
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        etag = self.client.get(reverse("retourner_etat"))["ETag"]
+        for _ in range(3):
+            services.HEALTH.record_failure("salon")
+        self.addCleanup(services.HEALTH.forget, "salon")
+        self.assertEqual(self.client.get(reverse("retourner_etat"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(reverse("retourner_etat"))["ETag"]
+        services._set_etat("salon", "COMFORT", "report")
+        response = self.client.get(reverse("retourner_etat"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["states"]["salon"], "COMFORT")
+
+    def test_long_poll_waits_for_a_change(self) -> None:
+        etag = self.client.get(reverse("retourner_etat"))["ETag"]
+        url = reverse("retourner_etat") + "?wait=0.2"
+
+        started = time.monotonic()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+        # Every slot taken: answered at once instead of holding a worker.
+        busy = threading.BoundedSemaphore(1)
+        busy.acquire()
+        with mock.patch.object(views, "_LONG_POLL_SLOTS", busy):
+            started = time.monotonic()
+            response = self.client.get(reverse("retourner_etat") + "?wait=5", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+        timer = threading.Timer(0.05, services._set_etat, ("salon", "OFF", "report"))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        response = self.client.get(reverse("retourner_etat") + "?wait=5", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["states"]["salon"], "OFF")
+
+
+class SceneTests(SimpleTestCase):
+    """Scenes compile once to encoded payloads and publish them as one command."""
+
+    def test_activation_publishes_precompiled_payloads(self) -> None:
+        client = FakeMQTTClient()
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(
+            scenes, "SCENES_FILE_PATH", Path(directory) / "scenes.json"
+        ), mock.patch.object(scenes, "get_config", return_value=make_config(["salon", "garage"], {"garage": True})):
+            scenes.save_scenes({"scenes": {"nuit": {"salon": "COMFORT", "garage": "HORSGEL", "cave": "OFF"}}})
+            compiled = scenes.get_scenes()
+            self.assertIs(scenes.get_scenes(), compiled)
+            self.assertEqual(compiled["nuit"].groups, {"COMFORT": ("salon",), "ECO": ("garage",)})
+
+            scenes.activer_scene("nuit", client, "cafe0001")
+            with self.assertRaises(KeyError):
+                scenes.activer_scene("absent", client)
+            with self.assertRaises(ValueError):
+                scenes.save_scenes({"scenes": {"nuit": {"salon": "TURBO"}}})
+
+        self.assertEqual(
+            [(m["TO"], m["COMMAND"], m["CID"]) for m in client.published],
+            [("salon", "COMFORT", "cafe0001"), ("garage", "ECO", "cafe0001")],
+        )
+
+
+class AdaptiveStateQueryTests(SimpleTestCase):
+    """State queries wait per radiator RTO instead of a fixed window."""
+
+    def test_rto_follows_measured_rtt(self) -> None:
+        estimator = RttEstimator()
+        self.assertEqual(estimator.rto, 2.0)
+        for _ in range(10):
+            estimator.observe(0.05)
+        self.assertLess(estimator.rto, 0.3)
+        estimator.backoff()
+        self.assertLess(estimator.rto, 0.6)
+
+    def test_query_returns_once_every_radiator_answered(self) -> None:
+        client = FakeMQTTClient(responders={"salon": "ECO", "cuisine": "COMFORT"})
+        started = time.perf_counter()
+        self.assertEqual(services.demander_etat_au_appareil(client, liste_radiateur=["salon", "cuisine"]), 1)
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(services.get_liste_etat()["cuisine"], "COMFORT")
+
+    def test_silent_radiator_is_retried_alone_then_marked_error(self) -> None:
+        for _ in range(5):
+            RTT.observe("grenier", 0.01)
+        client = FakeMQTTClient(responders={"salon": "ECO"})
+        with mock.patch.object(services, "STATE_QUERY_MAX_ATTEMPTS", 2):
+            result = services.demander_etat_au_appareil(client, liste_radiateur=["salon", "grenier"])
+
+        self.assertEqual(result, 0)
+        targets = [message["TO"] for message in client.published]
+        self.assertEqual(targets.count("salon"), 1)
+        self.assertEqual(targets.count("grenier"), 2)
+        self.assertEqual(services.get_liste_etat()["grenier"], "ERROR")
+
+
+class PlanningEngineTests(SimpleTestCase):
+    """Zone plannings compile into shared timelines and publish net changes only."""
+
+    def test_adjacent_slots_compile_to_a_single_transition(self) -> None:
+        schedule = {"monday": [{"start": "08:00", "end": "10:00"}, {"start": "10:00", "end": "24:00"}]}
+        timeline = planning.compile_timeline(schedule)
+        self.assertEqual(timeline.transitions, ((8 * 60, "COMFORT"), (24 * 60, "ECO")))
+        self.assertIsNone(timeline.last_change(10 * 60, 1))
+        self.assertEqual(timeline.mode_at(5 * 24 * 60), "ECO")
+
+    def test_week_covered_by_slots_compiles_to_comfort(self) -> None:
+        schedule = {day: [{"start": "00:00", "end": "24:00"}] for day in services.WEEKDAYS}
+        timeline = planning.compile_timeline(schedule)
+        self.assertEqual(timeline.transitions, ((0, "COMFORT"),))
+        self.assertEqual(timeline.mode_at(100), "COMFORT")
+        self.assertEqual(timeline.last_change(planning.WEEK_MINUTES - 1, 1), "COMFORT")
+
+    def test_scheduler_runs_plannings_defined_only_in_zones(self) -> None:
+        zones = planning.validate_zones({"devices": {"salon": {"monday": [{"start": "07:00", "end": "09:00"}]}}})
+        compiled = planning.compile_planning({day: [] for day in services.WEEKDAYS}, zones, ["salon", "cuisine"])
+        self.assertTrue(compiled.has_transitions)
+        with mock.patch.object(planning, "get_planning", return_value=compiled), mock.patch.object(
+            planning, "_scheduler", None
+        ), mock.patch.object(planning.PlanningScheduler, "run") as run:
+            planning.maj_etat_selon_planning(FakeMQTTClient())
+        run.assert_called_once_with()
+
+    def test_zones_inherit_and_share_timelines(self) -> None:
+        default = {day: [{"start": "07:00", "end": "09:00"}] for day in services.WEEKDAYS}
+        zones = planning.validate_zones({
+            "zones": {
+                "etage": {"radiators": ["chambre", "bureau"], "schedule": {"monday": []}},
+                "combles": {"parent": "etage", "radiators": ["grenier"]},
+            },
+            "devices": {"bureau": {"tuesday": [{"start": "10:00", "end": "11:00"}]}},
+        })
+        compiled = planning.compile_planning(default, zones, ["salon", "cuisine", "chambre", "grenier", "bureau"])
+
+        self.assertEqual(len(compiled.timelines), 3)
+        self.assertEqual(
+            sorted(group for group in compiled.groups.values()),
+            [["bureau"], ["chambre", "grenier"], ["salon", "cuisine"]],
+        )
+        monday_seven = TIMEZONE.localize(datetime(2024, 1, 8, 7))
+        self.assertEqual(compiled.due(monday_seven - timedelta(minutes=1), monday_seven), [("défaut", "COMFORT", ["salon", "cuisine"])])
+        with self.assertRaises(ValueError):
+            planning.validate_zones({"zones": {"a": {"parent": "b"}, "b": {"parent": "a"}}})
+
+    def test_radiators_already_in_target_mode_are_skipped(self) -> None:
+        etats = {"salon": "COMFORT", "cuisine": "ECO", "bureau": "ECO"}
+        with mock.patch.object(services, "_liste_etat", etats), mock.patch.object(
+            planning, "load_disabled_states", return_value={"bureau": True}
+        ):
+            self.assertEqual(planning.radiateurs_a_modifier("COMFORT", etats), ["cuisine"])
+
+    def test_simulated_week_applies_every_transition_across_dst(self) -> None:
+        schedule = {day: [{"start": "07:00", "end": "09:00"}] for day in services.WEEKDAYS}
+        schedule["sunday"] = [{"start": "02:30", "end": "03:30"}]
+        with mock.patch.object(services, "load_schedule", return_value=schedule), mock.patch.object(
+            planning, "load_zones", return_value=planning.default_zones()
+        ), mock.patch.object(planning, "load_disabled_states", return_value={}):
+            for start in (datetime(2024, 3, 25), datetime(2024, 10, 21)):
+                report = simulation.simulate_planning(TIMEZONE.localize(start), devices=["salon", "cuisine"])
+                self.assertEqual(report["missed"], [])
+                self.assertEqual(report["unexpected"], [])
+                self.assertEqual(report["duplicated"], [])
+
+
+class PlanningViewTests(TestCase):
+    """The views using the planning module answer instead of raising."""
+
+    def setUp(self) -> None:
+        user = get_user_model().objects.create_user(username="radiateur", password="super-secret")
+        self.client.force_login(user)
+
+    def test_schedule_is_saved_through_maj_json(self) -> None:
+        schedule = {"monday": [{"start": "07:00", "end": "09:00"}]}
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(
+            configstore, "PLANNING_FILE_PATH", Path(directory) / "data.json"
+        ):
+            response = self.client.post(reverse("maj_json"), json.dumps(schedule), content_type="application/json")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(configstore.get_config().schedule_dict()["monday"], schedule["monday"])
+            self.assertEqual(self.client.post(reverse("maj_json"), "[]", content_type="application/json").status_code, 400)
+        configstore.refresh()
+
+    def test_state_endpoint_reports_states_and_boosts(self) -> None:
+        with mock.patch.object(services, "_liste_etat", {"salon": "ECO"}):
+            response = self.client.get(reverse("retourner_etat"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["states"]["salon"], "ECO")
+        self.assertIn("boosts", response.json())
+
+
+class TimerWheelTests(SimpleTestCase):
+    """Boost timers fire once, in order, across wheel levels and restarts."""
+
+    def test_timers_fire_at_their_deadline_and_survive_restart(self) -> None:
+        fired = []
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "boosts.json"
+            wheel = TimerWheel(lambda key, payload: fired.append((key, payload)), path=path, clock=lambda: 0.0)
+            wheel.schedule("salon", 7200.0, "COMFORT")
+            wheel.schedule("cuisine", 30 * 86400.0, "ECO")
+            wheel.schedule("bureau", 0.25, "OFF")
+            wheel.schedule("grenier", 60.0, "OFF")
+            self.assertEqual(wheel.cancel("grenier"), "OFF")
+
+            self.assertEqual(wheel.advance(0.2), [])
+            self.assertEqual(wheel.advance(0.3), [("bureau", "OFF")])
+            self.assertEqual(wheel.advance(7199.9), [])
+            self.assertEqual(wheel.advance(7200.0), [("salon", "COMFORT")])
+            wheel.save()
+
+            restarted = TimerWheel(lambda key, payload: fired.append((key, payload)), path=path, clock=lambda: 7200.0)
+            self.assertEqual(restarted.load(), 1)
+            self.assertEqual(restarted.advance(30 * 86400.0 - 1), [])
+            self.assertEqual(restarted.advance(40 * 86400.0), [("cuisine", "ECO")])
+
+        self.assertEqual([key for key, _payload in fired], ["bureau", "salon", "cuisine"])
+
+    def test_thread_sleeps_until_the_earliest_deadline(self) -> None:
+        fired = threading.Event()
+        wheel = TimerWheel(lambda key, payload: fired.set())
+        self.assertIsNone(wheel._sleep_time())
+        wheel.start()
+        self.addCleanup(wheel.stop)
+
+        wheel.schedule("salon", time.time() + 3600.0)
+        self.assertEqual(wheel._sleep_time(), timers.MAX_SLEEP)
+        started = time.monotonic()
+        wheel.schedule("cuisine", time.time() + 0.3)
+        self.assertTrue(fired.wait(2.0))
+        # Due times are rounded to the tick, so it may fire up to one tick early.
+        self.assertGreaterEqual(time.monotonic() - started, 0.3 - timers.TICK - 0.05)
+        self.assertEqual(list(wheel.pending()), ["salon"])
+
+    def test_boosts_are_shared_between_workers_and_end_once(self) -> None:
+        clock = SimulatedClock(1000.0)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / planning.BOOSTS_FILE
+        wheel = TimerWheel(planning._expirer_boost, clock=clock.time)
+        patcher = mock.patch.multiple(
+            planning, _boosts=wheel, _boosts_path=path, _boosts_stamp=None, _fin_boost=mock.DEFAULT
+        )
+        fin_boost = patcher.start()["_fin_boost"]
+        self.addCleanup(patcher.stop)
+
+        def other_worker_saves(boosts: dict) -> None:
+            replace_text(path, json.dumps(boosts))
+
+        with use_clock(clock):
+            other_worker_saves({"salon": {"deadline": 1060.0, "payload": "COMFORT"}})
+            self.assertEqual(planning.get_boosts(), {"salon": {"mode": "COMFORT", "until": 1060.0}})
+
+            # Extended by another worker: the local timer re-arms instead of ending it.
+            other_worker_saves({"salon": {"deadline": 1120.0, "payload": "COMFORT"}})
+            clock.advance(70)
+            wheel.advance()
+            fin_boost.assert_not_called()
+            self.assertEqual(wheel.pending(), {"salon": (1120.0, "COMFORT")})
+
+            clock.advance(60)
+            wheel.advance()
+            fin_boost.assert_called_once_with("salon", "COMFORT")
+            self.assertEqual(json.loads(path.read_text(encoding="utf-8")), {})
+            # The timer of another worker finds the boost already ended.
+            planning._expirer_boost("salon", "COMFORT")
+            fin_boost.assert_called_once()
+
+            other_worker_saves({"cuisine": {"deadline": 5000.0, "payload": "OFF"}})
+            self.assertEqual(list(planning.get_boosts()), ["cuisine"])
+            other_worker_saves({})
+            self.assertEqual(planning.get_boosts(), {})
+            self.assertEqual(wheel.pending(), {})
+
+
+class HealthMonitorTests(SimpleTestCase):
+    """Dead radiators are skipped until a probe revives them."""
+
+    def test_circuit_opens_probes_and_closes(self) -> None:
+        monitor = HealthMonitor(failure_threshold=2, cooldown=10.0, probe_timeout=5.0)
+        changes = []
+        monitor.register_listener(lambda: changes.append(monitor.snapshot(["garage"])["garage"]["state"]))
+        self.assertFalse(monitor.record_failure("garage", now=0.0))
+        self.assertTrue(monitor.record_failure("garage", now=1.0))
+        self.assertEqual(monitor.filter_available(["salon", "garage"]), ["salon"])
+
+        self.assertEqual(monitor.devices_to_probe(now=5.0), [])
+        self.assertEqual(monitor.devices_to_probe(now=11.0), ["garage"])
+        self.assertEqual(monitor.snapshot()["garage"]["state"], HALF_OPEN)
+
+        # Unanswered probe: re-opened with a doubled cool-down.
+        monitor.devices_to_probe(now=16.0)
+        self.assertEqual(monitor.snapshot()["garage"]["state"], OPEN)
+        self.assertEqual(monitor.devices_to_probe(now=30.0), [])
+        self.assertEqual(monitor.devices_to_probe(now=36.0), ["garage"])
+
+        self.assertTrue(monitor.record_success("garage", at=37.0))
+        self.assertEqual(monitor.snapshot()["garage"]["state"], CLOSED)
+        self.assertEqual(monitor.filter_available(["garage"]), ["garage"])
+        self.assertEqual(changes, [OPEN, HALF_OPEN, OPEN, HALF_OPEN, CLOSED])
+
+    def test_open_circuit_radiator_is_not_queried(self) -> None:
+        client = FakeMQTTClient(responders={"salon": "ECO"})
+        with mock.patch.object(services, "HEALTH", HealthMonitor(failure_threshold=1)) as monitor:
+            monitor.record_failure("cave")
+            self.assertEqual(services.demander_etat_au_appareil(client, liste_radiateur=["salon", "cave"]), 1)
+
+        self.assertEqual([message["TO"] for message in client.published], ["salon"])
+
+
+class StatePollerTests(SimpleTestCase):
+    """STATE requests are spread over the interval and adapt to activity."""
+
+    def test_offsets_spread_requests_over_interval(self) -> None:
+        poller = StatePoller(FakeMQTTClient(), jitter=0.5)
+        offsets = poller.offsets(4, 20.0)
+        self.assertEqual(len(offsets), 4)
+        for index, offset in enumerate(offsets):
+            self.assertGreaterEqual(offset, index * 5.0)
+            self.assertLess(offset, index * 5.0 + 2.5)
+
+    def test_interval_grows_when_quiet_and_resets_on_activity(self) -> None:
+        poller = StatePoller(FakeMQTTClient(), 30.0, min_interval=10.0, max_interval=60.0)
+        with mock.patch.object(services, "get_dernier_changement", return_value=0.0):
+            quiet = [poller.next_interval(2, now=1000.0) for _ in range(4)]
+        self.assertEqual(quiet, [30.0, 45.0, 60.0, 60.0])
+        with mock.patch.object(services, "get_dernier_changement", return_value=990.0):
+            self.assertEqual(poller.next_interval(2, now=1000.0), 10.0)
+            self.assertEqual(poller.next_interval(100, now=1000.0), 50.0)
+
+    def test_cycle_polls_each_radiator_and_checks_previous_reply(self) -> None:
+        client = FakeMQTTClient(responders={"salon": "ECO"})
+        poller = StatePoller(
+            client, 0.05, min_interval=0.05, max_interval=0.05, devices=lambda: ["salon", "veranda"]
+        )
+        poller.run_cycle()
+        poller.run_cycle()
+
+        self.assertEqual([message["TO"] for message in client.published], ["salon", "veranda"] * 2)
+        self.assertEqual(services.get_liste_etat()["salon"], "ECO")
+        self.assertEqual(services.HEALTH.snapshot(["veranda"])["veranda"]["consecutive_failures"], 1)
+
+
+class StateSnapshotTests(SimpleTestCase):
+    """The state cache survives a restart through journal and snapshot."""
+
+    def test_journal_is_replayed_over_compacted_snapshot(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot = StateSnapshot(Path(directory), compact_every=2)
+            snapshot.record("salon", "ECO", None, "report", 100.0)
+            snapshot.record("salon", "COMFORT", "ECO", "ack", 110.0)  # compaction
+            snapshot.record("cuisine", "ERROR", None, "timeout", 120.0)
+            with open(snapshot.journal_path, "a", encoding="utf-8") as journal:
+                journal.write('{"device": "tronq')
+
+            entries = StateSnapshot(Path(directory)).load()
+
+        self.assertEqual(entries["salon"], {"mode": "COMFORT", "last_seen": 110.0, "source": "ack"})
+        self.assertEqual(entries["cuisine"]["mode"], "ERROR")
+        self.assertIsNone(entries["cuisine"]["last_seen"])
+
+    def test_compaction_keeps_the_changes_journaled_by_other_workers(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            first = StateSnapshot(Path(directory))
+            second = StateSnapshot(Path(directory))
+            first.record("salon", "COMFORT", None, "ack", 100.0)
+            second.record("cuisine", "ECO", None, "report", 110.0)
+            first.record("salon", "COMFORT", "COMFORT", "report", 120.0)  # not journaled
+            first.compact()
+            second.record("bureau", "OFF", None, "ack", 130.0)
+
+            entries = StateSnapshot(Path(directory)).load()
+            files = sorted(path.name for path in Path(directory).iterdir())
+
+        self.assertEqual(entries["salon"], {"mode": "COMFORT", "last_seen": 120.0, "source": "report"})
+        self.assertEqual(entries["cuisine"]["mode"], "ECO")
+        self.assertEqual(entries["bureau"]["mode"], "OFF")
+        self.assertEqual(files, ["etat.journal", "etat.json", "etat.lock"])
+
+    def test_state_updates_reach_listeners(self) -> None:
+        received = []
+        with mock.patch.object(services, "_state_listeners", [lambda *args: received.append(args)]):
+            reply = {"FROM": "bureau", "TO": "Django", "COMMAND": "OFF"}
+            services.traiter_message_recu(50.0, str(reply))
+
+        self.assertEqual(received[-1][0:2], ("bureau", "OFF"))
+        self.assertEqual(received[-1][3:], ("report", 50.0))
+
+
+class HistoryStoreTests(SimpleTestCase):
+    """Transitions are written in batches and rolled up per hour and day."""
+
+    base = 1_700_000_000 - 1_700_000_000 % 3600
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        # The writer thread maintains the store on its own clock, frozen
+        # before the recorded transitions.
+        self.store = HistoryStore(
+            Path(self.directory.name) / "history.sqlite3", raw_retention_days=1, clock=lambda: self.base
+        )
+        self.store.start()
+        self.addCleanup(self.store.stop)
+
+    def test_transitions_and_rollups(self) -> None:
+        base = self.base
+        self.store.record("salon", "ECO", None, "report", base + 600)
+        self.store.record("salon", "ECO", "ECO", "report", base + 700)  # not a transition
+        self.store.record("salon", "COMFORT", "ECO", "ack", base + 1800)
+        self.assertTrue(self.store.flush())
+
+        items = self.store.transitions("salon", base + 1000, base + 7200)
+        self.assertEqual([item["mode"] for item in items], ["ECO", "COMFORT"])
+
+        self.store.maintain(now=base + 7200 + 5)
+        hourly = {
+            (row["start"], row["mode"]): row["seconds"]
+            for row in self.store.rollups("salon", "hour", base, base + 7200)
+        }
+        self.assertEqual(hourly[(base, "ECO")], 1200.0)
+        self.assertEqual(hourly[(base, "COMFORT")], 1800.0)
+        self.assertEqual(hourly[(base + 3600, "COMFORT")], 3600.0)
+        daily = self.store.rollups("salon", "day", base - 86400, base + 86400)
+        self.assertEqual(sum(row["seconds"] for row in daily), 6600.0)
+
+        # A second run over the same hours adds nothing.
+        self.store.maintain(now=base + 7200 + 5)
+        daily = self.store.rollups("salon", "day", base - 86400, base + 86400)
+        self.assertEqual(sum(row["seconds"] for row in daily), 6600.0)
+
+        # Raw retention keeps the last transition before the cutoff.
+        self.store.maintain(now=base + 10 * 86400)
+        self.assertEqual(
+            [item["mode"] for item in self.store.transitions("salon", base + 9 * 86400, base + 10 * 86400)],
+            ["COMFORT"],
+        )
+
+    def test_only_the_writer_process_records_the_shared_replies(self) -> None:
+        base = self.base
+        other = HistoryStore(self.store.path, clock=lambda: self.base)
+        other.start()
+        self.addCleanup(other.stop)
+
+        self.store.record("salon", "ECO", None, "report", base + 600)
+        # Another worker receives the same reply, and times out on its own command.
+        other.record("salon", "ECO", None, "report", base + 601)
+        other.record("cuisine", "ERROR", "ECO", "timeout", base + 700)
+        # The writer process exits: the other worker takes over.
+        self.store._writer.release()
+        other.record("salon", "COMFORT", "ECO", "ack", base + 900)
+        self.assertTrue(self.store.flush())
+        self.assertTrue(other.flush())
+
+        self.assertEqual(
+            [(item["ts"], item["mode"]) for item in self.store.transitions("salon", base, base + 3600)],
+            [(base + 600, "ECO"), (base + 900, "COMFORT")],
+        )
+        self.assertEqual([item["mode"] for item in self.store.transitions("cuisine", base, base + 3600)], ["ERROR"])
+
+
+@skipUnless(analytics.available(), "NumPy n'est pas installé")
+class AnalyticsTests(SimpleTestCase):
+    """Time in mode is integrated over rollups and raw transitions."""
+
+    def test_step_durations_split_at_edges(self) -> None:
+        durations = analytics.step_durations([5.0, 15.0], [0, 1], [0.0, 10.0, 20.0], 2)
+        self.assertEqual(durations.tolist(), [[5.0, 0.0], [5.0, 5.0]])
+
+    def test_summary_combines_rollups_and_recent_transitions(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            start = analytics.bucket_edges(1_700_000_000, 1_700_000_001, "day")[0]
+            store = HistoryStore(Path(directory) / "history.sqlite3", clock=lambda: start)
+            store.start()
+            self.addCleanup(store.stop)
+            store.record("salon", "ECO", None, "report", start)
+            store.record("salon", "COMFORT", "ECO", "ack", start + 6 * 3600)
+            store.record("salon", "ECO", "COMFORT", "ack", start + 8 * 3600)
+            self.assertTrue(store.flush())
+            store.maintain(now=start + 7 * 3600)  # rolls up the first 7 hours only
+
+            schedule = {day: [{"start": "06:00", "end": "07:00"}] for day in services.WEEKDAYS}
+            compiled = planning.compile_planning(schedule, planning.default_zones(), ["salon"])
+            with mock.patch.object(analytics, "get_planning", return_value=compiled):
+                summary = analytics.summarize(store, ["salon"], start, start + 12 * 3600, "day")
+
+        salon = summary["devices"]["salon"]
+        self.assertEqual(salon["hours"]["COMFORT"], [2.0])
+        self.assertEqual(salon["hours"]["ECO"], [10.0])
+        self.assertAlmostEqual(salon["kwh"][0], 2 * 0.6 + 10 * 0.4)
+        # Actual COMFORT 06:00-08:00 against a planned 06:00-07:00 slot.
+        self.assertAlmostEqual(salon["compliance"][0], 11 / 12, places=3)
+
+
+class LogViewerTests(SimpleTestCase):
+    """Logs are searched through the sparse index, across rotated segments."""
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = Path(self.directory.name) / "app.log"
+
+    def _lines(self, day: int, count: int) -> str:
+        return "".join(
+            f"[2024-01-{day:02d} {minute // 60:02d}:{minute % 60:02d}:00] ligne {day}-{minute}\n"
+            for minute in range(count)
+        )
+
+    def test_range_tail_and_follow_across_rotations(self) -> None:
+        with gzip.open(self.path.with_name("app.log.2.gz"), "wt", encoding="utf-8") as handle:
+            handle.write(self._lines(1, 100))
+        self.path.with_name("app.log.1").write_text(self._lines(2, 100), encoding="utf-8")
+        self.path.write_text(self._lines(3, 1200), encoding="utf-8")
+        log = LogFile(self.path)
+        stride = mock.patch("radiateur.logviewer.INDEX_STRIDE", 4096)
+        stride.start()
+        self.addCleanup(stride.stop)
+
+        start = parse_timestamp(b"[2024-01-02 01:30:00]")
+        end = parse_timestamp(b"[2024-01-03 00:01:00]")
+        lines = [line.text.split()[-1] for line in log.search(start, end)]
+        self.assertEqual(lines, ["2-90", "2-91", "2-92", "2-93", "2-94", "2-95", "2-96", "2-97", "2-98", "2-99", "3-0", "3-1"])
+        self.assertGreater(len(log.segments()[-1].index().offsets), 1)
+
+        self.assertEqual([line.text.split()[-1] for line in log.tail(2)], ["3-1198", "3-1199"])
+        self.assertEqual(len(log.search(contains="ligne 1-", limit=5000)), 100)
+
+        _, offset = log.follow(-1)
+        with open(self.path, "a", encoding="utf-8") as handle:
+            handle.write("[2024-01-04 00:00:00] nouvelle\n")
+        lines, new_offset = log.follow(offset)
+        self.assertEqual([line.text for line in lines], ["[2024-01-04 00:00:00] nouvelle"])
+        self.assertEqual(new_offset, self.path.stat().st_size)
+
+    def test_log_sink_is_scoped_to_the_current_thread(self) -> None:
+        simulated = Path(self.directory.name) / "simulation.log"
+        with mock.patch.object(services, "APP_LOG_FILE", self.path):
+            with services.log_to(simulated):
+                services.enregistrer_log("simulation")
+                thread = threading.Thread(target=services.enregistrer_log, args=("serveur",))
+                thread.start()
+                thread.join()
+            services.enregistrer_log("après")
+        written = [line.split("] ", 1)[1] for line in self.path.read_text(encoding="utf-8").splitlines()]
+        self.assertEqual(written, ["serveur", "après"])
+        self.assertIn("simulation", simulated.read_text(encoding="utf-8"))
+
+
+class EventJournalTests(SimpleTestCase):
+    """Commands and replies are journaled as fixed-size binary records."""
+
+    def test_records_are_queried_after_reopening(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            journal = events.EventJournal(Path(directory))
+            journal.append(events.COMMAND, "salon", "COMFORT", "0000abcd", timestamp=100.0)
+            journal.append(events.ACK, "salon", "COMFORT", "0000abcd", timestamp=101.0)
+            journal.append(events.REPORT, "cuisine", "ECO", None, timestamp=102.0)
+            journal.close()
+            with open(journal.path, "ab") as handle:
+                handle.write(b"\x00" * 5)  # torn record
+
+            reopened = events.EventJournal(Path(directory))
+            reopened.append(events.TIMEOUT, "cuisine", "ERROR", timestamp=103.0)
+            reopened.flush()
+            by_cid = reopened.query(correlation_id="0000abcd")
+            with mock.patch.object(events, "np", None):
+                fallback = reopened.query(device="cuisine")
+            reopened.close()
+
+        self.assertEqual([item["event"] for item in by_cid], ["ack", "command"])
+        self.assertEqual(by_cid[0], {"ts": 101.0, "device": "salon", "event": "ack", "mode": "COMFORT", "cid": "0000abcd"})
+        self.assertEqual([(item["event"], item["mode"]) for item in fallback], [("timeout", "ERROR"), ("report", "ECO")])
+
+    def test_workers_sharing_the_journal_agree_on_device_ids(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            first = events.EventJournal(Path(directory))
+            second = events.EventJournal(Path(directory))
+            first.append(events.COMMAND, "salon", "COMFORT", timestamp=100.0)
+            second.append(events.COMMAND, "cuisine", "ECO", timestamp=101.0)
+            first.append(events.ACK, "cuisine", "ECO", timestamp=102.0)
+            second.append(events.ACK, "salon", "COMFORT", timestamp=103.0)
+            first.close()
+            second.close()
+
+            self.assertEqual(json.loads(first.devices_path.read_text(encoding="utf-8")), ["salon", "cuisine"])
+            for journal in (first, second):
+                self.assertEqual(
+                    [(item["ts"], item["device"]) for item in journal.query(device="salon")],
+                    [(103.0, "salon"), (100.0, "salon")],
+                )
@@ -0,0 +1,283 @@
+"""Hierarchical timer wheel for temporary overrides (boosts).
+
+Timers are kept in four wheels of 256, 64, 64 and 64 slots with a 0.1 s
+tick, covering about 77 days; later deadlines wait in the outer wheel and
+are re-inserted when it turns.  Inserting and cancelling a timer are O(1)
+(each slot is a dict keyed by the timer key); advancing the wheel only
+visits the slots whose tick has come, and skips empty wheels entirely.
+
+A single thread drives the wheel: it sleeps until the earliest deadline
+(at most ``MAX_SLEEP``, so wall clock adjustments are noticed) and is woken
+up by ``schedule``, ``cancel`` and ``stop``.  Pending timers are written
+atomically to a JSON file after each change so they survive a restart;
+timers whose deadline passed while the server was down fire on the first
+tick.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .metrics import REGISTRY
+
+TICK = 0.1
+WHEEL_BITS = (8, 6, 6, 6)
+MAX_SLEEP = 60.0
+
+_PENDING = REGISTRY.gauge(
+    "radiateur_timers_pending",
+    "Minuteries (boosts) en attente.",
+)
+_FIRED = REGISTRY.counter(
+    "radiateur_timers_fired_total",
+    "Minuteries arrivées à échéance.",
+)
+
+
+class _Timer:
+    __slots__ = ("key", "deadline", "expires", "payload", "level", "slot")
+
+    def __init__(self, key: str, deadline: float, expires: int, payload: object) -> None:
+        self.key = key
+        self.deadline = deadline
+        self.expires = expires
+        self.payload = payload
+        self.level = 0
+        self.slot = 0
+
+
+class TimerWheel:
+    """Keyed one-shot timers calling ``on_expire(key, payload)`` when due."""
+
+    def __init__(
+        self,
+        on_expire: Callable[[str, object], None],
+        *,
+        tick: float = TICK,
+        path: Optional[Path] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.on_expire = on_expire
+        self.tick = tick
+        self.path = Path(path) if path is not None else None
+        self.clock = clock
+        self._shifts = []
+        shift = 0
+        for bits in WHEEL_BITS:
+            self._shifts.append(shift)
+            shift += bits
+        self._span = 1 << shift
+        self._wheels: List[List[Dict[str, _Timer]]] = [
+            [{} for _ in range(1 << bits)] for bits in WHEEL_BITS
+        ]
+        self._counts = [0] * len(WHEEL_BITS)
+        self._timers: Dict[str, _Timer] = {}
+        self._tick = self._to_tick(clock())
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._dirty = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _to_tick(self, timestamp: float) -> int:
+        return math.ceil(round(timestamp / self.tick, 6))
+
+    # -- insertion and cancellation ---------------------------------------
+
+    def _place(self, timer: _Timer) -> None:
+        delta = timer.expires - self._tick
+        if delta <= 0:
+            # Already due: fire on the next tick.
+            delta, expires = 1, self._tick + 1
+        else:
+            expires = min(timer.expires, self._tick + self._span - 1)
+            delta = expires - self._tick
+        level = 0
+        while level < len(WHEEL_BITS) - 1 and delta >= 1 << self._shifts[level + 1]:
+            level += 1
+        slot = (expires >> self._shifts[level]) & ((1 << WHEEL_BITS[level]) - 1)
+        timer.level, timer.slot = level, slot
+        self._wheels[level][slot][timer.key] = timer
+        self._counts[level] += 1
+
+    def _unplace(self, timer: _Timer) -> None:
+        del self._wheels[timer.level][timer.slot][timer.key]
+        self._counts[timer.level] -= 1
+
+    def schedule(self, key: str, deadline: float, payload: object = None) -> None:
+        """Arm (or re-arm) the timer ``key`` to fire at ``deadline``."""
+
+        with self._lock:
+            previous = self._timers.pop(key, None)
+            if previous is not None:
+                self._unplace(previous)
+            timer = self._timers[key] = _Timer(key, deadline, self._to_tick(deadline), payload)
+            self._place(timer)
+            self._dirty = True
+            _PENDING.set(len(self._timers))
+            self._wakeup.notify()
+
+    def cancel(self, key: str) -> Optional[object]:
+        """Disarm ``key``; return its payload, or ``None`` when not armed."""
+
+        with self._lock:
+            timer = self._timers.pop(key, None)
+            if timer is None:
+                return None
+            self._unplace(timer)
+            self._dirty = True
+            _PENDING.set(len(self._timers))
+            self._wakeup.notify()
+            return timer.payload
+
+    def pending(self) -> Dict[str, Tuple[float, object]]:
+        with self._lock:
+            return {key: (timer.deadline, timer.payload) for key, timer in self._timers.items()}
+
+    def _sleep_time(self) -> Optional[float]:
+        """Seconds until the earliest timer fires, ``None`` when none is armed."""
+
+        if not self._timers:
+            return None
+        # A handful of timers are armed at once (one per radiator).
+        earliest = min(timer.expires for timer in self._timers.values()) * self.tick
+        return min(max(0.0, earliest - self.clock()), MAX_SLEEP)
+
+    # -- advancing ----------------------------------------------------------
+
+    def _skip_empty(self, target: int) -> None:
+        """Jump over ticks that cannot fire nor cascade anything."""
+
+        for level in range(len(WHEEL_BITS)):
+            if self._counts[level]:
+                break
+        else:
+            self._tick = target
+            return
+        shift = self._shifts[level]
+        if shift:
+            boundary = ((self._tick >> shift) + 1) << shift
+            self._tick = max(self._tick, min(target, boundary - 1))
+            return
+        # Inner wheel in use: move just before its next non-empty slot.
+        wheel = self._wheels[0]
+        mask = len(wheel) - 1
+        last = min(target, ((self._tick >> self._shifts[1]) + 1) << self._shifts[1])
+        candidate = self._tick + 1
+        while candidate < last and not wheel[candidate & mask]:
+            candidate += 1
+        self._tick = candidate - 1
+
+    def _step(self, due: List[_Timer]) -> None:
+        self._tick += 1
+        for level in range(1, len(WHEEL_BITS)):
+            if self._tick & ((1 << self._shifts[level]) - 1):
+                break
+            slot = (self._tick >> self._shifts[level]) & ((1 << WHEEL_BITS[level]) - 1)
+            cascading = self._wheels[level][slot]
+            self._wheels[level][slot] = {}
+            self._counts[level] -= len(cascading)
+            for timer in cascading.values():
+                if timer.expires <= self._tick:
+                    del self._timers[timer.key]
+                    due.append(timer)
+                else:
+                    self._place(timer)
+        slot = self._tick & ((1 << WHEEL_BITS[0]) - 1)
+        bucket = self._wheels[0][slot]
+        for key in [key for key, timer in bucket.items() if timer.expires <= self._tick]:
+            timer = bucket.pop(key)
+            self._counts[0] -= 1
+            del self._timers[key]
+            due.append(timer)
+
+    def advance(self, now: Optional[float] = None) -> List[Tuple[str, object]]:
+        """Fire every timer due at ``now``; return ``(key, payload)`` of those fired."""
+
+        target = self._to_tick(self.clock() if now is None else now)
+        due: List[_Timer] = []
+        with self._lock:
+            while self._tick < target:
+                self._skip_empty(target)
+                if self._tick < target:
+                    self._step(due)
+            if due:
+                self._dirty = True
+                _PENDING.set(len(self._timers))
+
+        fired = []
+        for timer in due:
+            _FIRED.inc()
+            fired.append((timer.key, timer.payload))
+            try:
+                self.on_expire(timer.key, timer.payload)
+            except Exception:  # pragma: no cover - a failing callback must not stop the wheel
+                pass
+        return fired
+
+    # -- persistence ----------------------------------------------------------
+
+    def load(self) -> int:
+        """Re-arm the timers saved by a previous run; return how many."""
+
+        if self.path is None:
+            return 0
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return 0
+        count = 0
+        for key, entry in (raw.items() if isinstance(raw, dict) else ()):
+            if isinstance(entry, dict) and isinstance(entry.get("deadline"), (int, float)):
+                self.schedule(key, entry["deadline"], entry.get("payload"))
+                count += 1
+        with self._lock:
+            self._dirty = False
+        return count
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            data = {
+                key: {"deadline": timer.deadline, "payload": timer.payload}
+                for key, timer in self._timers.items()
+            }
+            self._dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(temporary, self.path)
+
+    # -- driver thread ----------------------------------------------------------
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="radiateur-timers", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._lock:
+            self._wakeup.notify()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.advance()
+            if self._dirty:
+                try:
+                    self.save()
+                except OSError:  # pragma: no cover - retried on the next change
+                    pass
+            with self._lock:
+                if self._dirty or self._stop.is_set():
+                    continue
+                # Woken up early by schedule/cancel/stop; timing out means a timer is due.
+                self._wakeup.wait(self._sleep_time())
@@ -0,0 +1,204 @@
+"""Lightweight request-to-device tracing kept in a bounded in-memory buffer.
+
+A trace follows one user action (or planning transition) from the HTTP view
+down to the MQTT publish and the radiator reply.  The trace id doubles as the
+correlation id (``CID``) injected into the MQTT payload and echoed back by the
+devices, which lets :func:`resolve_reply` close the matching span when the
+answer arrives in ``on_message``.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+REPLY_TIMEOUT = 30.0
+MAX_PENDING_REPLIES = 1000
+
+
+def new_correlation_id() -> str:
+    """Return a short random identifier suitable for the ESP8266 payloads."""
+
+    return os.urandom(4).hex()
+
+
+@dataclass
+class Span:
+    """Timed operation belonging to a trace."""
+
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    start: float
+    end: Optional[float] = None
+    status: str = "ok"
+    attributes: Dict[str, object] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def to_json(self) -> Dict[str, object]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("radiateur_current_span", default=None)
+_finished: Deque[Span] = deque(maxlen=getattr(settings, "TRACE_BUFFER_SIZE", 2000))
+_pending: Dict[Tuple[str, str], Span] = {}
+_lock = Lock()
+
+
+def _finish(span: Span) -> None:
+    if span.end is None:
+        span.end = time.time()
+    with _lock:
+        _finished.append(span)
+
+
+@contextmanager
+def span(name: str, trace_id: str | None = None, **attributes: object) -> Iterator[Span]:
+    """Record ``name`` as a child of the active span, starting a trace if needed."""
+
+    parent = _current_span.get()
+    if trace_id is None:
+        trace_id = parent.trace_id if parent is not None else new_correlation_id()
+    current = Span(
+        trace_id=trace_id,
+        span_id=new_correlation_id(),
+        parent_id=parent.span_id if parent is not None and parent.trace_id == trace_id else None,
+        name=name,
+        start=time.time(),
+        attributes=dict(attributes),
+    )
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as exc:
+        current.status = "error"
+        current.attributes["error"] = repr(exc)
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(current)
+
+
+@contextmanager
+def child_span(name: str, **attributes: object) -> Iterator[Optional[Span]]:
+    """Like :func:`span` but only records when a trace is already active."""
+
+    if _current_span.get() is None:
+        yield None
+        return
+    with span(name, **attributes) as current:
+        yield current
+
+
+def current_trace_id() -> Optional[str]:
+    """Return the id of the active trace, if any."""
+
+    current = _current_span.get()
+    return current.trace_id if current is not None else None
+
+
+def _expire_pending(now: float) -> None:
+    expired = [key for key, pending in _pending.items() if now - pending.start > REPLY_TIMEOUT]
+    for key in expired:
+        pending = _pending.pop(key)
+        pending.status = "timeout"
+        pending.end = now
+        _finished.append(pending)
+
+
+def expect_reply(trace_id: str, device: str, **attributes: object) -> None:
+    """Open a span that stays pending until ``device`` echoes ``trace_id``."""
+
+    parent = _current_span.get()
+    pending = Span(
+        trace_id=trace_id,
+        span_id=new_correlation_id(),
+        parent_id=parent.span_id if parent is not None and parent.trace_id == trace_id else None,
+        name="device.reply",
+        start=time.time(),
+        attributes={"device": device, **attributes},
+    )
+    with _lock:
+        _expire_pending(pending.start)
+        if len(_pending) >= MAX_PENDING_REPLIES:
+            oldest = min(_pending, key=lambda key: _pending[key].start)
+            _pending.pop(oldest)
+        # A retransmission keeps the original start so the span covers retries.
+        _pending.setdefault((trace_id, device), pending)
+
+
+def resolve_reply(trace_id: str, device: str, received_at: float | None = None, **attributes: object) -> bool:
+    """Close the pending reply span of ``device``; return False when unknown."""
+
+    with _lock:
+        pending = _pending.pop((trace_id, device), None)
+        if pending is None:
+            return False
+        pending.end = received_at if received_at is not None else time.time()
+        pending.attributes.update(attributes)
+        _finished.append(pending)
+    return True
+
+
+def export_traces(limit: int = 100) -> List[Dict[str, object]]:
+    """Group the buffered spans by trace, most recent first."""
+
+    with _lock:
+        _expire_pending(time.time())
+        spans = list(_finished) + list(_pending.values())
+
+    traces: Dict[str, List[Span]] = {}
+    for item in spans:
+        traces.setdefault(item.trace_id, []).append(item)
+
+    exported: List[Dict[str, object]] = []
+    for trace_id, items in traces.items():
+        items.sort(key=lambda item: item.start)
+        start = items[0].start
+        end = max((item.end or time.time()) for item in items)
+        roots = [item for item in items if item.parent_id is None and item.name != "device.reply"]
+        exported.append(
+            {
+                "trace_id": trace_id,
+                "name": roots[0].name if roots else items[0].name,
+                "start": start,
+                "duration_ms": round((end - start) * 1000, 3),
+                "pending": any(item.end is None for item in items),
+                "spans": [
+                    {**item.to_json(), "offset_ms": round((item.start - start) * 1000, 3)}
+                    for item in items
+                ],
+            }
+        )
+
+    exported.sort(key=lambda trace: trace["start"], reverse=True)
+    return exported[:limit]
+
+
+def clear() -> None:
+    """Drop every buffered span (used by the tests)."""
+
+    with _lock:
+        _finished.clear()
+        _pending.clear()
@@ -4,13 +4,29 @@ from . import views
 
 urlpatterns = [
     path("", views.index, name="index"),
-    path("planning/", views.planning, name="planning"),
+    path("planning/", views.planning_page, name="planning"),
     path("options/", views.options, name="options"),
     path("changement_etat/", views.changement_etat, name="changement_etat"),
+    path("changement_etat/lot/", views.changement_etat_lot, name="changement_etat_lot"),
     path("retourner_etat/", views.retourner_etat, name="retourner_etat"),
+    path("boost/", views.boost, name="boost"),
+    path("commandes/<str:command_id>/", views.commande_status, name="commande_status"),
     path("devices/", views.devices, name="devices"),
     # path("getjson/", views.getjson, name="datajson"),
     path("maj_json", views.maj_json, name="maj_json"),
+    path("zones/", views.zones_json, name="zones"),
+    path("scenes/", views.scenes_json, name="scenes"),
+    path("scenes/<str:name>/activer/", views.activer_scene, name="activer_scene"),
+    path("metrics", views.metrics, name="metrics"),
+    path("mqtt/health/", views.mqtt_health, name="mqtt_health"),
+    path("traces/", views.traces, name="traces"),
+    path("traces.json", views.traces_json, name="traces_json"),
+    path("history/", views.history_json, name="history"),
+    path("events.json", views.events_json, name="events_json"),
+    path("analytics/", views.analytics_json, name="analytics"),
+    path("logs/", views.logs, name="logs"),
+    path("logs/<str:name>.json", views.logs_json, name="logs_json"),
+    path("logs/<str:name>/stream", views.logs_stream, name="logs_stream"),
     path("service-worker.js", views.service_worker, name="service-worker"),
     # path("get_image_url/", views.get_image_url, name="get_image_url")
 ]
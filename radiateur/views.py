@@ -5,17 +5,22 @@ from __future__ import annotations
 import json
 import math
 import socket
+import threading
 import time
+import uuid
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from ipaddress import ip_address, ip_network
 import http.client
+from functools import wraps
 from pathlib import Path
 
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import parse_etags
 from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_exempt
 
@@ -26,7 +31,11 @@ try:
 except ImportError:  # pragma: no cover - optional dependency handled at runtime
     netifaces = None
 
+from . import analytics, events, history, logviewer, planning, scenes, tracing
+from .coalescer import COALESCER, command_status
 from .config import MQTT_SETTINGS, TIMEZONE
+from .configstore import get_config, save_schedule
+from .metrics import REGISTRY
 from .models import (
     get_device,
     load_devices,
@@ -34,165 +43,373 @@ from .models import (
     remove_device,
     rename_device,
 )
-from .runtime import get_cached_states, get_mqtt_client
+from .runtime import get_cached_states, get_connection_health, get_mqtt_client
 from .services import (
-    demander_etat_au_appareil,
+    COMMAND_MODES,
+    attendre_changement_etat,
     enregistrer_log,
     envoyer_changement_etat_mqtt,
     get_all_radiator_names,
+    get_commandes_en_attente,
     get_liste_etat,
+    get_sante_radiateurs,
+    get_version_etat,
     load_disabled_states,
     save_disabled_states,
     update_disabled_state,
 )
 
-DATA_FILE_PATH = Path(__file__).resolve().parent / "templates" / "data.json"
 SERVICE_WORKER_PATH = Path(settings.BASE_DIR) / "static" / "js" / "service-worker.js"
 
-WEEKDAYS = (
-    "monday",
-    "tuesday",
-    "wednesday",
-    "thursday",
-    "friday",
-    "saturday",
-    "sunday",
+_VIEW_LATENCY = REGISTRY.histogram(
+    "radiateur_http_request_duration_seconds",
+    "Durée de traitement des vues HTTP.",
+    ("view",),
+)
+_VIEW_REQUESTS = REGISTRY.counter(
+    "radiateur_http_requests_total",
+    "Requêtes HTTP traitées par vue et code de statut.",
+    ("view", "status"),
+)
+_DISCOVERY_DURATION = REGISTRY.histogram(
+    "radiateur_discovery_scan_seconds",
+    "Durée d'un scan réseau de détection des ESP8266.",
+    buckets=(0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0),
+)
+_DISCOVERY_HOSTS = REGISTRY.gauge(
+    "radiateur_discovery_hosts",
+    "Nombre d'adresses sondées lors du dernier scan réseau.",
+)
+_DISCOVERY_FOUND = REGISTRY.gauge(
+    "radiateur_discovery_devices_found",
+    "Nombre d'ESP8266 ayant répondu lors du dernier scan réseau.",
 )
 
 
-def _default_schedule() -> dict[str, list[dict[str, str]]]:
-    """Return an empty schedule for each weekday."""
+def _instrumented(name: str, *, traced: bool = False):
+    """Record latency and status code of a view under ``name``.
 
-    return {day: [] for day in WEEKDAYS}
+    ``traced`` views also open the root span of a request-to-device trace.
+    """
 
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            started = time.perf_counter()
+            status = 500
+            try:
+                if traced:
+                    with tracing.span(f"http {name}", method=request.method) as span:
+                        response = view(request, *args, **kwargs)
+                        span.attributes["status"] = response.status_code
+                else:
+                    response = view(request, *args, **kwargs)
+                status = response.status_code
+                return response
+            finally:
+                _VIEW_LATENCY.observe(time.perf_counter() - started, view=name)
+                _VIEW_REQUESTS.inc(view=name, status=status)
 
-def _load_schedule() -> dict[str, list[dict[str, str]]]:
-    """Load the current schedule from disk or return a default structure."""
+        return wrapper
 
-    if not DATA_FILE_PATH.exists():
-        return _default_schedule()
+    return decorator
 
-    try:
-        data = json.loads(DATA_FILE_PATH.read_text(encoding="utf-8"))
-    except (json.JSONDecodeError, OSError):
-        return _default_schedule()
 
-    if not isinstance(data, dict):
-        return _default_schedule()
+# The generation counters restart with the process: the boot id keeps an
+# ETag issued before a restart from matching afterwards.
+_BOOT_ID = uuid.uuid4().hex[:8]
+# A held request occupies a worker thread: the wait stays well below the
+# 30 s Gunicorn timeout and only a few requests per process may wait at once,
+# the others being answered immediately.
+STATE_LONG_POLL_TIMEOUT = min(getattr(settings, "RADIATEUR_STATE_LONG_POLL_TIMEOUT", 10.0), 20.0)
+_LONG_POLL_SLOTS = threading.BoundedSemaphore(max(1, getattr(settings, "RADIATEUR_STATE_LONG_POLL_SLOTS", 4)))
 
-    schedule = _default_schedule()
-    for day, entries in data.items():
-        if day not in WEEKDAYS or not isinstance(entries, list):
-            continue
 
-        filtered: list[dict[str, str]] = []
-        for entry in entries:
-            if not isinstance(entry, dict):
-                continue
-            start = entry.get("start")
-            end = entry.get("end")
-            if not isinstance(start, str) or not isinstance(end, str):
-                continue
-            filtered.append({"start": start, "end": end})
+def _etag(request, *versions) -> str:
+    """ETag made of the versions a response depends on, per user."""
 
-        schedule[day] = filtered
+    return '"' + "-".join(str(part) for part in (_BOOT_ID, request.user.pk, *versions)) + '"'
 
-    return schedule
 
+def _conditional(request, etag: str, build) -> HttpResponse:
+    """Answer 304 when the client already has ``etag``, otherwise ``build()``.
 
-MINUTES_IN_DAY = 24 * 60
+    Clients must revalidate every time (``no-cache``), which costs a 304
+    instead of a full payload while nothing changed.
+    """
 
+    response = None
+    if request.method in ("GET", "HEAD"):
+        response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build()
+        response.headers["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@csrf_exempt
+@login_required
+@_instrumented("planning")
+def planning_page(request):
+    """Render the planning page along with the JSON payload."""
+
+    config = get_config()
+
+    def build():
+        enregistrer_log("Requete page 'planning'")
+        data = config.schedule_dict()
+        return render(request, "planning.html", {"data": json.dumps(data, ensure_ascii=False)})
+
+    return _conditional(request, _etag(request, "planning", config.version), build)
+
+
+@never_cache
+def metrics(request):
+    """Expose the in-process metrics in the Prometheus text format.
 
-def _parse_time(value: str, *, allow_midnight: bool) -> int:
-    """Parse an HH:MM string into minutes, optionally allowing 24:00."""
+    Scrapers authenticate with ``Authorization: Bearer <METRICS_TOKEN>`` when a
+    token is configured; otherwise a logged-in session is required.
+    """
 
-    if value == "24:00":
-        if allow_midnight:
-            return MINUTES_IN_DAY
-        raise ValueError("L'heure 24:00 n'est autorisée qu'en fin de créneau.")
+    token = getattr(settings, "METRICS_TOKEN", "")
+    authorized = bool(token) and request.headers.get("Authorization") == f"Bearer {token}"
+    if not authorized and not request.user.is_authenticated:
+        return HttpResponse(status=401)
+
+    return HttpResponse(
+        REGISTRY.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@never_cache
+@login_required
+def mqtt_health(request):
+    """Report the broker connection state and the offline queue size."""
+
+    health = get_connection_health()
+    return JsonResponse(health, status=200 if health["connected"] else 503)
+
+
+@never_cache
+@login_required
+def traces(request):
+    """Render the trace viewer page."""
+
+    return render(request, "traces.html")
+
+
+@never_cache
+@login_required
+def traces_json(request):
+    """Export the buffered request-to-device traces as JSON."""
 
     try:
-        time = datetime.strptime(value, "%H:%M")
-    except ValueError as exc:
-        raise ValueError("Format d'heure invalide. Utilisez HH:MM.") from exc
+        limit = max(1, min(int(request.GET.get("limit", 100)), 1000))
+    except ValueError:
+        limit = 100
+    return JsonResponse({"traces": tracing.export_traces(limit)})
 
-    minutes = time.hour * 60 + time.minute
-    if minutes >= MINUTES_IN_DAY:
-        raise ValueError("Les heures doivent être comprises entre 00:00 et 23:59.")
-    return minutes
 
+@never_cache
+@login_required
+@_instrumented("history")
+def history_json(request):
+    """Return the mode history of one radiator (raw transitions or rollups).
 
-def _format_time(minutes: int) -> str:
-    """Convert minutes to HH:MM, handling 24:00 as a special case."""
+    Query parameters: ``device`` (required), ``period`` (``raw``, ``hour`` or
+    ``day``) and ``start``/``end`` as Unix timestamps (last 7 days by default).
+    """
 
-    if minutes == MINUTES_IN_DAY:
-        return "24:00"
-    hours, mins = divmod(minutes, 60)
-    return f"{hours:02d}:{mins:02d}"
+    device = request.GET.get("device")
+    if not device:
+        return JsonResponse({"error": "Paramètre 'device' manquant."}, status=400)
 
+    period = request.GET.get("period", "raw")
+    start, end = history.default_range()
+    try:
+        start = float(request.GET.get("start", start))
+        end = float(request.GET.get("end", end))
+    except ValueError:
+        return JsonResponse({"error": "Intervalle invalide."}, status=400)
 
-def _validate_schedule(payload: object) -> dict[str, list[dict[str, str]]]:
-    """Validate and normalize the incoming schedule payload."""
+    store = history.get_store()
+    if period == "raw":
+        items = store.transitions(device, start, end)
+    elif period in history.PERIODS:
+        items = store.rollups(device, period, start, end)
+    else:
+        return JsonResponse({"error": "Période inconnue."}, status=400)
 
-    if not isinstance(payload, dict):
-        raise ValueError("Le planning doit être un objet JSON.")
+    return JsonResponse(
+        {"device": device, "period": period, "start": start, "end": end, "items": items}
+    )
 
-    schedule = _default_schedule()
 
-    for day in WEEKDAYS:
-        raw_entries = payload.get(day, [])
-        if raw_entries in (None, ""):
-            raw_entries = []
+@never_cache
+@login_required
+@_instrumented("events")
+def events_json(request):
+    """Query the binary journal of commands and replies.
+
+    Query parameters (all optional): ``device``, ``type`` (``command``,
+    ``ack``, ``report``...), ``cid``, ``start``/``end`` as Unix timestamps and
+    ``limit``.  The most recent events come first.
+    """
+
+    journal = events.get_journal()
+    if journal is None:
+        return JsonResponse({"error": "Journal des événements indisponible."}, status=503)
+
+    event_type = request.GET.get("type")
+    if event_type and event_type not in events.EVENT_CODES:
+        return JsonResponse({"error": "Type d'événement inconnu."}, status=400)
+    try:
+        start = float(request.GET["start"]) if request.GET.get("start") else None
+        end = float(request.GET["end"]) if request.GET.get("end") else None
+        limit = max(1, min(int(request.GET.get("limit", 500)), 10000))
+    except ValueError:
+        return JsonResponse({"error": "Paramètres invalides."}, status=400)
+
+    journal.flush()
+    items = journal.query(
+        device=request.GET.get("device") or None,
+        event=events.EVENT_CODES.get(event_type) if event_type else None,
+        correlation_id=request.GET.get("cid") or None,
+        start=start,
+        end=end,
+        limit=limit,
+    )
+    return JsonResponse({"events": items})
+
+
+LOG_STREAM_DURATION = 60
+LOG_STREAM_POLL = 1.0
+
+
+@never_cache
+@login_required
+def logs(request):
+    """Render the log viewer page."""
 
-        if not isinstance(raw_entries, list):
-            raise ValueError(f"Le jour {day} doit contenir une liste de créneaux.")
+    return render(request, "logs.html", {"log_names": sorted(logviewer.LOG_FILES)})
 
-        parsed_entries: list[tuple[int, int]] = []
-        for raw_entry in raw_entries:
-            if not isinstance(raw_entry, dict):
-                raise ValueError("Chaque créneau doit être un objet JSON.")
 
-            start = raw_entry.get("start")
-            end = raw_entry.get("end")
+def _parse_log_time(value: str | None) -> float | None:
+    """Accept a Unix timestamp or a local ``YYYY-MM-DDTHH:MM`` date."""
 
-            if not isinstance(start, str) or not isinstance(end, str):
-                raise ValueError("Les heures doivent être des chaînes au format HH:MM.")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = TIMEZONE.localize(parsed)
+    return parsed.timestamp()
 
-            start_minutes = _parse_time(start, allow_midnight=False)
-            end_minutes = _parse_time(end, allow_midnight=True)
 
-            if start_minutes >= end_minutes:
-                raise ValueError("L'heure de fin doit être postérieure à l'heure de début.")
+@never_cache
+@login_required
+@_instrumented("logs")
+def logs_json(request, name: str):
+    """Return log lines: the tail, a time range or the lines after an offset.
 
-            parsed_entries.append((start_minutes, end_minutes))
+    ``q`` filters on a substring; ``start``/``end`` select a time range,
+    ``after`` the lines appended since a previously returned offset, and
+    ``lines`` the size of the tail (default).
+    """
 
-        parsed_entries.sort(key=lambda entry: entry[0])
+    log = logviewer.get_log(name)
+    if log is None:
+        return JsonResponse({"error": "Journal inconnu."}, status=404)
 
-        normalized: list[dict[str, str]] = []
-        previous_end = None
-        for start_minutes, end_minutes in parsed_entries:
-            if previous_end is not None and start_minutes < previous_end:
-                raise ValueError("Les créneaux ne doivent pas se chevaucher.")
-            normalized.append({
-                "start": _format_time(start_minutes),
-                "end": _format_time(end_minutes),
-            })
-            previous_end = end_minutes
+    contains = request.GET.get("q") or None
+    try:
+        limit = max(1, min(int(request.GET.get("lines", 200)), logviewer.MAX_LINES))
+        start = _parse_log_time(request.GET.get("start"))
+        end = _parse_log_time(request.GET.get("end"))
+        after = request.GET.get("after")
+        after = int(after) if after is not None else None
+    except ValueError:
+        return JsonResponse({"error": "Paramètre invalide."}, status=400)
 
-        schedule[day] = normalized
+    if after is not None:
+        lines, offset = log.follow(after, contains)
+    elif start is not None or end is not None:
+        lines, offset = log.search(start, end, contains, limit), None
+    else:
+        lines = log.tail(limit, contains)
+        _, offset = log.follow(-1)
 
-    return schedule
+    return JsonResponse({"lines": [line.to_json() for line in lines], "offset": offset})
 
 
-@csrf_exempt
 @never_cache
 @login_required
-def planning(request):
-    """Render the planning page along with the JSON payload."""
+def logs_stream(request, name: str):
+    """Stream new log lines as server-sent events (``tail -f``).
 
-    enregistrer_log("Requete page 'planning'")
-    data = _load_schedule()
-    return render(request, "planning.html", {"data": json.dumps(data, ensure_ascii=False)})
+    The stream ends after ``LOG_STREAM_DURATION`` seconds to free the
+    worker; the browser reconnects with ``Last-Event-ID`` set to the offset.
+    """
+
+    log = logviewer.get_log(name)
+    if log is None:
+        return HttpResponse(status=404)
+
+    contains = request.GET.get("q") or None
+    try:
+        offset = int(request.headers.get("Last-Event-ID") or request.GET.get("after", ""))
+    except ValueError:
+        _, offset = log.follow(-1)
+
+    def events():
+        nonlocal offset
+        deadline = time.monotonic() + LOG_STREAM_DURATION
+        yield "retry: 1000\n\n"
+        while time.monotonic() < deadline:
+            lines, offset = log.follow(offset, contains)
+            if lines:
+                payload = json.dumps([line.to_json() for line in lines], ensure_ascii=False)
+                yield f"id: {offset}\ndata: {payload}\n\n"
+            time.sleep(LOG_STREAM_POLL)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+ANALYTICS_MAX_DAYS = 366
+
+
+@never_cache
+@login_required
+@_instrumented("analytics")
+def analytics_json(request):
+    """Return time in mode, estimated kWh and planning compliance.
+
+    Query parameters: ``days`` (7 by default, at most a year), ``bucket``
+    (``day`` or ``week``) and optionally ``device`` to restrict the result.
+    """
+
+    if not analytics.available():
+        return JsonResponse({"error": "NumPy n'est pas installé."}, status=503)
+
+    bucket = request.GET.get("bucket", "day")
+    if bucket not in analytics.BUCKETS:
+        return JsonResponse({"error": "Période inconnue."}, status=400)
+    try:
+        days = max(1, min(int(request.GET.get("days", 7)), ANALYTICS_MAX_DAYS))
+    except ValueError:
+        return JsonResponse({"error": "Nombre de jours invalide."}, status=400)
+
+    device = request.GET.get("device")
+    devices = [device] if device else get_all_radiator_names()
+    start, end = history.default_range(days)
+    return JsonResponse(analytics.summarize(history.get_store(), devices, start, end, bucket))
 
 
 @never_cache
@@ -217,12 +434,14 @@ def service_worker(request):
 
 @csrf_exempt
 @login_required
+@_instrumented("index")
 def index(request):
     """Render the main dashboard page."""
 
     enregistrer_log("Requete page 'index'")
-    radiators = get_all_radiator_names()
-    disabled_states = load_disabled_states()
+    config = get_config()
+    radiators = list(config.radiators)
+    disabled_states = config.disabled_map()
     radiator_cards: list[tuple[str, bool]] = []
     has_active_radiators = False
     for radiator in radiators:
@@ -242,24 +461,103 @@ def index(request):
 @csrf_exempt
 @never_cache
 @login_required
+@_instrumented("maj_json")
 def maj_json(request):
     """Persist the planning JSON received from the front-end."""
 
     enregistrer_log("Reception requete modification planning")
     try:
         payload = json.loads(request.body.decode("utf-8"))
-        schedule = _validate_schedule(payload)
+        schedule = planning.validate_schedule(payload)
     except (json.JSONDecodeError, ValueError):
         return HttpResponse(status=400)
 
-    DATA_FILE_PATH.write_text(
-        json.dumps(schedule, indent=4, ensure_ascii=False), encoding="utf-8"
-    )
+    save_schedule(schedule)
+    planning.notifier_modification()
     return HttpResponse(status=200)
 
 
 @csrf_exempt
+@never_cache
 @login_required
+@_instrumented("zones")
+def zones_json(request):
+    """Read (GET) or replace (POST) the per-zone and per-radiator plannings.
+
+    The response also lists the distinct compiled plannings and the
+    radiators sharing each of them.
+    """
+
+    if request.method == "POST":
+        enregistrer_log("Reception requete modification zones")
+        try:
+            payload = json.loads(request.body.decode("utf-8"))
+            zones = planning.save_zones(payload)
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "JSON invalide."}, status=400)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+    else:
+        zones = planning.load_zones()
+
+    return JsonResponse({**zones, "groups": planning.get_planning().describe()})
+
+
+@csrf_exempt
+@never_cache
+@login_required
+@_instrumented("scenes")
+def scenes_json(request):
+    """Read (GET) or replace (POST) the named scenes.
+
+    ``compiled`` gives the modes actually sent by each scene (disabled
+    radiators forced to ECO, unknown radiators dropped).
+    """
+
+    if request.method == "POST":
+        enregistrer_log("Reception requete modification scènes")
+        try:
+            payload = json.loads(request.body.decode("utf-8"))
+            definitions = scenes.save_scenes(payload)
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "JSON invalide."}, status=400)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+    else:
+        definitions = scenes.load_scenes()
+
+    compiled = {name: scene.describe() for name, scene in scenes.get_scenes().items()}
+    return JsonResponse({**definitions, "compiled": compiled})
+
+
+@csrf_exempt
+@login_required
+@_instrumented("activer_scene", traced=True)
+def activer_scene(request, name: str):
+    """Apply the scene ``name`` (POST)."""
+
+    if request.method != "POST":
+        return HttpResponse(status=405)
+    client = get_mqtt_client()
+    if client is None:
+        return HttpResponse(status=503)
+    command_id = tracing.current_trace_id() or tracing.new_correlation_id()
+    try:
+        retour = scenes.activer_scene(name, client, command_id)
+    except KeyError:
+        return JsonResponse({"error": "Scène inconnue."}, status=404)
+    return JsonResponse(
+        {
+            "applied_modes": retour,
+            "connected": client.is_connected(),
+            "command_id": command_id,
+        }
+    )
+
+
+@csrf_exempt
+@login_required
+@_instrumented("changement_etat", traced=True)
 def changement_etat(request):
     """Handle state change requests sent from the UI."""
 
@@ -277,39 +575,180 @@ def changement_etat(request):
     if not isinstance(mode, str):
         return HttpResponse(status=400)
 
+    config = get_config()
     radiator = payload.get("radiator")
-    known_radiators = set(get_all_radiator_names())
     if radiator:
-        if radiator not in known_radiators:
+        if radiator not in config.disabled:
             return HttpResponse(status=400)
         liste_radiateur: list[str] | None = [radiator]
     else:
         liste_radiateur = None
 
-    retour = envoyer_changement_etat_mqtt(mode, client, liste_radiateur)
-    if retour is None:
+    # Rapid clicks on a radiator are merged; only the last mode is published.
+    retour, command_id = COALESCER.submit(mode, client, liste_radiateur, config)
+
+    return JsonResponse(
+        {
+            "applied_modes": retour,
+            "disabled": config.disabled_map(),
+            # False when the command waits in the offline queue
+            "connected": client.is_connected(),
+            # Poll commande_status with this id to learn when radiators ACK.
+            "command_id": command_id,
+        }
+    )
+
+
+@csrf_exempt
+@login_required
+@_instrumented("changement_etat_lot", traced=True)
+def changement_etat_lot(request):
+    """Apply a radiator -> mode map in one request.
+
+    ``{"modes": {"chambre": "COMFORT", "salon": "ECO"}}``.  The whole map is
+    checked against one read of the radiator list and disabled states;
+    nothing is sent when an entry is invalid.
+    """
+
+    if request.method != "POST":
+        return HttpResponse(status=405)
+    client = get_mqtt_client()
+    if client is None:
         return HttpResponse(status=503)
 
-    return JsonResponse({"applied_modes": retour, "disabled": load_disabled_states()})
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "JSON invalide."}, status=400)
+    modes = payload.get("modes") if isinstance(payload, dict) else None
+    if not isinstance(modes, dict) or not modes:
+        return JsonResponse({"error": "Objet « modes » attendu."}, status=400)
+
+    config = get_config()
+    errors = {}
+    for radiator, mode in modes.items():
+        if radiator not in config.disabled:
+            errors[radiator] = "Radiateur inconnu."
+        elif mode not in COMMAND_MODES:
+            errors[radiator] = "Mode invalide."
+    if errors:
+        return JsonResponse({"errors": errors}, status=400)
+
+    applied = {radiator: config.target_mode(radiator, mode) for radiator, mode in modes.items()}
+    command_id = tracing.current_trace_id() or tracing.new_correlation_id()
+    enregistrer_log(f"Reception requete modification état groupée ({len(applied)} radiateur(s))")
+    outcomes = COALESCER.send_now(applied, client, command_id)
+
+    return JsonResponse(
+        {
+            "results": {
+                radiator: {"mode": mode, "status": outcomes[radiator]} for radiator, mode in applied.items()
+            },
+            "applied_modes": applied,
+            "disabled": config.disabled_map(),
+            "connected": client.is_connected(),
+            "command_id": command_id,
+        }
+    )
 
 
 @csrf_exempt
+@never_cache
 @login_required
-def retourner_etat(request):
-    """Return the latest device states after requesting them from MQTT."""
+@_instrumented("boost", traced=True)
+def boost(request):
+    """List (GET), start or cancel (POST) temporary mode overrides.
+
+    ``{"radiator": "salon", "mode": "COMFORT", "minutes": 120}`` forces the
+    mode then resumes the planning; ``{"radiator": "salon", "cancel": true}``
+    resumes it immediately.
+    """
+
+    if request.method != "POST":
+        return JsonResponse({"boosts": planning.get_boosts()})
+
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except json.JSONDecodeError:
+        return HttpResponse(status=400)
+
+    radiator = payload.get("radiator")
+    if not isinstance(radiator, str) or radiator not in set(get_all_radiator_names()):
+        return HttpResponse(status=400)
+
+    if payload.get("cancel"):
+        planning.annuler_boost(radiator)
+        return JsonResponse({"boosts": planning.get_boosts()})
 
     client = get_mqtt_client()
     if client is None:
-        enregistrer_log("Impossible de retourner l'état: client MQTT indisponible")
-        return JsonResponse({"states": get_cached_states(), "disabled": load_disabled_states()})
+        return HttpResponse(status=503)
+    try:
+        minutes = float(payload.get("minutes", 0))
+        planning.demarrer_boost(client, radiator, payload.get("mode"), minutes * 60)
+    except (TypeError, ValueError):
+        return HttpResponse(status=400)
+    return JsonResponse({"boosts": planning.get_boosts(), "command_id": tracing.current_trace_id()})
 
-    demander_etat_au_appareil(client)
-    time.sleep(0.05)
-    return JsonResponse({"states": get_cached_states(), "disabled": load_disabled_states()})
+
+@never_cache
+@login_required
+def commande_status(request, command_id: str):
+    """Return the acknowledgement status of a previously sent command."""
+
+    status = command_status(command_id)
+    if status is None:
+        return JsonResponse({"error": "Commande inconnue."}, status=404)
+    return JsonResponse(status)
+
+
+@csrf_exempt
+@login_required
+@_instrumented("retourner_etat")
+def retourner_etat(request):
+    """Return the cached device states kept fresh by the background poller.
+
+    The ETag combines the configuration version, the state generation and
+    the version of the boosts shared by the workers, so an unchanged state
+    costs a 304.  With ``?wait=<seconds>`` and a matching ``If-None-Match``,
+    the request is held until the state changes or the delay (at most
+    ``RADIATEUR_STATE_LONG_POLL_TIMEOUT``) elapses, provided one of the
+    ``RADIATEUR_STATE_LONG_POLL_SLOTS`` is free.
+    """
+
+    version = get_version_etat()
+    etag = _etag(request, get_config().version, version, planning.boosts_version())
+    try:
+        wait = min(float(request.GET.get("wait", 0)), STATE_LONG_POLL_TIMEOUT)
+    except ValueError:
+        wait = 0.0
+    if request.method == "GET" and wait > 0:
+        known = {tag.removeprefix("W/") for tag in parse_etags(request.headers.get("If-None-Match", ""))}
+        if etag in known and _LONG_POLL_SLOTS.acquire(blocking=False):
+            try:
+                version = attendre_changement_etat(version, wait)
+            finally:
+                _LONG_POLL_SLOTS.release()
+            etag = _etag(request, get_config().version, version, planning.boosts_version())
+
+    def build():
+        config = get_config()
+        return JsonResponse(
+            {
+                "states": get_cached_states(),
+                "disabled": config.disabled_map(),
+                "pending": get_commandes_en_attente(),
+                "health": get_sante_radiateurs(),
+                "boosts": planning.get_boosts(),
+            }
+        )
+
+    return _conditional(request, etag, build)
 
 
 @csrf_exempt
 @login_required
+@_instrumented("options", traced=True)
 def options(request):
     """Display and update the options page allowing per-radiator overrides."""
 
@@ -320,8 +759,7 @@ def options(request):
             return HttpResponse(status=400)
 
         radiator = payload.get("radiator")
-        known_radiators = set(get_all_radiator_names())
-        if not isinstance(radiator, str) or radiator not in known_radiators:
+        if not isinstance(radiator, str) or radiator not in get_config().disabled:
             return HttpResponse(status=400)
 
         disabled = bool(payload.get("disabled", False))
@@ -339,14 +777,31 @@ def options(request):
         )
         return JsonResponse({"disabled": updated_map})
 
+    config = get_config()
+    etag = _etag(request, "options", config.version, get_version_etat(), *scenes.scenes_version())
+    return _conditional(request, etag, lambda: _render_options(request, config))
+
+
+def _render_options(request, config):
     enregistrer_log("Requete page 'options'")
-    radiators = get_all_radiator_names()
-    disabled_states = load_disabled_states()
+    radiators = list(config.radiators)
+    disabled_states = config.disabled_map()
+    health = get_sante_radiateurs()
+    for status in health.values():
+        last_seen = status["last_seen"]
+        status["last_seen_display"] = (
+            datetime.fromtimestamp(last_seen, TIMEZONE).strftime("%d/%m/%Y %H:%M")
+            if last_seen
+            else None
+        )
+    definitions = scenes.load_scenes()
     context = {
+        "scene_names": list(definitions["scenes"]),
+        "scenes_json": json.dumps(definitions, indent=4, ensure_ascii=False),
         "radiators": radiators,
         "disabled_states": disabled_states,
         "radiator_options": [
-            (radiator, disabled_states.get(radiator, False))
+            (radiator, disabled_states.get(radiator, False), health[radiator])
             for radiator in radiators
         ],
         "mqtt_host": _detect_local_ip(MQTT_SETTINGS.host),
@@ -358,7 +813,7 @@ def options(request):
                     "%d/%m/%Y %H:%M"
                 ),
             }
-            for device in load_devices()
+            for device in config.devices
         ],
     }
     return render(request, "options.html", context)
@@ -581,13 +1036,16 @@ def _discover_esp8266_devices(hosts: list[str] | None = None) -> list[dict[str,
 
     results: list[dict[str, str]] = []
     workers = min(len(hosts), ESP_SCAN_MAX_WORKERS) or 1
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = {executor.submit(_probe_esp8266, host): host for host in hosts}
-        for future in as_completed(futures):
-            info = future.result()
-            if info is not None:
-                results.append(info)
-
+    _DISCOVERY_HOSTS.set(len(hosts))
+    with _DISCOVERY_DURATION.time():
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_probe_esp8266, host): host for host in hosts}
+            for future in as_completed(futures):
+                info = future.result()
+                if info is not None:
+                    results.append(info)
+
+    _DISCOVERY_FOUND.set(len(results))
     return results
 
 
@@ -662,6 +1120,7 @@ def _push_mqtt_host(ip: str, host: str) -> bool:
 @csrf_exempt
 @never_cache
 @login_required
+@_instrumented("devices")
 def devices(request):
     """Manage ESP8266 registrations via the JSON registry."""
 
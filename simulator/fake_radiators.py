@@ -11,6 +11,10 @@ Run the script manually, for example::
 
     python simulator/fake_radiators.py --devices Cuisine Chambre Salon
 
+:class:`~radiateur.fleet.RadiatorFleet` holds the radiators themselves
+without any network access; it lives in the Django app, which the planning
+fast-forward harness (``manage.py simuler_planning``) drives directly.
+
 The MQTT related arguments default to the same values as the Django project
 configuration and can therefore be omitted in most development setups.
 """
@@ -18,17 +22,21 @@ configuration and can therefore be omitted in most development setups.
 from __future__ import annotations
 
 import argparse
-import ast
 import os
 import signal
+import sys
 import threading
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional
+from typing import Iterable, List
 
 from dotenv import load_dotenv
 import paho.mqtt.client as mqtt
 
+# The script runs from the simulator directory; the fleet lives in the app.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from radiateur.fleet import RadiatorFleet, parse_payload  # noqa: E402
+
 
 DEFAULT_ENV_PATHS: List[Path] = [
     Path(__file__).resolve().parent.parent / ".env",
@@ -75,11 +83,8 @@ class RadiatorSimulator:
         self.client.on_connect = self._on_connect
         self.client.on_message = self._on_message
 
-        self._lock = threading.Lock()
         self._running = threading.Event()
-        self._states: Dict[str, str] = {
-            name: settings.initial_state for name in settings.devices
-        }
+        self.fleet = RadiatorFleet(settings.devices, settings.initial_state)
 
     # ------------------------------------------------------------------
     # Lifecycle helpers
@@ -88,7 +93,7 @@ class RadiatorSimulator:
         """Connect to the MQTT broker and start the background network loop."""
 
         self.client.connect(self.settings.host, self.settings.port)
-        self.client.subscribe(self.settings.topic)
+        self.client.subscribe(self.settings.topic, qos=1)
         self.client.loop_start()
         self._running.set()
         if self.settings.verbose:
@@ -126,93 +131,20 @@ class RadiatorSimulator:
 
     def _on_message(self, client, userdata, message):  # type: ignore[override]
         payload = message.payload.decode("utf-8", errors="replace")
-        parsed = self._parse_payload(payload)
-        if not parsed:
+        if parse_payload(payload) is None:
             self._log("Message ignoré: %s", payload)
             return
 
-        command = str(parsed.get("COMMAND", "")).strip()
-        if not command:
-            return
-
-        targets = self._resolve_targets(parsed.get("TO"))
-        if not targets:
-            return
-
-        if command.upper() == "STATE":
-            for target in targets:
-                self._publish_state(target, parsed.get("FROM"))
-            return
-
-        for target in targets:
-            self._apply_state_change(target, command, parsed.get("FROM"))
-
-    # ------------------------------------------------------------------
-    # Message handling helpers
-    # ------------------------------------------------------------------
-    def _parse_payload(self, payload: str) -> Optional[Dict[str, object]]:
-        """Attempt to convert the textual payload to a dictionary."""
-
-        try:
-            parsed = ast.literal_eval(payload)
-        except (ValueError, SyntaxError):
-            return None
-
-        if not isinstance(parsed, dict):
-            return None
-        return parsed
-
-    def _resolve_targets(self, raw_target) -> List[str]:
-        """Determine which radiators are addressed by a message."""
-
-        if isinstance(raw_target, str):
-            target = raw_target.strip()
-            if target in {"ALL", "*"}:
-                return list(self._states.keys())
-            if target in self._states:
-                return [target]
-        return []
-
-    def _apply_state_change(self, target: str, new_state: str, sender: object) -> None:
-        """Update a radiator state and notify the broker about the change."""
-
-        with self._lock:
-            previous = self._states.get(target, self.settings.initial_state)
-            self._states[target] = new_state
-
-        if self.settings.verbose:
-            self._log(
-                "Commande reçue pour %s: %s (ancien état: %s)",
-                target,
-                new_state,
-                previous,
-            )
-
-        self._publish_state(target, sender)
-
-    def _publish_state(self, target: str, sender: object) -> None:
-        """Publish the current state of a radiator back to the MQTT broker."""
-
-        with self._lock:
-            state = self._states.get(target, self.settings.initial_state)
-
-        destination = "Django"
-        if isinstance(sender, str) and sender:
-            destination = sender
-
-        message = {
-            "FROM": target,
-            "TO": destination,
-            "COMMAND": state,
-        }
-        self.client.publish(self.settings.topic, str(message))
-        if self.settings.verbose:
-            self._log(
-                "État publié pour %s -> %s: %s",
-                target,
-                destination,
-                state,
-            )
+        for reply in self.fleet.handle(payload):
+            self.client.publish(self.settings.topic, str(reply), qos=1)
+            if self.settings.verbose:
+                self._log(
+                    "%s publié pour %s -> %s: %s",
+                    "Acquittement" if reply.get("TYPE") == "ACK" else "État",
+                    reply["FROM"],
+                    reply["TO"],
+                    reply["COMMAND"],
+                )
 
     # ------------------------------------------------------------------
     # Utilities
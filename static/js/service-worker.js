@@ -36,6 +36,11 @@ self.addEventListener('fetch', (event) => {
     return;
   }
 
+  // Live data (state polling) is revalidated by the page itself with ETags.
+  if (request.cache === 'no-store') {
+    return;
+  }
+
   if (request.mode === 'navigate') {
     event.respondWith(
       fetch(request)